@@ -0,0 +1,7 @@
+-- Near-duplicate detection at ingest (see near_duplicates.py)
+-- simhash: 64-bit SimHash of normalized title + summary, as 16 hex chars
+-- dup_group_id: shared by syndicated copies of the same story
+ALTER TABLE mvp2_articles ADD COLUMN IF NOT EXISTS simhash TEXT;
+ALTER TABLE mvp2_articles ADD COLUMN IF NOT EXISTS dup_group_id TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_mvp2_articles_dup_group_id ON mvp2_articles(dup_group_id);
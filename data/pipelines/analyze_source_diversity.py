@@ -3,6 +3,7 @@ import json
 from collections import Counter
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from article_store import get_articles
 
 load_dotenv('backend/.env')
 supabase: Client = create_client(os.getenv("NEXT_PUBLIC_SUPABASE_URL"), os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY"))
@@ -18,13 +19,8 @@ def main():
         all_ids.extend(data.get("factual", []) + data.get("critical", []) + data.get("supportive", []))
         
     # Fetch source_name
-    id_map = {}
-    chunk_size = 100
-    for i in range(0, len(all_ids), chunk_size):
-        chunk = all_ids[i:i+chunk_size]
-        res = supabase.table("mvp2_articles").select("id, source_name").in_("id", chunk).execute()
-        for item in res.data:
-            id_map[item['id']] = item.get('source_name', 'Unknown')
+    articles = get_articles(supabase, all_ids, ["source_name"])
+    id_map = {aid: a.get('source_name') or 'Unknown' for aid, a in articles.items()}
             
     # Analyze
     print("\n--- Source Dominance Report ---")
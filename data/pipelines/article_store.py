@@ -0,0 +1,98 @@
+"""
+Shared lookups of mvp2_articles rows by id.
+
+Enrichment, thumbnails, headlines and the reports all need a few columns of
+articles they know by id. get_articles() fetches only what isn't loaded yet:
+ids are split into chunks of CHUNK_SIZE (URL length), the chunks are fetched
+concurrently, and only the requested columns are selected. Rows are kept in an
+in-memory cache for the rest of the run, keyed by article id (columns loaded by
+different lookups are merged), so every country of a single-process driver and
+every later lookup of the same articles reuses them instead of querying Supabase.
+Rows are a snapshot: writes made by the pipeline itself aren't reflected unless
+the lookup asks for refresh=True.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 100
+MAX_FETCH_WORKERS = 8
+
+_rows = {}              # article id -> {column: value} loaded so far
+_absent = set()         # ids a fetch didn't return (deleted articles)
+_lock = threading.Lock()
+_stats = {"hits": 0, "fetched": 0, "requests": 0}
+
+
+def _fetch_chunk(supabase, ids, columns):
+    response = supabase.table("mvp2_articles") \
+        .select(", ".join(["id"] + columns)) \
+        .in_("id", ids) \
+        .execute()
+    return response.data or []
+
+
+def get_articles(supabase, article_ids, columns, refresh=False):
+    """
+    {id: {"id", *columns}} for the given article ids (missing articles are left out).
+    Ids already loaded with all of these columns are served from memory, unless
+    refresh: then every id is fetched again and a failed fetch raises instead of
+    falling back to the cached values.
+    """
+    columns = [c for c in dict.fromkeys(columns) if c != "id"]
+    ids = list(dict.fromkeys(aid for aid in article_ids if aid))
+
+    with _lock:
+        if refresh:
+            to_fetch, missing_columns = ids, columns
+        else:
+            to_fetch = [aid for aid in ids
+                        if aid not in _absent and not all(c in _rows.get(aid, {}) for c in columns)]
+            # Only the columns some of them still lack
+            missing_columns = [c for c in columns if any(c not in _rows.get(aid, {}) for aid in to_fetch)]
+        _stats["hits"] += len(ids) - len(to_fetch)
+
+    if to_fetch:
+        chunks = [to_fetch[i:i + CHUNK_SIZE] for i in range(0, len(to_fetch), CHUNK_SIZE)]
+
+        def fetch(chunk):
+            try:
+                return chunk, _fetch_chunk(supabase, chunk, missing_columns)
+            except Exception as e:
+                if refresh:
+                    raise
+                print(f"  ⚠️ Error fetching articles: {e}")
+                return chunk, None
+
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(chunks))) as executor:
+            for chunk, rows in executor.map(fetch, chunks):
+                if rows is None:
+                    continue    # Not cached: a later lookup retries these ids
+                with _lock:
+                    _stats["requests"] += 1
+                    _stats["fetched"] += len(rows)
+                    for row in rows:
+                        cached = _rows.setdefault(row['id'], {"id": row['id']})
+                        cached.update(dict.fromkeys(missing_columns))   # Fetched, even if not returned
+                        cached.update(row)
+                    returned = {row['id'] for row in rows}
+                    for aid in chunk:
+                        if aid not in returned:
+                            _absent.add(aid)
+                            _rows.pop(aid, None)     # Deleted since it was cached
+
+    with _lock:
+        return {aid: {"id": aid, **{c: _rows[aid].get(c) for c in columns}}
+                for aid in ids
+                if aid in _rows and all(c in _rows[aid] for c in columns)}
+
+
+def clear():
+    with _lock:
+        _rows.clear()
+        _absent.clear()
+
+
+def summary():
+    s = _stats
+    return f"Article cache: {len(_rows)} rows, {s['hits']} hits, {s['fetched']} fetched in {s['requests']} requests"
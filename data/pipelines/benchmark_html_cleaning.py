@@ -0,0 +1,80 @@
+"""
+Benchmark: RSS summary HTML cleaning
+html_text.clean_html (fast path) vs BeautifulSoup get_text (previous collector path)
+on the summaries saved in rss_feed_test_results*.json.
+
+Usage: python data/pipelines/benchmark_html_cleaning.py [--repeat 200]
+"""
+
+import os
+import json
+import time
+import argparse
+from html_text import clean_html, clean_html_bs4, fast_clean_html
+
+FIXTURES = [
+    "rss_feed_test_results.json",
+    "rss_feed_test_results_v2.json",
+    "rss_feed_test_results_ALL.json",
+]
+SUMMARY_FIELDS = ["summary", "summary_preview", "description"]
+
+
+def load_summaries():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    summaries = []
+    for name in FIXTURES:
+        with open(os.path.join(script_dir, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for feeds in data.values():
+            # ALL fixture: {country: [feed, ...]}; older fixtures: {country: feed}
+            for feed in feeds if isinstance(feeds, list) else [feeds]:
+                sample = feed.get("sample_item") or {}
+                for field in SUMMARY_FIELDS:
+                    if sample.get(field):
+                        summaries.append(sample[field])
+    return summaries
+
+
+def time_it(func, summaries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for raw in summaries:
+            func(raw)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RSS summary HTML cleaning")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the fixture summaries")
+    args = parser.parse_args()
+
+    summaries = load_summaries()
+    with_markup = sum(1 for s in summaries if "<" in s)
+    print(f"Loaded {len(summaries)} summaries from {len(FIXTURES)} fixtures ({with_markup} with markup).")
+
+    # 1. Equivalence
+    fallbacks = 0
+    mismatches = []
+    for raw in summaries:
+        if fast_clean_html(raw) is None:
+            fallbacks += 1
+        if clean_html(raw) != clean_html_bs4(raw):
+            mismatches.append(raw)
+    print(f"\nFast path handled {len(summaries) - fallbacks}/{len(summaries)} (fallback to bs4: {fallbacks}).")
+    print(f"Output mismatches vs BeautifulSoup: {len(mismatches)}")
+    for raw in mismatches[:5]:
+        print(f"  ❌ {raw[:80]!r}")
+
+    # 2. Throughput
+    calls = len(summaries) * args.repeat
+    bs4_time = time_it(clean_html_bs4, summaries, args.repeat)
+    fast_time = time_it(clean_html, summaries, args.repeat)
+    print(f"\n{calls} calls each:")
+    print(f"  BeautifulSoup : {bs4_time:.3f}s ({bs4_time / calls * 1e6:.1f} µs/summary)")
+    print(f"  clean_html    : {fast_time:.3f}s ({fast_time / calls * 1e6:.1f} µs/summary)")
+    print(f"  Speedup       : {bs4_time / fast_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
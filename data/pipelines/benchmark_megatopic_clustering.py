@@ -0,0 +1,99 @@
+"""
+Benchmark: megatopic clustering, sparse radius graph engine (megatopic_clustering.py)
+vs the dense AgglomerativeClustering(metric='cosine', linkage='average') it replaces.
+
+Topic windows of up to 50k topics don't exist in the fixtures, so topic-name
+embeddings are synthesized: MiniLM-sized (384-d) unit vectors around random
+story centres, some centres close enough to chain into larger megatopics, with
+within-story distances on both sides of the 0.20 threshold. Two story sizes:
+"mixed" (a few topics per story, like a 24h window) and "dense" (hundreds of
+close topics per story, like a wide PUBLISH_WINDOW_HOURS), where each topic
+has far more neighbours within the threshold ("Max nbrs").
+
+Agreement: adjusted Rand index and exact label match vs the dense run (up to
+--max-dense topics, where its O(n^2) distance matrix still fits).
+Memory: peak traced allocation (tracemalloc) and wall time per engine and size.
+
+Usage: python data/pipelines/benchmark_megatopic_clustering.py [--sizes 1000,5000,50000] [--max-dense 10000] [--stories mixed,dense]
+"""
+
+import time
+import argparse
+import tracemalloc
+import numpy as np
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.metrics import adjusted_rand_score
+from megatopic_clustering import cluster_megatopics, radius_graph, renumber, DISTANCE_THRESHOLD
+
+DIM = 384                   # paraphrase-multilingual-MiniLM-L12-v2
+TOPICS_PER_STORY = {"mixed": 4, "dense": 300}   # Mean local topics per story, per scenario
+RELATED_STORIES = 0.2       # Share of stories drawn near another story's centre
+
+
+def synthetic_embeddings(n, seed=0, topics_per_story=TOPICS_PER_STORY["mixed"]):
+    rng = np.random.default_rng(seed)
+    n_stories = max(1, n // topics_per_story)
+    centres = rng.normal(size=(n_stories, DIM))
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    # Related stories (follow-ups, same event from another angle) sit near another centre
+    related = rng.random(n_stories) < RELATED_STORIES
+    parents = rng.integers(0, n_stories, n_stories)
+    centres[related] = centres[parents[related]] + rng.normal(scale=0.025, size=(related.sum(), DIM))
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+
+    story = rng.integers(0, n_stories, n)
+    # Per-story spread: pairwise cosine distance ~0.05-0.30 around the threshold
+    spread = rng.uniform(0.008, 0.028, n_stories)[story, None]
+    embeddings = centres[story] + rng.normal(size=(n, DIM)) * spread
+    return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+
+def dense_labels(embeddings):
+    # Same parameters as the previous llm_megatopic_analysis.py
+    return AgglomerativeClustering(n_clusters=None, distance_threshold=DISTANCE_THRESHOLD,
+                                   metric='cosine', linkage='average').fit_predict(embeddings)
+
+
+def measure(fn, *args, **kwargs):
+    """(result, seconds, peak traced MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sparse-graph vs dense megatopic clustering")
+    parser.add_argument("--sizes", default="1000,2000,5000,10000,20000,50000", help="Comma-separated topic counts")
+    parser.add_argument("--max-dense", type=int, default=10000, help="Largest size to run the dense baseline on")
+    parser.add_argument("--stories", default="mixed,dense", help=f"Comma-separated scenarios ({', '.join(TOPICS_PER_STORY)})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(f"{'Stories':<8} {'Topics':>7} {'Max nbrs':>8} {'Engine':<11} {'Clusters':>8} {'Time':>8} {'Peak MB':>8} {'ARI':>6} {'Exact':>6}")
+    for scenario in args.stories.split(","):
+        for n in sizes:
+            embeddings = synthetic_embeddings(n, args.seed, TOPICS_PER_STORY[scenario])
+            max_neighbours = int(radius_graph(embeddings).sum(axis=1).max())
+            row = f"{scenario:<8} {n:>7} {max_neighbours:>8}"
+            dense = None
+            if n <= args.max_dense:
+                dense, seconds, peak = measure(dense_labels, embeddings)
+                dense = renumber(dense)
+                print(f"{row} {'dense':<11} {dense.max() + 1:>8} {seconds:>7.2f}s {peak:>8.1f}")
+
+            for method in ("average", "components"):
+                labels, seconds, peak = measure(cluster_megatopics, embeddings, method=method)
+                if dense is not None:
+                    agreement = f"{adjusted_rand_score(dense, labels):>6.3f} {str(bool((labels == dense).all())):>6}"
+                else:
+                    agreement = f"{'-':>6} {'-':>6}"
+                print(f"{row} {method:<11} {labels.max() + 1:>8} {seconds:>7.2f}s {peak:>8.1f} {agreement}")
+
+
+if __name__ == "__main__":
+    main()
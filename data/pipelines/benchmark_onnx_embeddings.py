@@ -0,0 +1,115 @@
+"""
+Benchmark: title embeddings, int8 ONNX (embedding_onnx.py) vs PyTorch sentence-transformers
+on the titles saved in this directory (topic names in clusters_*_hdbscan.json /
+megatopics.json, sample headlines in rss_feed_test_results*.json).
+
+Accuracy: per-text cosine between backends, max drift of the pairwise similarity
+matrix, and agreement of HDBSCAN labels (same params as llm_topic_clustering_embedding.py).
+Throughput: texts/second for each backend.
+
+Usage: python data/pipelines/benchmark_onnx_embeddings.py [--repeat 3] [--batch-size 64]
+(run embedding_onnx.py first to export the model)
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from sklearn.cluster import HDBSCAN
+from sklearn.metrics import adjusted_rand_score
+from embedding_model import MODEL_NAME
+from embedding_onnx import OnnxEncoder
+
+TITLE_FIELDS = ["title", "title_original", "title_en"]
+MIN_COSINE = 0.98       # Per-text agreement the ONNX backend must reach
+
+
+def load_titles():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    titles = []
+    for path in sorted(glob.glob(os.path.join(script_dir, "clusters_*_hdbscan.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            titles.extend(json.load(f).keys())
+    megatopics_path = os.path.join(script_dir, "megatopics.json")
+    if os.path.exists(megatopics_path):
+        with open(megatopics_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data if isinstance(data, list) else data.values():
+            if isinstance(item, dict) and item.get("name"):
+                titles.append(item["name"])
+    for path in sorted(glob.glob(os.path.join(script_dir, "rss_feed_test_results*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for feeds in data.values():
+            # ALL fixture: {country: [feed, ...]}; older fixtures: {country: feed}
+            for feed in feeds if isinstance(feeds, list) else [feeds]:
+                sample = feed.get("sample_item") or {}
+                titles.extend(sample[field] for field in TITLE_FIELDS if sample.get(field))
+    # De-duplicate, keep order
+    return list(dict.fromkeys(t.strip() for t in titles if t and t.strip()))
+
+
+def hdbscan_labels(embeddings):
+    # Same parameters as llm_topic_clustering_embedding.cluster_country
+    size = 2 if len(embeddings) < 50 else 3
+    return HDBSCAN(min_cluster_size=size, min_samples=size, cluster_selection_epsilon=0.0,
+                   metric='euclidean').fit_predict(embeddings)
+
+
+def throughput(encode, titles, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(titles)
+    elapsed = time.perf_counter() - start
+    return len(titles) * repeat / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare int8 ONNX vs PyTorch title embeddings")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the fixture titles for throughput")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    titles = load_titles()
+    print(f"Loaded {len(titles)} unique titles from fixtures.")
+
+    from sentence_transformers import SentenceTransformer
+    torch_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    onnx_model = OnnxEncoder()
+
+    def torch_encode(texts):
+        return torch_model.encode(texts, batch_size=args.batch_size, show_progress_bar=False, normalize_embeddings=True)
+
+    def onnx_encode(texts):
+        return onnx_model.encode(texts, batch_size=args.batch_size)
+
+    # 1. Accuracy
+    reference = np.asarray(torch_encode(titles), dtype=np.float32)
+    candidate = onnx_encode(titles)
+    cosines = np.sum(reference * candidate, axis=1)
+    sim_drift = np.abs(reference @ reference.T - candidate @ candidate.T)
+    ref_labels, cand_labels = hdbscan_labels(reference), hdbscan_labels(candidate)
+
+    print("\nAccuracy (ONNX int8 vs PyTorch):")
+    print(f"  Cosine per title : min {cosines.min():.4f}, mean {cosines.mean():.4f}, "
+          f"below {MIN_COSINE}: {(cosines < MIN_COSINE).sum()}")
+    print(f"  Pairwise sim drift: max {sim_drift.max():.4f}, mean {sim_drift.mean():.4f}")
+    print(f"  HDBSCAN labels   : ARI {adjusted_rand_score(ref_labels, cand_labels):.3f}, "
+          f"identical {np.mean(ref_labels == cand_labels):.1%} "
+          f"({len(set(ref_labels) - {-1})} vs {len(set(cand_labels) - {-1})} clusters)")
+    for i in np.argsort(cosines)[:3]:
+        print(f"  Lowest: {cosines[i]:.4f} {titles[i][:60]!r}")
+
+    # 2. Throughput
+    torch_rate, torch_time = throughput(torch_encode, titles, args.repeat)
+    onnx_rate, onnx_time = throughput(onnx_encode, titles, args.repeat)
+    print(f"\n{len(titles) * args.repeat} titles each (batch size {args.batch_size}):")
+    print(f"  PyTorch   : {torch_time:.2f}s ({torch_rate:.0f} titles/s)")
+    print(f"  ONNX int8 : {onnx_time:.2f}s ({onnx_rate:.0f} titles/s)")
+    print(f"  Speedup   : {onnx_rate / torch_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
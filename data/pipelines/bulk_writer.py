@@ -0,0 +1,141 @@
+"""
+Buffered bulk upserts for Supabase.
+
+Rows are accumulated across callers (e.g. every RSS source in a run) and written
+in size-bounded chunks, one request per chunk. Transient errors (timeouts,
+connection drops, 429/5xx) are retried with exponential backoff; any other error
+bisects the chunk until the bad rows are isolated, so one invalid row costs
+O(log n) extra requests instead of one request per row.
+"""
+
+import time
+import httpx
+
+CHUNK_SIZE = 500
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0      # Seconds; doubled per retry
+TRANSIENT_CODES = {"429", "500", "502", "503", "504"}
+
+
+def is_transient(exc):
+    """Network-level failures and 429/5xx responses are worth retrying as-is"""
+    if isinstance(exc, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    # Only look at the status code: the message of a data error can quote row contents
+    return str(getattr(exc, "code", "")) in TRANSIENT_CODES
+
+
+class _Ticket:
+    """Tracks one add() call until all of its rows are written or failed"""
+
+    def __init__(self, size, on_done):
+        self.pending = size
+        self.ok = []
+        self.failed = []
+        self.on_done = on_done
+
+    def resolve(self, row, ok):
+        (self.ok if ok else self.failed).append(row)
+        self.pending -= 1
+        if self.pending == 0 and self.on_done:
+            self.on_done(self.ok, self.failed)
+
+
+class BulkUpserter:
+    def __init__(self, supabase, table, on_conflict="", ignore_duplicates=False,
+                 chunk_size=CHUNK_SIZE, max_retries=MAX_RETRIES, dedupe_key=None, log=print):
+        self.supabase = supabase
+        self.table = table
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.buffer = []    # [(row, ticket)]
+        # Upsert fails if one statement contains the same conflict key twice, and chunks
+        # now span callers, so only the first row per key is queued (later ones count as ok)
+        self.dedupe_key = dedupe_key
+        self.queued_keys = set()
+        self.log = log      # log(message) receives flush summaries and warnings
+        self.stats = {"flushes": 0, "requests": 0, "retries": 0, "rows_ok": 0, "rows_failed": 0, "seconds": 0.0}
+
+    def add(self, rows, on_done=None):
+        """
+        Queue rows. on_done(ok_rows, failed_rows) is called once every row of this
+        call has been written or given up on (immediately for an empty list).
+        """
+        if not rows:
+            if on_done:
+                on_done([], [])
+            return
+        ticket = _Ticket(len(rows), on_done)
+        for row in rows:
+            if self.dedupe_key:
+                key = row.get(self.dedupe_key)
+                if key in self.queued_keys:
+                    ticket.resolve(row, True)
+                    continue
+                self.queued_keys.add(key)
+            self.buffer.append((row, ticket))
+        while len(self.buffer) >= self.chunk_size:
+            self._flush_chunk(self.buffer[:self.chunk_size])
+            self.buffer = self.buffer[self.chunk_size:]
+
+    def flush(self):
+        """Write everything still buffered"""
+        while self.buffer:
+            self._flush_chunk(self.buffer[:self.chunk_size])
+            self.buffer = self.buffer[self.chunk_size:]
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['rows_ok']} rows written, {s['rows_failed']} failed in {s['flushes']} flushes "
+                f"({s['requests']} requests, {s['retries']} retries, {s['seconds']:.2f}s)")
+
+    def _flush_chunk(self, items):
+        start = time.time()
+        requests_before = self.stats["requests"]
+        retries_before = self.stats["retries"]
+        failed = self._write(items)
+        elapsed = time.time() - start
+
+        failed_ids = {id(item) for item in failed}
+        for item in items:
+            row, ticket = item
+            ok = id(item) not in failed_ids
+            self.stats["rows_ok" if ok else "rows_failed"] += 1
+            ticket.resolve(row, ok)
+
+        self.stats["flushes"] += 1
+        self.stats["seconds"] += elapsed
+        self.log(f"  💾 Flushed {len(items) - len(failed)}/{len(items)} rows to {self.table} in {elapsed:.2f}s "
+                 f"({self.stats['requests'] - requests_before} requests, {self.stats['retries'] - retries_before} retries)")
+
+    def _write(self, items):
+        """Upsert items, retrying transient errors and bisecting on bad data. Returns failed items."""
+        rows = [row for row, _ in items]
+        for attempt in range(self.max_retries + 1):
+            self.stats["requests"] += 1
+            try:
+                self.supabase.table(self.table).upsert(
+                    rows,
+                    on_conflict=self.on_conflict,
+                    ignore_duplicates=self.ignore_duplicates
+                ).execute()
+                return []
+            except Exception as e:
+                error = e
+                if is_transient(e) and attempt < self.max_retries:
+                    self.stats["retries"] += 1
+                    time.sleep(BACKOFF_BASE * 2 ** attempt)
+                    continue
+                break
+
+        if is_transient(error):
+            # Still failing after retries: the service is unhealthy, bisecting won't help
+            self.log(f"    ⚠️ Giving up on {len(items)} rows after {self.max_retries} retries: {error}")
+            return items
+        if len(items) == 1:
+            self.log(f"    ⚠️ Rejected row: {error}")
+            return items
+        mid = len(items) // 2
+        return self._write(items[:mid]) + self._write(items[mid:])
@@ -8,7 +8,7 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 from sklearn.manifold import MDS
 from sklearn.preprocessing import MinMaxScaler
-import google.generativeai as genai
+import embedding_model
 
 # Load env
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,32 +19,12 @@ url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 key = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 supabase: Client = create_client(url, key)
 
-# Gemini Setup (for embeddings)
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
 def get_embeddings(text_list):
+    """Local title embeddings (embedding server if running, else in-process model)"""
     if not text_list:
         return []
-    # Batch processing
-    batch_size = 100
-    all_embeddings = []
-    for i in range(0, len(text_list), batch_size):
-        batch = text_list[i:i+batch_size]
-        try:
-            print(f"    Getting embeddings for batch {i//batch_size + 1}...")
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=batch,
-                task_type="clustering",
-            )
-            emb = result['embedding']
-            print(f"    Got {len(emb)} embeddings. First vec sample: {emb[0][:3]}...")
-            all_embeddings.extend(emb)
-        except Exception as e:
-            print(f"    ⚠️ Error embedding batch: {e}")
-            # Fallback: zero vectors
-            all_embeddings.extend([[0]*768 for _ in range(len(batch))])
-    return all_embeddings
+    print(f"    Embedding {len(text_list)} titles locally ({embedding_model.MODEL_NAME})...")
+    return embedding_model.encode(text_list, show_progress_bar=False)
 
 def main():
     print("🚀 Calculating Constellation Coordinates...")
@@ -64,7 +44,7 @@ def main():
     mega_embeddings = get_embeddings(mega_titles)
     
     # 3. Calculate Megatopic Coordinates (MDS for global layout)
-    # Use MDS to project 768-dim to 2-dim preserving distances
+    # Use MDS to project 384-dim to 2-dim preserving distances
     mds = MDS(n_components=2, random_state=42, dissimilarity='euclidean')
     mega_coords = mds.fit_transform(mega_embeddings)
     
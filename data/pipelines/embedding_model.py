@@ -0,0 +1,167 @@
+"""
+Shared sentence-transformers embeddings.
+
+encode() first asks the local embedding server (embedding_server.py) at
+EMBEDDING_SERVER, which keeps the model warm and batches requests across
+scripts. Without a server, the model is loaded lazily once per process, so an
+in-process driver (run_all_clustering.py) holds a single copy and runs that
+find every vector in the embedding store never load it at all.
+EMBEDDING_BACKEND=onnx swaps in the int8 ONNX export (embedding_onnx.py). Its
+vectors are stored under their own ONNX_MODEL_NAME in the embedding store, so
+they are never mixed with PyTorch vectors in one clustering; store_model_name()
+is the name of whichever backend encode() will use (the server's, if one is up).
+"""
+
+import os
+import json
+import socket
+import threading
+import http.client
+import numpy as np
+from urllib.parse import urlparse
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+ONNX_MODEL_NAME = f"{MODEL_NAME}-onnx-int8"     # Embedding store name of int8 ONNX vectors (VARCHAR(50))
+# "http://host:port" or "unix:///path/to.sock"; "off" always embeds in-process
+EMBEDDING_SERVER = os.getenv("EMBEDDING_SERVER", "http://127.0.0.1:8765")
+# In-process backend: "torch" (sentence-transformers) or "onnx" (int8, see embedding_onnx.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+SERVER_TIMEOUT = 300
+
+_model = None
+_model_name = None          # Store name of the loaded model's vectors
+_model_lock = threading.Lock()
+_server_available = None    # None = not tried yet
+_server_model_name = None
+
+
+def get_model(backend=None):
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = _load_model(backend or EMBEDDING_BACKEND)
+        return _model
+
+
+def _load_model(backend):
+    global _model_name
+    if backend == "onnx":
+        try:
+            from embedding_onnx import OnnxEncoder, ONNX_MODEL_DIR
+            print(f"⏳ Loading int8 ONNX Embedding Model ({ONNX_MODEL_DIR})...")
+            model = OnnxEncoder()
+            _model_name = ONNX_MODEL_NAME
+            return model
+        except Exception as e:
+            print(f"  ⚠️ ONNX backend unavailable ({e}); run embedding_onnx.py to export. Using PyTorch.")
+    from sentence_transformers import SentenceTransformer
+    print(f"⏳ Loading Local Embedding Model ({MODEL_NAME})...")
+    model = SentenceTransformer(MODEL_NAME)
+    _model_name = MODEL_NAME
+    return model
+
+
+def local_model_name():
+    """Store name of in-process vectors (loads the model only for the onnx backend, which may fall back)"""
+    if _model is None and EMBEDDING_BACKEND != "onnx":
+        return MODEL_NAME
+    get_model()
+    return _model_name
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connect(address):
+    parsed = urlparse(address)
+    if parsed.scheme == "unix":
+        return _UnixHTTPConnection(parsed.path, SERVER_TIMEOUT)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=SERVER_TIMEOUT)
+
+
+def server_model_name(address=EMBEDDING_SERVER):
+    """Store name of the server's vectors, or None (and stop trying) if no server is reachable"""
+    global _server_available, _server_model_name
+    if address == "off" or _server_available is False:
+        return None
+    if _server_model_name is None:
+        conn = _connect(address)
+        try:
+            conn.request("GET", "/health")
+            response = conn.getresponse()
+            payload = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+            # Servers from before ONNX_MODEL_NAME only ran the PyTorch model
+            _server_model_name = json.loads(payload).get("store_model_name", MODEL_NAME)
+            _server_available = True
+        except Exception as e:
+            print(f"  No embedding server at {address} ({e.__class__.__name__}); embedding in-process.")
+            _server_available = False
+            return None
+        finally:
+            conn.close()
+    return _server_model_name
+
+
+def store_model_name():
+    """model_name under which encode()'s vectors belong in the embedding store"""
+    return server_model_name() or local_model_name()
+
+
+def encode_remote(texts, dtype="float32", address=EMBEDDING_SERVER):
+    """Embed via the server. Returns None (and stops trying) if no server is reachable."""
+    global _server_available, _server_model_name
+    if address == "off" or _server_available is False:
+        return None
+    conn = _connect(address)
+    try:
+        conn.request("POST", "/embed", body=json.dumps({"texts": list(texts), "dtype": dtype}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        shape = tuple(int(n) for n in response.getheader("X-Shape").split(","))
+        _server_model_name = response.getheader("X-Model") or _server_model_name or MODEL_NAME
+        vectors = np.frombuffer(payload, dtype=np.dtype(response.getheader("X-Dtype")).newbyteorder("<"))
+        _server_available = True
+        return vectors.reshape(shape)
+    except (ConnectionError, FileNotFoundError, socket.timeout, OSError) as e:
+        if _server_available is None:
+            print(f"  No embedding server at {address} ({e.__class__.__name__}); embedding in-process.")
+        _server_available = False
+        return None
+    except Exception as e:
+        print(f"  ⚠️ Embedding server error, embedding in-process: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def encode(texts, batch_size=32, show_progress_bar=True, dtype="float32"):
+    """Normalized embeddings (cosine similarity == dot product), one row per text"""
+    used_server = _server_model_name
+    vectors = encode_remote(texts, dtype)
+    if vectors is not None:
+        return vectors
+    if used_server and local_model_name() != used_server:
+        # Falling back would mix two models' vectors in one store lookup / clustering
+        raise RuntimeError(f"Embedding server lost; in-process backend ({local_model_name()}) "
+                           f"differs from the server's ({used_server})")
+    # encode() sorts by length internally, so one call over mixed inputs pads minimally
+    vectors = get_model().encode(
+        texts,
+        batch_size=batch_size,
+        show_progress_bar=show_progress_bar,
+        normalize_embeddings=True
+    )
+    return np.asarray(vectors, dtype=dtype)
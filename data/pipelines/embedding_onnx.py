@@ -0,0 +1,159 @@
+"""
+Optional int8-quantized ONNX backend for the title embedding model (CPU runners).
+
+    python data/pipelines/embedding_onnx.py            # export + quantize once
+    EMBEDDING_BACKEND=onnx python data/pipelines/...   # use it via embedding_model
+
+The transformer of paraphrase-multilingual-MiniLM-L12-v2 is exported with
+torch.onnx, dynamically quantized to int8 with onnxruntime, and run with the
+model's fast tokenizer; mean pooling + L2 normalization are done in numpy so the
+output matches SentenceTransformer.encode(normalize_embeddings=True).
+Texts are sorted by token length and padded only up to a small set of bucket
+lengths, so short headlines don't pay for max_seq_length.
+
+benchmark_onnx_embeddings.py checks accuracy (cosine, HDBSCAN labels) against
+the PyTorch backend and measures throughput. Needs onnxruntime + tokenizers
+(export also needs torch/sentence-transformers).
+"""
+
+import os
+import json
+import inspect
+import argparse
+import numpy as np
+from embedding_model import MODEL_NAME
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(CACHE_DIR, "onnx", MODEL_NAME))
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+BUCKETS = [16, 32, 64, 128]     # Padded sequence lengths; 128 = the model's max_seq_length
+
+
+def export(model_dir=ONNX_MODEL_DIR):
+    """Export the sentence-transformers model to ONNX and quantize it to int8"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    max_seq_length = st_model.max_seq_length
+
+    sample = tokenizer(["export sample"], padding="max_length", max_length=16, return_tensors="pt")
+    fp32_path = os.path.join(model_dir, FP32_FILE)
+    print(f"⏳ Exporting {MODEL_NAME} to {fp32_path}...")
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one handles dynamic_axes
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    class HiddenStates(torch.nn.Module):
+        # Keyword call: forward()'s positional parameters differ across transformers versions
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(transformer),
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+            **legacy
+        )
+
+    int8_path = os.path.join(model_dir, INT8_FILE)
+    print(f"⏳ Quantizing to int8: {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(model_dir)    # writes tokenizer.json for the fast tokenizer
+    with open(os.path.join(model_dir, "embedding_config.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": MODEL_NAME,
+            "max_seq_length": max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+        }, f, indent=2)
+    print(f"✅ Exported ({os.path.getsize(fp32_path) / 1e6:.0f}MB fp32 -> {os.path.getsize(int8_path) / 1e6:.0f}MB int8)")
+
+
+def bucket_length(length):
+    for bucket in BUCKETS:
+        if length <= bucket:
+            return bucket
+    return BUCKETS[-1]
+
+
+class OnnxEncoder:
+    """Drop-in for the subset of SentenceTransformer used by embedding_model"""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=True, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "embedding_config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.no_padding()
+        self.pad_id = self.tokenizer.token_to_id("<pad>") or 0
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, normalize_embeddings=True):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts)
+        order = np.argsort([len(e.ids) for e in encodings], kind="stable")
+        output = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            seq_len = bucket_length(max(len(encodings[i].ids) for i in batch))
+            input_ids = np.full((len(batch), seq_len), self.pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), seq_len), dtype=np.int64)
+            for row, i in enumerate(batch):
+                ids = encodings[i].ids[:seq_len]
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+
+            hidden = self.session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+            # Mean pooling over real tokens (the model's SentenceTransformer pooling)
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            output[batch] = pooled
+
+        if normalize_embeddings:
+            output /= np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+        return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the title embedding model to int8 ONNX")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR, help="Directory for the exported model")
+    args = parser.parse_args()
+    export(args.output)
+
+
+if __name__ == "__main__":
+    main()
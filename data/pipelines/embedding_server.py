@@ -0,0 +1,197 @@
+"""
+Local embedding server: keeps the sentence-transformers model warm and coalesces
+concurrent requests into dynamic batches.
+
+    python data/pipelines/embedding_server.py [--port 8765 | --socket /tmp/news-embed.sock]
+
+POST /embed  {"texts": [...], "dtype": "float32" | "float16"}
+    -> raw little-endian vectors (application/octet-stream), shape in X-Shape,
+       embedding store model name in X-Model
+GET  /health -> {"model": ..., "store_model_name": ..., "dim": ..., "batches": ..., "texts": ...}
+
+Requests queue up until MAX_BATCH texts are waiting or the oldest has waited
+MAX_WAIT_MS, then everything queued is encoded in one model call. Clients use
+embedding_model.encode(), which falls back to loading the model in-process when
+no server is running.
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+from socketserver import ThreadingMixIn, UnixStreamServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import embedding_model
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 256         # Texts per model call (a larger single request is encoded alone)
+MAX_WAIT_MS = 10        # How long the first queued request waits for company
+ENCODE_BATCH_SIZE = 64
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+class _Job:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Batcher:
+    def __init__(self, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.jobs = queue.Queue()
+        self.stats = {"batches": 0, "requests": 0, "texts": 0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def embed(self, texts):
+        job = _Job(texts)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error:
+            raise job.error
+        return job.result
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(job)
+                size += len(job.texts)
+            self._encode(batch)
+
+    def _encode(self, batch):
+        texts = [t for job in batch for t in job.texts]
+        try:
+            vectors = embedding_model.get_model().encode(
+                texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False, normalize_embeddings=True
+            )
+            vectors = np.asarray(vectors, dtype=np.float32)
+            offset = 0
+            for job in batch:
+                job.result = vectors[offset:offset + len(job.texts)]
+                offset += len(job.texts)
+        except Exception as e:
+            for job in batch:
+                job.error = e
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(batch)
+        self.stats["texts"] += len(texts)
+        for job in batch:
+            job.done.set()
+
+
+class EmbeddingHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error(404)
+            return
+        model = embedding_model.get_model()
+        self._send_json({
+            "model": embedding_model.MODEL_NAME,
+            "store_model_name": embedding_model.local_model_name(),
+            "dim": model.get_sentence_embedding_dimension(),
+            **self.batcher.stats,
+        })
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = [str(t) for t in body["texts"]]
+            dtype = DTYPES[body.get("dtype", "float32")]
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error(400, f"Bad request: {e}")
+            return
+        try:
+            vectors = self.batcher.embed(texts).astype(dtype) if texts else np.zeros((0, 0), dtype=dtype)
+        except Exception as e:
+            self.send_error(500, f"Encoding failed: {e}")
+            return
+        payload = vectors.astype(vectors.dtype.newbyteorder("<")).tobytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Shape", ",".join(str(n) for n in vectors.shape))
+        self.send_header("X-Dtype", vectors.dtype.name)
+        self.send_header("X-Model", embedding_model.local_model_name())
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local batching embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Texts per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="Max time a request waits to be batched")
+    args = parser.parse_args()
+
+    embedding_model.get_model()     # Load before accepting requests
+    EmbeddingHandler.batcher = Batcher(args.max_batch, args.max_wait_ms)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, EmbeddingHandler)
+        address = f"unix://{args.socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), EmbeddingHandler)
+        address = f"http://{args.host}:{args.port}"
+    print(f"🧠 Embedding server ({embedding_model.local_model_name()}) listening on {address} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms}ms)")
+    print(f"   Clients: export EMBEDDING_SERVER={address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Persistent embedding store backed by mvp2_embeddings.
+
+Vectors are looked up by (entity_type, entity_id, model_name) and reused only if
+the stored text_hash matches the text being embedded. Misses are encoded in one
+batch and written back in bulk, so a run only pays for articles/topics that are
+new (or whose text changed) since the previous run.
+
+Needs setup_embedding_store.sql. If the store can't be read, everything is
+computed locally as before.
+"""
+
+import json
+import hashlib
+import numpy as np
+from bulk_writer import BulkUpserter
+from embedding_model import store_model_name
+
+TABLE = "mvp2_embeddings"
+LOOKUP_CHUNK = 100      # ids per request (URL length), like fetch_article_details
+
+
+def text_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:32]
+
+
+def parse_vector(value):
+    """pgvector comes back from PostgREST as the text '[0.1,0.2,...]'"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def format_vector(vector):
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+class EmbeddingStore:
+    def __init__(self, supabase, entity_type, model_name=None):
+        self.supabase = supabase
+        self.entity_type = entity_type
+        # Vectors of different backends (PyTorch / int8 ONNX) are stored apart
+        self.model_name = model_name or store_model_name()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def lookup(self, ids, texts):
+        """Return {position: vector} for entities whose stored text_hash still matches"""
+        wanted = {}
+        for pos, (entity_id, text) in enumerate(zip(ids, texts)):
+            wanted.setdefault(str(entity_id), []).append((pos, text_hash(text)))
+
+        found = {}
+        unique_ids = list(wanted)
+        for i in range(0, len(unique_ids), LOOKUP_CHUNK):
+            chunk = unique_ids[i:i + LOOKUP_CHUNK]
+            response = self.supabase.table(TABLE) \
+                .select("entity_id, text_hash, embedding_vector") \
+                .eq("entity_type", self.entity_type) \
+                .eq("model_name", self.model_name) \
+                .in_("entity_id", chunk) \
+                .execute()
+            for row in response.data or []:
+                for pos, digest in wanted.get(str(row["entity_id"]), []):
+                    if row.get("text_hash") == digest:
+                        found[pos] = parse_vector(row["embedding_vector"])
+        return found
+
+    def save(self, ids, texts, vectors):
+        writer = BulkUpserter(self.supabase, TABLE, on_conflict="entity_type,entity_id,model_name",
+                              dedupe_key="entity_id")
+        writer.add([{
+            "entity_type": self.entity_type,
+            "entity_id": str(entity_id),
+            "model_name": self.model_name,
+            "text_hash": text_hash(text),
+            "source_text_en": text or "",
+            "embedding_vector": format_vector(vector),
+        } for entity_id, text, vector in zip(ids, texts, vectors)])
+        writer.flush()
+        return writer
+
+    def get_embeddings(self, ids, texts, encode):
+        """
+        Embeddings for texts (one row per position, same order), computing only the
+        misses with encode(list_of_texts) -> 2D array.
+        """
+        try:
+            found = self.lookup(ids, texts)
+        except Exception as e:
+            print(f"  ⚠️ Embedding store unavailable, computing all {len(texts)} embeddings: {e}")
+            return np.asarray(encode(list(texts)), dtype=np.float32)
+
+        missing = [pos for pos in range(len(texts)) if pos not in found]
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(missing)
+        print(f"  📦 Embedding store: {len(found)} reused, {len(missing)} to compute ({self.entity_type}, {self.model_name})")
+
+        if missing:
+            computed = np.asarray(encode([texts[pos] for pos in missing]), dtype=np.float32)
+            for pos, vector in zip(missing, computed):
+                found[pos] = vector
+            writer = self.save([ids[pos] for pos in missing], [texts[pos] for pos in missing], computed)
+            print(f"  {writer.summary()}")
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[pos] for pos in range(len(texts))])
@@ -0,0 +1,124 @@
+"""
+Shared RSS fetch primitive.
+
+Downloads feeds with requests using explicit connect/read timeouts, an overall
+deadline and a maximum body size. The deadline is a hard limit on the body: a
+timer shuts the connection's socket down when it expires, which also interrupts
+a server trickling bytes slowly enough to keep resetting the read timeout.
+Nothing here touches signals, so it is safe to call from worker threads
+(ThreadPoolExecutor) and from coroutines (fetch_async / fetch_feed_async),
+unlike the old SIGALRM timeout which only worked on the main thread.
+"""
+
+import time
+import socket
+import asyncio
+import threading
+import requests
+import feedparser
+from requests.structures import CaseInsensitiveDict
+
+CONNECT_TIMEOUT = 10                 # Seconds to establish the TCP/TLS connection
+READ_TIMEOUT = 20                    # Seconds to wait for any single chunk
+DEADLINE = 30                        # Seconds for the whole download
+MAX_BODY_BYTES = 10 * 1024 * 1024    # Largest feed body we accept (decoded)
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_HEADERS = {"User-Agent": feedparser.USER_AGENT}
+
+
+class FetchError(Exception):
+    """Base class for fetch limits being exceeded"""
+
+
+class DeadlineExceeded(FetchError, TimeoutError):
+    """The whole download took longer than the deadline"""
+
+
+class FeedTooLarge(FetchError):
+    """The response body exceeded max_bytes"""
+
+
+def _shutdown_socket(response, expired):
+    """Deadline timer: unblock a read in progress on the response's connection"""
+    expired.set()
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass    # Already closed
+
+
+def fetch(url, headers=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+          deadline=DEADLINE, max_bytes=MAX_BODY_BYTES):
+    """
+    Download url and return {"status", "headers", "content"} (headers are case-insensitive).
+
+    A 304 response is returned with empty content; other non-2xx statuses raise
+    requests.HTTPError. The body download is cut off at the deadline (counted from
+    the request); waiting for the status line and headers is bounded by the
+    connect/read timeouts only.
+    """
+    request_headers = dict(DEFAULT_HEADERS)
+    if headers:
+        request_headers.update(headers)
+
+    start = time.monotonic()
+    with requests.get(url, headers=request_headers, timeout=(connect_timeout, read_timeout), stream=True) as response:
+        if response.status_code == 304:
+            return {"status": 304, "headers": CaseInsensitiveDict(response.headers), "content": b""}
+        response.raise_for_status()
+
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise FeedTooLarge(f"Feed body is {content_length} bytes (max {max_bytes})")
+
+        expired = threading.Event()
+        timer = threading.Timer(max(0, deadline - (time.monotonic() - start)), _shutdown_socket, (response, expired))
+        timer.daemon = True
+        timer.start()
+        chunks = []
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FeedTooLarge(f"Feed body exceeded {max_bytes} bytes")
+                if expired.is_set():
+                    break
+                chunks.append(chunk)
+        except FetchError:
+            raise
+        except Exception as e:
+            # The shut down socket surfaces as a connection/protocol error
+            if expired.is_set():
+                raise DeadlineExceeded(f"Feed download exceeded {deadline} seconds") from e
+            raise
+        finally:
+            timer.cancel()
+        # ... or as an early end of the body
+        if expired.is_set():
+            raise DeadlineExceeded(f"Feed download exceeded {deadline} seconds")
+
+        return {"status": response.status_code, "headers": CaseInsensitiveDict(response.headers), "content": b"".join(chunks)}
+
+
+def parse_feed(response):
+    """Parse a fetch() response with feedparser, keeping header-based encoding detection"""
+    return feedparser.parse(response["content"], response_headers=dict(response["headers"]))
+
+
+def fetch_feed(url, **limits):
+    """fetch() + feedparser in one call. Accepts the same keyword limits as fetch()."""
+    return parse_feed(fetch(url, **limits))
+
+
+async def fetch_async(url, **limits):
+    """Coroutine wrapper around fetch() (runs in the default executor)"""
+    return await asyncio.to_thread(fetch, url, **limits)
+
+
+async def fetch_feed_async(url, **limits):
+    """Coroutine wrapper around fetch_feed() (runs in the default executor)"""
+    return await asyncio.to_thread(fetch_feed, url, **limits)
@@ -2,6 +2,7 @@ import os
 import json
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from article_store import get_articles
 
 # Load env
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -50,9 +51,8 @@ def main():
             
             # 3. Fetch Articles (Limit 5 per topic to keep it readable)
             if article_ids:
-                articles_response = supabase.table("mvp2_articles").select("title_ko, title_en").in_("id", article_ids[:5]).execute()
-                articles = articles_response.data
-                for a in articles:
+                articles = get_articles(supabase, article_ids[:5], ["title_ko", "title_en"])
+                for a in articles.values():
                     a_title = a.get('title_ko') or a.get('title_en')
                     output_lines.append(f"- {a_title}")
                 if len(article_ids) > 5:
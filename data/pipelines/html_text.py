@@ -0,0 +1,108 @@
+"""
+Fast HTML-to-text for RSS summaries.
+
+Produces the same text as BeautifulSoup(raw, "html.parser").get_text(separator=" ",
+strip=True) in the common cases, using a streaming html.parser tokenizer (or no
+parsing at all for plain text). Markup the fast path can't reproduce exactly
+(ambiguous entities, CDATA, unbalanced script/style, truncated tags) falls back
+to BeautifulSoup.
+"""
+
+import re
+import html
+from html.parser import HTMLParser
+
+# Strings inside these tags are not NavigableString in bs4, so get_text() skips them
+SKIPPED_CONTAINERS = {"script", "style", "template", "rt", "rp"}
+
+# Every '&' must start a well-formed reference for html.unescape to match bs4
+_AMP_RE = re.compile(r"&")
+_ENTITY_RE = re.compile(r"&(?:#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{0,31});")
+
+
+class MalformedMarkup(Exception):
+    pass
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.strings = []
+        self.buffer = []
+        self.container_stack = []
+
+    def _flush(self):
+        if self.buffer:
+            text = "".join(self.buffer)
+            self.buffer = []
+            # Strings inside skipped containers are dropped, like bs4's Script/Stylesheet strings
+            if not self.container_stack:
+                text = text.strip()
+                if text:
+                    self.strings.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in SKIPPED_CONTAINERS:
+            self.container_stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in SKIPPED_CONTAINERS:
+            if not self.container_stack or self.container_stack[-1] != tag:
+                raise MalformedMarkup(f"unbalanced </{tag}>")
+            self.container_stack.pop()
+
+    def handle_data(self, data):
+        self.buffer.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        # CDATA sections become CData strings in bs4; leave them to the fallback
+        raise MalformedMarkup("CDATA / unknown declaration")
+
+
+def fast_clean_html(raw):
+    """Return cleaned text, or None if the markup needs the BeautifulSoup fallback"""
+    if "&" in raw and len(_AMP_RE.findall(raw)) != len(_ENTITY_RE.findall(raw)):
+        return None
+
+    if "<" not in raw:
+        # Plain text: one string, entities decoded
+        return html.unescape(raw).strip() if "&" in raw else raw.strip()
+
+    parser = _TextExtractor()
+    try:
+        parser.feed(raw)
+    except MalformedMarkup:
+        return None
+    # Leftover input means a truncated tag/comment; let bs4 decide how to treat it
+    if parser.rawdata or parser.container_stack:
+        return None
+    parser._flush()
+    return " ".join(parser.strings)
+
+
+def clean_html_bs4(raw):
+    """Reference implementation (previous collector behaviour)"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(raw, "html.parser").get_text(separator=" ", strip=True)
+
+
+def clean_html(raw):
+    """Strip HTML from an RSS summary. Fast path first, BeautifulSoup for malformed markup."""
+    text = fast_clean_html(raw)
+    if text is None:
+        return clean_html_bs4(raw)
+    return text
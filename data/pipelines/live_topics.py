@@ -0,0 +1,218 @@
+"""
+Incremental topic clustering state for llm_topic_clustering_embedding.py --incremental.
+
+Each country keeps its live topics between runs (member article ids + the label
+Gemini produced and the membership it was produced for). A run:
+  1. drops members that left the 24h window (and topics left empty),
+  2. assigns new articles to the nearest live topic centroid if close enough,
+  3. micro-clusters the unassigned pool with HDBSCAN into new topics (only
+     clusters as tight as an assignment: no junk topic of leftovers),
+and every FULL_RECLUSTER_HOURS the whole window is re-clustered instead, with
+the new clusters matched back to old topics by member overlap so they keep
+their labels. Only topics whose membership changed by RELABEL_CHANGE or more
+since they were labeled go back to the LLM.
+
+Vectors aren't stored: centroids are recomputed from the (store-backed) window embeddings.
+"""
+
+import os
+import json
+import time
+import uuid
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+ASSIGN_MAX_DISTANCE = 0.30      # Cosine distance to a live centroid to join it
+FULL_RECLUSTER_HOURS = 6        # Full HDBSCAN consolidation at least this often
+MATCH_MIN_JACCARD = 0.5         # Consolidated cluster inherits an old topic above this overlap
+RELABEL_CHANGE = 0.3            # Relabel when |members Δ labeled members| / |labeled members| >= this
+
+
+def state_path(country_code):
+    return os.path.join(CACHE_DIR, f"live_topics_{country_code}.json")
+
+
+def jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+class LiveTopics:
+    def __init__(self, country_code, state=None):
+        state = state or {}
+        self.country_code = country_code
+        # topic_id -> {"members": [ids], "labeled_members": [ids], "label": {...} | None}
+        self.topics = state.get("topics", {})
+        self.pool = state.get("pool", [])           # Unassigned article ids still in the window
+        self.last_full_at = state.get("last_full_at", 0)
+        self.stats = {"assigned": 0, "pooled": 0, "new_topics": 0, "dropped": 0}
+
+    @classmethod
+    def load(cls, country_code):
+        try:
+            with open(state_path(country_code), "r", encoding="utf-8") as f:
+                return cls(country_code, json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(country_code)
+
+    def save(self):
+        path = state_path(self.country_code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"topics": self.topics, "pool": self.pool, "last_full_at": self.last_full_at}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def needs_full(self, now=None):
+        now = time.time() if now is None else now
+        return not self.topics or now - self.last_full_at >= FULL_RECLUSTER_HOURS * 3600
+
+    def prune(self, window_ids):
+        """Forget members (and topics) no longer in the current window"""
+        window = set(window_ids)
+        for topic_id in list(self.topics):
+            topic = self.topics[topic_id]
+            topic["members"] = [m for m in topic["members"] if m in window]
+            if not topic["members"]:
+                del self.topics[topic_id]
+                self.stats["dropped"] += 1
+        self.pool = [m for m in self.pool if m in window]
+
+    def _new_topic(self, members):
+        topic_id = uuid.uuid4().hex[:12]
+        self.topics[topic_id] = {"members": list(members), "labeled_members": [], "label": None}
+        self.stats["new_topics"] += 1
+        return topic_id
+
+    def centroids(self, ids, embeddings):
+        """(topic_ids, normalized centroid matrix) from the current window embeddings"""
+        position = {aid: i for i, aid in enumerate(ids)}
+        topic_ids, rows = [], []
+        for topic_id, topic in self.topics.items():
+            idx = [position[m] for m in topic["members"] if m in position]
+            if idx:
+                topic_ids.append(topic_id)
+                rows.append(embeddings[idx].mean(axis=0))
+        if not rows:
+            return [], np.zeros((0, embeddings.shape[1]), dtype=embeddings.dtype)
+        centroids = np.vstack(rows)
+        centroids /= np.clip(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12, None)
+        return topic_ids, centroids
+
+    def assign(self, ids, embeddings, cluster_fn):
+        """
+        Incremental step: new ids join the nearest live centroid within ASSIGN_MAX_DISTANCE;
+        the rest join the pool, which cluster_fn(pool_embeddings) -> labels (-1 = noise)
+        turns into new micro-cluster topics. Clusters with a member farther than
+        ASSIGN_MAX_DISTANCE from the other members' centroid stay in the pool
+        (cluster_fn may lump unrelated leftovers into one cluster).
+        """
+        known = {m for t in self.topics.values() for m in t["members"]} | set(self.pool)
+        position = {aid: i for i, aid in enumerate(ids)}
+        new_ids = [aid for aid in ids if aid not in known]
+
+        topic_ids, centroids = self.centroids(ids, embeddings)
+        if new_ids and topic_ids:
+            sims = embeddings[[position[aid] for aid in new_ids]] @ centroids.T
+            best = sims.argmax(axis=1)
+            for aid, j, sim in zip(new_ids, best, sims[np.arange(len(new_ids)), best]):
+                if 1 - sim <= ASSIGN_MAX_DISTANCE:
+                    self.topics[topic_ids[j]]["members"].append(aid)
+                    self.stats["assigned"] += 1
+                else:
+                    self.pool.append(aid)
+        else:
+            self.pool.extend(new_ids)
+
+        if len(self.pool) >= 2:
+            labels = cluster_fn(embeddings[[position[aid] for aid in self.pool]])
+            remaining = []
+            groups = {}
+            for aid, label in zip(self.pool, labels):
+                if label == -1:
+                    remaining.append(aid)
+                else:
+                    groups.setdefault(label, []).append(aid)
+            for members in groups.values():
+                if self._cohesive(members, position, embeddings):
+                    self._new_topic(members)
+                else:
+                    remaining.extend(members)
+            self.pool = remaining
+        self.stats["pooled"] = len(self.pool)
+
+    @staticmethod
+    def _cohesive(members, position, embeddings):
+        """
+        A pool cluster becomes a topic only if every member could have joined a topic
+        made of the other members (within ASSIGN_MAX_DISTANCE of their centroid).
+        """
+        vectors = embeddings[[position[aid] for aid in members]].astype(np.float64)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        others = vectors.sum(axis=0) - vectors
+        others /= np.clip(np.linalg.norm(others, axis=1, keepdims=True), 1e-12, None)
+        return bool((1 - (vectors * others).sum(axis=1) <= ASSIGN_MAX_DISTANCE).all())
+
+    def consolidate(self, ids, labels, now=None):
+        """
+        Full step: replace topics with the clusters of a full HDBSCAN run (labels
+        aligned with ids). A cluster overlapping an old topic by MATCH_MIN_JACCARD
+        keeps its id and label, so it's only relabeled if it changed materially.
+        """
+        groups = {}
+        for aid, label in zip(ids, labels):
+            if label != -1:
+                groups.setdefault(label, []).append(aid)
+
+        old = {topic_id: set(t["members"]) for topic_id, t in self.topics.items()}
+        previous, self.topics = self.topics, {}
+        # Largest clusters pick first
+        for members in sorted(groups.values(), key=len, reverse=True):
+            member_set = set(members)
+            best_id, best_score = None, MATCH_MIN_JACCARD
+            for topic_id, old_members in old.items():
+                score = jaccard(member_set, old_members)
+                if score >= best_score:
+                    best_id, best_score = topic_id, score
+            if best_id is None:
+                self._new_topic(members)
+                continue
+            del old[best_id]
+            self.topics[best_id] = {**previous[best_id], "members": members}
+        self.stats["dropped"] += len(old)
+        self.pool = [aid for aid, label in zip(ids, labels) if label == -1]
+        self.stats["pooled"] = len(self.pool)
+        self.last_full_at = time.time() if now is None else now
+
+    def needs_label(self, topic_id):
+        topic = self.topics[topic_id]
+        if not topic.get("label"):
+            return True
+        labeled = set(topic["labeled_members"])
+        changed = len(labeled ^ set(topic["members"]))
+        return changed / max(len(labeled), 1) >= RELABEL_CHANGE
+
+    def set_label(self, topic_id, label):
+        topic = self.topics[topic_id]
+        topic["label"] = label
+        topic["labeled_members"] = list(topic["members"])
+
+    def stances(self, topic_id):
+        """
+        Label stances restricted to current members; members added since labeling
+        (and not flagged as outliers) go to factual, like the labeler's own fallback.
+        """
+        topic = self.topics[topic_id]
+        label = topic["label"]
+        members = set(topic["members"])
+        stances = {key: [m for m in label["stances"].get(key, []) if m in members]
+                   for key in ("factual", "critical", "supportive")}
+        placed = {m for ids in stances.values() for m in ids} | set(label.get("outliers", []))
+        stances["factual"].extend(m for m in topic["members"] if m not in placed)
+        return stances
+
+    def summary(self):
+        s = self.stats
+        return (f"{len(self.topics)} live topics: {s['assigned']} assigned to existing, "
+                f"{s['new_topics']} new, {s['dropped']} dropped, {s['pooled']} unassigned")
@@ -0,0 +1,192 @@
+"""
+Shared on-disk cache of Gemini responses (local SQLite).
+
+Re-running a step (after a crash, a failed publish, or while debugging) sends
+exactly the same prompts again. Response texts are cached under a hash of
+(model, generation config, prompt) and looked up before the request is rate
+limited or sent, so a rerun over an unchanged window costs next to nothing.
+Entries expire after TTL_HOURS; beyond MAX_MB of cached text the least recently
+used are evicted. Used through rate_limiter.generate_content() and
+rate_limiter.generate_content_client(); bypass with LLM_CACHE=off or a script's
+--no-llm-cache flag. Safe to share across threads and processes.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_responses.sqlite3"))
+
+TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "72"))
+MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+
+
+def _canonical(value):
+    """JSON-able form of prompts and configs (dicts, SDK config objects, content parts)"""
+    if hasattr(value, "model_dump"):        # google-genai pydantic types
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def cache_key(model_name, config, contents):
+    raw = json.dumps([model_name.split("/")[-1], _canonical(config), _canonical(contents)],
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_json(text):
+    """validate= helper for prompts that must answer with (possibly fenced) JSON"""
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    try:
+        json.loads(text.strip())
+        return True
+    except ValueError:
+        return False
+
+
+class CachedResponse:
+    """Stands in for an SDK response: callers only read .text"""
+    usage_metadata = None
+    cached = True
+
+    def __init__(self, text):
+        self.text = text
+
+
+class LLMCache:
+    def __init__(self, path=CACHE_PATH, ttl_hours=TTL_HOURS, max_mb=MAX_MB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Several pipeline processes may run at once (parallel enrichment)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached response text, or None (counts a hit/miss)"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, model_name, text):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, text, len(text.encode("utf-8")), now, now)
+            )
+            self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_bytes. Returns rows removed."""
+        with self.lock:
+            removed = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            removed += self.conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used_at DESC) AS running_size FROM responses
+                    ) WHERE running_size > ?
+                )
+            """, (self.max_bytes,)).rowcount
+            self.conn.commit()
+        return removed
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"LLM cache: {self.hits} hits / {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_disabled = os.getenv("LLM_CACHE", "").lower() in ("0", "off", "false", "no")
+
+
+def disable():
+    """Bypass the cache for this process (--no-llm-cache)"""
+    global _disabled
+    _disabled = True
+
+
+def get_cache():
+    """The process-wide cache (evicted once when opened), or None when bypassed"""
+    global _cache
+    if _disabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+            _cache.evict()
+        return _cache
+
+
+def lookup(model_name, config, contents):
+    """(key, CachedResponse or None); key is None when the cache is bypassed"""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(model_name, config, contents)
+    text = cache.get(key)
+    return key, (CachedResponse(text) if text is not None else None)
+
+
+def store(key, model_name, response, validate=None):
+    """Cache a successful response's text (if validate(text) accepts it)"""
+    if key is None:
+        return
+    try:
+        text = response.text
+    except Exception:
+        return      # Blocked / empty candidates: nothing to reuse
+    if text and (validate is None or validate(text)):
+        get_cache().put(key, model_name.split("/")[-1], text)
+
+
+def summary():
+    if _disabled:
+        return "LLM cache: bypassed"
+    return _cache.summary() if _cache else "LLM cache: unused"
@@ -5,6 +5,8 @@ import re
 from google import genai
 from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
 from supabase import create_client, Client
+from rate_limiter import generate_content_client
+import llm_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -110,10 +112,7 @@ def run_council_meeting(topic_title, context_str, ai_summary):
         짧고 굵게 핵심만 3~5문장으로 답변하세요.
         """
         try:
-            response = client.models.generate_content(
-                model=model_id,
-                contents=prompt
-            )
+            response = generate_content_client(client, model_id, prompt)
             insights[key] = response.text
         except Exception as e:
             print(f"⚠️ Failed to consult {key}: {e}")
@@ -203,10 +202,11 @@ def generate_editor_comment(topic_title, articles, ai_summary=""):
     """
 
     try:
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=GenerateContentConfig(
+        response = generate_content_client(
+            client,
+            model_id,
+            prompt,
+            GenerateContentConfig(
                 tools=[google_search_tool]
             )
         )
@@ -220,8 +220,11 @@ def main():
     parser.add_argument("--limit", type=int, default=5, help="Number of topics to process")
     parser.add_argument("--force", action="store_true", help="Reprocess topics that already have comments")
     parser.add_argument("--all", action="store_true", help="Process all topics in batches")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
     parser.add_argument("--threshold", type=int, default=1, help="Minimum number of countries required")
     args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_cache.disable()
 
     if args.all:
         print(f"Processing ALL eligible global topics (>={args.threshold} countries) in batches...")
@@ -265,3 +268,4 @@ def process_batch(topics):
 
 if __name__ == "__main__":
     main()
+    print(llm_cache.summary())
@@ -4,6 +4,8 @@ import argparse
 from google import genai
 from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
 from supabase import create_client, Client
+from rate_limiter import generate_content_client
+import llm_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -77,10 +79,11 @@ def generate_summary(topic_title, articles):
 """
 
     try:
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=GenerateContentConfig(
+        response = generate_content_client(
+            client,
+            model_id,
+            prompt,
+            GenerateContentConfig(
                 tools=[google_search_tool]
             )
         )
@@ -94,7 +97,10 @@ def main():
     parser.add_argument("--limit", type=int, default=5, help="Number of topics to process")
     parser.add_argument("--force", action="store_true", help="Reprocess topics that already have summaries")
     parser.add_argument("--all", action="store_true", help="Process all topics in batches")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
     args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_cache.disable()
 
     if args.all:
         print("Processing ALL global topics in batches...")
@@ -133,3 +139,4 @@ def process_batch(topics):
 
 if __name__ == "__main__":
     main()
+    print(llm_cache.summary())
@@ -1,10 +1,13 @@
 import os
+import sys
 import json
-import time
 import google.generativeai as genai
 from supabase import create_client, Client
+from article_store import get_articles
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from rate_limiter import generate_content
+import llm_cache
 
 # Load env
 # Load env
@@ -41,9 +44,9 @@ def fetch_article_titles(article_ids):
     try:
         # Limit to 3 IDs to avoid huge queries
         target_ids = article_ids[:3]
-        response = supabase.table("mvp2_articles").select("title_ko, title_original").in_("id", target_ids).execute()
+        rows = get_articles(supabase, target_ids, ["title_ko", "title_original"])
         titles = []
-        for row in response.data:
+        for row in rows.values():
             # Prefer Korean title, fallback to original
             t = row.get('title_ko') or row.get('title_original')
             if t:
@@ -92,7 +95,7 @@ Examples (Bad - Avoid these styles):
 Output: Just the headline string.
 """
     try:
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt)
         return response.text.strip().replace('"', '').replace("'", "")
     except Exception as e:
         print(f"    ⚠️ Headline generation failed: {e}")
@@ -133,7 +136,6 @@ def process_megatopics():
             if headline:
                 print(f"    -> {headline}")
                 supabase.table("mvp2_megatopics").update({"headline": headline}).eq("id", t['id']).execute()
-                time.sleep(1) # Rate limit
                 count += 1
             else:
                 print("    -> Failed.")
@@ -174,7 +176,6 @@ def process_local_topics():
             if headline:
                 print(f"    -> {headline}")
                 supabase.table("mvp2_topics").update({"headline": headline}).eq("id", t['id']).execute()
-                time.sleep(1)
                 count += 1
             else:
                 print("    -> Failed.")
@@ -185,8 +186,11 @@ def process_local_topics():
 
 def main():
     print("🚀 Starting Headline Generator...")
+    if "--no-llm-cache" in sys.argv:
+        llm_cache.disable()
     process_megatopics()
     process_local_topics()
+    print(llm_cache.summary())
     print("✅ Headline Generation Complete.")
 
 if __name__ == "__main__":
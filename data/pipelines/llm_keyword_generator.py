@@ -1,10 +1,12 @@
 import os
+import sys
 import json
-import time
 import google.generativeai as genai
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from rate_limiter import generate_content
+import llm_cache
 
 # Load env
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -55,7 +57,7 @@ Rules:
 Output JSON:
 """
     try:
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt, validate=llm_cache.is_json)
         text = response.text.strip()
         if "```json" in text:
             text = text.split("```json")[1].split("```")[0].strip()
@@ -93,7 +95,6 @@ def process_topics():
                 if keywords:
                     print(f"    -> {keywords}")
                     supabase.table("mvp2_topics").update({"keywords": keywords}).eq("id", t['id']).execute()
-                    time.sleep(0.5)
                     count += 1
                 else:
                     print("    -> Failed.")
@@ -104,4 +105,7 @@ def process_topics():
         print(f"❌ Error processing topics: {e}")
 
 if __name__ == "__main__":
+    if "--no-llm-cache" in sys.argv:
+        llm_cache.disable()
     process_topics()
+    print(llm_cache.summary())
@@ -2,6 +2,7 @@ import os
 # GRPC DNS Resolver Workaround
 os.environ["GRPC_DNS_RESOLVER"] = "native"
 
+import sys
 import json
 import glob
 import time
@@ -12,6 +13,11 @@ from sklearn.metrics.pairwise import cosine_distances
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from datetime import datetime, timedelta
+from embedding_store import EmbeddingStore
+from megatopic_clustering import cluster_megatopics
+from rate_limiter import generate_content
+import embedding_model
+import llm_cache
 
 # Load environment variables
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,29 +32,20 @@ if not GOOGLE_API_KEY:
     load_dotenv(os.path.join(script_dir, ".env"))
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-from sentence_transformers import SentenceTransformer
-
-# Load Local Model (Multilingual)
-# This will download the model on first run (approx 500MB)
-print("⏳ Loading Local Embedding Model (paraphrase-multilingual-MiniLM-L12-v2)...")
-embed_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-
-def get_embeddings(texts, batch_size=100):
-    """Generate embeddings locally using sentence-transformers"""
+def encode_texts(texts, batch_size=100):
+    """Generate embeddings locally using sentence-transformers (loaded on first use)"""
     print(f"Generating embeddings locally for {len(texts)} topics (Batch Size: {batch_size})...")
-    
-    # encode returns numpy array by default
-    # normalize_embeddings=True ensures cosine similarity works well
-    embeddings = embed_model.encode(
-        texts, 
-        batch_size=batch_size, 
-        show_progress_bar=True, 
-        normalize_embeddings=True
-    )
-    return embeddings
+    return embedding_model.encode(texts, batch_size=batch_size)
+
+def get_embeddings(supabase_client, texts, ids, batch_size=100):
+    """Reuse stored topic-name embeddings (mvp2_embeddings), computing only new/renamed topics"""
+    store = EmbeddingStore(supabase_client, "topic")
+    return store.get_embeddings(ids, texts, lambda missing: encode_texts(missing, batch_size))
 
 def main():
     print("🚀 Starting Megatopic Analysis...")
+    if "--no-llm-cache" in sys.argv:
+        llm_cache.disable()
     
     # 1. Fetch Topics from DB (Stateless for GitHub Actions)
     print("Fetching recent topics from Supabase DB...")
@@ -108,22 +105,16 @@ def main():
 
     # 2. Embed Topic Names
     topic_names = [t['name'] for t in all_topics]
-    embeddings = get_embeddings(topic_names)
+    embeddings = get_embeddings(supabase_client, topic_names, [t['id'] for t in all_topics])
     
     # 3. Cluster Topics (Megatopics)
-    # Use AgglomerativeClustering with cosine metric
-    print("Clustering into Megatopics (AgglomerativeClustering)...")
-    from sklearn.cluster import AgglomerativeClustering
+    # Cosine average linkage on a sparse radius graph (megatopic_clustering.py): same labels
+    # as AgglomerativeClustering over all topics, without its n x n distance matrix
+    print("Clustering into Megatopics (average linkage on radius graph)...")
     
     # Threshold 0.20: Stricter to prevent "Sports + Misc" garbage clusters (User Request)
     # linkage='average': Produces more balanced clusters than 'complete'
-    clusterer = AgglomerativeClustering(
-        n_clusters=None, 
-        distance_threshold=0.20, 
-        metric='cosine', 
-        linkage='average'
-    )
-    labels = clusterer.fit_predict(embeddings)
+    labels = cluster_megatopics(embeddings, threshold=0.20, method="average")
     
     n_clusters = len(set(labels))
     print(f"Found {n_clusters} Megatopics.")
@@ -184,7 +175,7 @@ Output JSON:
 """
         try:
             print("    ⏳ Asking Gemini for Global Label & Outliers...", flush=True)
-            response = model.generate_content(prompt)
+            response = generate_content(model, prompt, validate=llm_cache.is_json)
             text = response.text
             if "```json" in text:
                 text = text.split("```json")[1].split("```")[0].strip()
@@ -277,11 +268,12 @@ Output JSON:
             "category": category,
             "created_at": datetime.utcnow().isoformat()
         })
-        time.sleep(1) # Rate limit safety
 
     # Sort Megatopics by global reach (number of countries) then total articles
     final_output.sort(key=lambda x: (len(x['countries']), x['total_articles']), reverse=True)
     
+    print(llm_cache.summary())
+    
     output_file = os.path.join(script_dir, "megatopics.json")
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(final_output, f, ensure_ascii=False, indent=2)
@@ -5,6 +5,7 @@ import difflib
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from article_store import get_articles
 from google import genai
 from google.genai import types
 from PIL import Image
@@ -67,12 +68,8 @@ client = genai.Client(api_key=GOOGLE_API_KEY)
 
 def fetch_article_titles(article_ids):
     if not article_ids: return {}
-    try:
-        response = supabase.table("mvp2_articles").select("id, title_ko, title_en").in_("id", article_ids).execute()
-        return {row['id']: (row.get('title_ko') or row.get('title_en')) for row in response.data}
-    except Exception as e:
-        print(f"  ⚠️ Error fetching articles: {e}")
-        return {}
+    rows = get_articles(supabase, article_ids, ["title_ko", "title_en"])
+    return {aid: (row.get('title_ko') or row.get('title_en')) for aid, row in rows.items()}
 
 def generate_thumbnail_prompt(topic, article_map):
     try:
@@ -232,6 +229,10 @@ def main():
         topics_with_thumbnails = res_existing.data
         print(f"Found {len(topics_with_thumbnails)} existing thumbnails for reuse check.")
         
+        # Load every topic's article titles up front (concurrent chunks); per-topic lookups hit the cache
+        fetch_article_titles([aid for topic in topics for stance in (topic.get('stances') or {}).values()
+                              for aid in stance or []])
+        
         for topic in topics:
             print(f"\nProcessing: {topic['topic_name']}")
             
@@ -1,12 +1,12 @@
 import os
 import json
 import time
-import sys
+import argparse
 import numpy as np
 from datetime import datetime, timedelta
 from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_distances
 
 # Fix gRPC DNS resolution issue (caused by sentence-transformers conflict)
 os.environ['GRPC_DNS_RESOLVER'] = 'native'
@@ -14,6 +14,12 @@ os.environ['GRPC_DNS_RESOLVER'] = 'native'
 import google.generativeai as genai
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from near_duplicates import collapse_duplicates, expand_duplicates
+from rate_limiter import generate_content, get_limiter
+import llm_cache
+from embedding_store import EmbeddingStore
+import embedding_model
+from live_topics import LiveTopics
 
 # Load environment variables
 if not load_dotenv():
@@ -50,6 +56,15 @@ model = genai.GenerativeModel(
     }
 )
 
+# Concurrent labeling: the shared rate limiter paces the requests, this only bounds
+# how many are in flight (~1 request/second per worker saturates the RPM budget)
+MAX_LABEL_WORKERS = int(os.getenv("LABEL_WORKERS", "8"))
+# Batched labeling: up to LABEL_BATCH_SIZE small clusters share one request (1 = off)
+LABEL_BATCH_SIZE = int(os.getenv("LABEL_BATCH_SIZE", "5"))
+BATCH_MAX_ARTICLES = 8      # Larger clusters always get their own request
+MEDOID_TIE_TOLERANCE = 1e-7    # Cosine distances this close count as a tie for the medoid
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 30, 60]     # Histogram upper bounds (seconds)
+
 def fetch_articles(country_code):
     print(f"Fetching articles for {country_code} (Last 24 hours)...")
     
@@ -59,51 +74,25 @@ def fetch_articles(country_code):
 
     # Fetch both EN and KO titles. Use EN for embedding (better quality), KO for fallback naming if needed.
     response = supabase.table("mvp2_articles") \
-        .select("id, title_en, title_ko, published_at, source_name") \
+        .select("id, title_en, title_ko, published_at, source_name, dup_group_id") \
         .eq("country_code", country_code) \
         .not_.is_("title_en", "null") \
         .gte("published_at", time_threshold) \
         .execute()
     return response.data
 
-from sentence_transformers import SentenceTransformer
-
-# Load Local Model (Multilingual)
-print("⏳ Loading Local Embedding Model (paraphrase-multilingual-MiniLM-L12-v2)...")
-embed_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-
-def get_embeddings(texts, batch_size=32):
-    """Generate embeddings locally using sentence-transformers"""
+def encode_texts(texts, batch_size=32):
+    """Generate embeddings locally using sentence-transformers (shared model, loaded on first use)"""
     print(f"Generating embeddings locally for {len(texts)} articles (Batch Size: {batch_size})...")
-    
-    # encode returns numpy array by default
-    # normalize_embeddings=True ensures cosine similarity works well
-    embeddings = embed_model.encode(
-        texts, 
-        batch_size=batch_size, 
-        show_progress_bar=True, 
-        normalize_embeddings=True
-    )
-    return embeddings
+    return embedding_model.encode(texts, batch_size=batch_size)
 
-def generate_topic_label(cluster_articles, centroid_title):
-    """
-    Generates a topic label, keywords, category, and stance classification using Gemini.
-    Uses index-based mapping to avoid UUID hallucinations.
-    """
-    # Create index mapping
-    article_map = {i+1: a for i, a in enumerate(cluster_articles)}
-    
-    # Format input with indices
-    input_text = "\n".join([f"{i+1}. {a['title_en']}" for i, a in enumerate(cluster_articles)])
-    
-    prompt = f"""
-    Role: Professional News Editor & Data Analyst
-    Task: Analyze the following news articles (clustered by similarity) and provide a structured summary.
-
-    Articles:
-    {input_text}
+def get_embeddings(texts, ids, batch_size=32):
+    """Reuse stored article embeddings (mvp2_embeddings), computing only new/changed titles"""
+    store = EmbeddingStore(supabase, "article")
+    return store.get_embeddings(ids, texts, lambda missing: encode_texts(missing, batch_size))
 
+# Shared by the single-cluster and batched labeling prompts
+LABEL_INSTRUCTIONS = """
     # Requirements
     1. **Topic Name**: Create a concise, neutral, descriptive topic name in KOREAN. (e.g., "비트코인 10만 달러 돌파")
     2. **Keywords**: Extract 3-5 keywords (KOREAN).
@@ -138,77 +127,90 @@ def generate_topic_label(cluster_articles, centroid_title):
     - **🔴 Critical**: Focuses on failure, conflict, or anxiety. Keywords: "논란", "비판", "우려", "위기", "급락", "망신".
     - **🟢 Supportive**: Focuses on success, defense, or hope. Keywords: "성공", "기대", "호평", "돌파", "순항".
     - **🔵 Factual**: Dry delivery of info/stats without emotional coloring. Keywords: "발표", "개최", "출시", "수치 나열".
+"""
 
-    # Output Format (JSON Only)
-    {{
-    "topic_name": "Headline",
-    "keywords": ["Key1", "Key2"],
-    "category": "Category",
-    "stances": {{
-        "factual": [index, ...],
-        "critical": [index, ...],
-        "supportive": [index, ...]
-    }},
-    "outliers": [index, ...]
-    }}
+def map_indices_to_ids(indices, article_map):
+    """Safely map 1-based prompt indices to article IDs"""
+    mapped_ids = []
+    for idx in indices:
+        try:
+            # Handle if LLM returns string "1" instead of int 1
+            idx_int = int(idx)
+            if idx_int in article_map:
+                mapped_ids.append(article_map[idx_int]['id'])
+        except:
+            continue
+    # DEBUG
+    print(f"    DEBUG: Mapped indices {indices} -> {mapped_ids}")
+    return mapped_ids
+
+def parse_json_response(text):
+    # Clean markdown code blocks if present
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return json.loads(text)
+
+def is_valid_label(result):
+    """A label result must have a topic name and index lists for the stances"""
+    if not isinstance(result, dict):
+        return False
+    if not isinstance(result.get("topic_name"), str) or not result["topic_name"].strip():
+        return False
+    stances = result.get("stances", {})
+    if not isinstance(stances, dict):
+        return False
+    return all(isinstance(stances.get(key, []), list) for key in ("factual", "critical", "supportive")) \
+        and isinstance(result.get("outliers", []), list)
+
+def map_label_result(result, cluster_articles, centroid_title):
+    """Map one label result's indices to article IDs"""
+    article_map = {i+1: a for i, a in enumerate(cluster_articles)}
+    raw_stances = result.get("stances", {})
+    mapped_stances = {
+        "factual": map_indices_to_ids(raw_stances.get("factual", []), article_map),
+        "critical": map_indices_to_ids(raw_stances.get("critical", []), article_map),
+        "supportive": map_indices_to_ids(raw_stances.get("supportive", []), article_map)
+    }
+    
+    # Map outliers
+    mapped_outliers = map_indices_to_ids(result.get('outliers', []), article_map)
+    
+    # Ensure all articles are accounted for (fallback to factual if missing)
+    # Exclude outliers from this check
+    all_classified_ids = set(mapped_stances["factual"] + mapped_stances["critical"] + mapped_stances["supportive"] + mapped_outliers)
+    for a in cluster_articles:
+        if a['id'] not in all_classified_ids:
+            mapped_stances["factual"].append(a['id'])
+    
+    return {
+        "topic_name": result.get("topic_name", centroid_title),
+        "keywords": result.get("keywords", []),
+        "category": result.get("category", "Unclassified"),
+        "stances": mapped_stances,
+        "outliers": mapped_outliers
+    }
+
+def is_valid_label_text(text):
+    try:
+        return is_valid_label(parse_json_response(text))
+    except ValueError:
+        return False
+
+def request_label_json(prompt, validate=llm_cache.is_json, retries=3):
+    """
+    Send a labeling prompt; parsed JSON, or None after retries / a non-retriable error.
+    Only responses passing validate(text) are kept in the LLM response cache.
     """
-    retries = 3
     for attempt in range(retries):
         try:
             print("    ⏳ Asking Gemini...", flush=True)
-            response = model.generate_content(prompt)
+            response = generate_content(model, prompt, validate=validate)
             text = response.text
             # DEBUG: Print raw response
             print(f"    🔍 Raw LLM Response: {text}", flush=True)
-            
-            # Clean markdown code blocks if present
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-                
-            result = json.loads(text)
-            
-            # Helper to safely map indices to article IDs
-            def map_indices_to_ids(indices, article_map):
-                mapped_ids = []
-                for idx in indices:
-                    try:
-                        # Handle if LLM returns string "1" instead of int 1
-                        idx_int = int(idx)
-                        if idx_int in article_map:
-                            mapped_ids.append(article_map[idx_int]['id'])
-                    except:
-                        continue
-                # DEBUG
-                print(f"    DEBUG: Mapped indices {indices} -> {mapped_ids}")
-                return mapped_ids
-
-            raw_stances = result.get("stances", {})
-            mapped_stances = {
-                "factual": map_indices_to_ids(raw_stances.get("factual", []), article_map),
-                "critical": map_indices_to_ids(raw_stances.get("critical", []), article_map),
-                "supportive": map_indices_to_ids(raw_stances.get("supportive", []), article_map)
-            }
-            
-            # Map outliers
-            raw_outliers = result.get('outliers', [])
-            mapped_outliers = map_indices_to_ids(raw_outliers, article_map)
-            
-            # Ensure all articles are accounted for (fallback to factual if missing)
-            # Exclude outliers from this check
-            all_classified_ids = set(mapped_stances["factual"] + mapped_stances["critical"] + mapped_stances["supportive"] + mapped_outliers)
-            for a in cluster_articles:
-                if a['id'] not in all_classified_ids:
-                    mapped_stances["factual"].append(a['id'])
-            
-            return {
-                "topic_name": result.get("topic_name", centroid_title),
-                "keywords": result.get("keywords", []),
-                "category": result.get("category", "Unclassified"),
-                "stances": mapped_stances,
-                "outliers": mapped_outliers
-            }
+            return parse_json_response(text)
 
         except Exception as e:
             print(f"    ⚠️ Labeling failed (Attempt {attempt+1}/{retries}): {e}")
@@ -224,6 +226,41 @@ def generate_topic_label(cluster_articles, centroid_title):
                 # Non-retriable error (safety filter, JSON parse error, etc)
                 print(f"    ⛔ Non-retriable error. Skipping to fallback.")
                 break
+    return None
+
+def generate_topic_label(cluster_articles, centroid_title):
+    """
+    Generates a topic label, keywords, category, and stance classification using Gemini.
+    Uses index-based mapping to avoid UUID hallucinations.
+    """
+    # Format input with indices
+    input_text = "\n".join([f"{i+1}. {a['title_en']}" for i, a in enumerate(cluster_articles)])
+    
+    prompt = f"""
+    Role: Professional News Editor & Data Analyst
+    Task: Analyze the following news articles (clustered by similarity) and provide a structured summary.
+
+    Articles:
+    {input_text}
+{LABEL_INSTRUCTIONS}
+    # Output Format (JSON Only)
+    {{
+    "topic_name": "Headline",
+    "keywords": ["Key1", "Key2"],
+    "category": "Category",
+    "stances": {{
+        "factual": [index, ...],
+        "critical": [index, ...],
+        "supportive": [index, ...]
+    }},
+    "outliers": [index, ...]
+    }}
+    """
+    result = request_label_json(prompt, validate=is_valid_label_text)
+    if is_valid_label(result):
+        return map_label_result(result, cluster_articles, centroid_title)
+    if result is not None:
+        print(f"    ⛔ Invalid label JSON. Skipping to fallback.")
     
     # FALLBACK: Use the title of the article closest to the centroid (most representative)
     print("    ❌ Final failure. Using fallback name.")
@@ -231,9 +268,60 @@ def generate_topic_label(cluster_articles, centroid_title):
         "topic_name": f"{centroid_title} (자동 생성)",
         "keywords": [],
         "category": "Unclassified",
-        "stances": {"factual": [a['id'] for a in cluster_articles], "critical": [], "supportive": []} # Default to factual
+        "stances": {"factual": [a['id'] for a in cluster_articles], "critical": [], "supportive": []}, # Default to factual
+        "fallback": True
     }
 
+def generate_topic_labels_batch(clusters):
+    """
+    Labels several small clusters [(cluster_articles, centroid_title), ...] in one
+    request, with the shared instructions sent once. Returns one mapped result per
+    cluster, or None where the response had no valid item for it.
+    """
+    blocks = []
+    for c, (cluster_articles, _) in enumerate(clusters):
+        lines = "\n    ".join(f"{i+1}. {a['title_en']}" for i, a in enumerate(cluster_articles))
+        blocks.append(f"## Cluster {c+1}\n    {lines}")
+    clusters_text = "\n\n    ".join(blocks)
+    
+    prompt = f"""
+    Role: Professional News Editor & Data Analyst
+    Task: Each cluster below groups news articles by similarity. Analyze EVERY cluster independently and provide a structured summary for each one.
+    Article indices restart at 1 inside each cluster; use them only within that cluster.
+
+    Clusters:
+    {clusters_text}
+{LABEL_INSTRUCTIONS}
+    # Output Format (JSON Only)
+    A JSON array with exactly one object per cluster:
+    [
+    {{
+    "cluster": 1,
+    "topic_name": "Headline",
+    "keywords": ["Key1", "Key2"],
+    "category": "Category",
+    "stances": {{
+        "factual": [index, ...],
+        "critical": [index, ...],
+        "supportive": [index, ...]
+    }},
+    "outliers": [index, ...]
+    }},
+    ...
+    ]
+    """
+    response = request_label_json(prompt)
+    results = [None] * len(clusters)
+    for item in response if isinstance(response, list) else []:
+        try:
+            c = int(item.get("cluster")) - 1
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if 0 <= c < len(clusters) and results[c] is None and is_valid_label(item):
+            cluster_articles, centroid_title = clusters[c]
+            results[c] = map_label_result(item, cluster_articles, centroid_title)
+    return results
+
 def find_similar_topic(new_topic_name, country_code, supabase, threshold=0.8):
     """
     Find similar existing topic within last 7 days.
@@ -278,28 +366,52 @@ def find_similar_topic(new_topic_name, country_code, supabase, threshold=0.8):
         return None
 
 
+def prepare_articles(country_code):
+    """
+    Fetch a country's articles and collapse near-duplicates.
+    Returns (representatives, duplicates_of), or (None, None) if there is nothing to cluster.
+    """
+    articles = fetch_articles(country_code)
+    if not articles:
+        print(f"No articles found for {country_code}.")
+        return None, None
+    
+    # Embed/cluster/label one representative per near-duplicate group.
+    # Syndicated copies would otherwise form artificial dense clusters; they are
+    # re-attached to their representative's stance group after labeling.
+    n_fetched = len(articles)
+    articles, duplicates_of = collapse_duplicates(articles)
+    if len(articles) < n_fetched:
+        print(f"  Collapsed {n_fetched} articles into {len(articles)} near-duplicate representatives.")
+    return articles, duplicates_of
+
 def main():
-    COUNTRY = sys.argv[1] if len(sys.argv) > 1 else 'RU'
+    parser = argparse.ArgumentParser(description="Cluster and label one country's last 24h of articles")
+    parser.add_argument("country", nargs="?", default="RU")
+    parser.add_argument("--incremental", action="store_true", help="Update live topics instead of re-clustering the window")
+    parser.add_argument("--full", action="store_true", help="With --incremental: force a full HDBSCAN consolidation")
+    parser.add_argument("--label-batch", type=int, default=LABEL_BATCH_SIZE,
+                        help="Small clusters labeled per Gemini request (1 = one request per cluster)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
+    args = parser.parse_args()
+    COUNTRY = args.country
+    if args.no_llm_cache:
+        llm_cache.disable()
     
-    articles = fetch_articles(COUNTRY)
+    articles, duplicates_of = prepare_articles(COUNTRY)
     if not articles:
-        print("No articles found.")
         return
-        
-    titles = [a['title_en'] for a in articles]
-    ids = [a['id'] for a in articles]
-    
-    # Output file path (Absolute)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_file = os.path.join(script_dir, f"clusters_{COUNTRY}_hdbscan.json")
     
     # 1. Generate Embeddings
-    embeddings = get_embeddings(titles)
-    
-    # 2. HDBSCAN Clustering
-    # HDBSCAN finds clusters of varying densities and identifies noise (-1)
-    print(f"Clustering with HDBSCAN (min_cluster_size=3)...")
-    
+    embeddings = get_embeddings([a['title_en'] for a in articles], [a['id'] for a in articles])
+    if args.incremental:
+        cluster_country_incremental(COUNTRY, articles, duplicates_of, embeddings, force_full=args.full,
+                                    label_batch_size=args.label_batch)
+    else:
+        cluster_country(COUNTRY, articles, duplicates_of, embeddings, label_batch_size=args.label_batch)
+
+def hdbscan_labels(embeddings, allow_single_cluster=False):
+    """HDBSCAN labels (-1 = noise) with parameters scaled to the data volume"""
     from sklearn.cluster import HDBSCAN
     
     # Dynamic parameters based on data volume
@@ -336,123 +448,327 @@ def main():
         epsilon = 0.0
 
     print(f"  Params: min_cluster_size={min_cluster_size}, min_samples={min_samples}, epsilon={epsilon}")
-    clusterer = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, cluster_selection_epsilon=epsilon, metric='euclidean')
+    clusterer = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, cluster_selection_epsilon=epsilon, metric='euclidean',
+                        allow_single_cluster=allow_single_cluster)
     labels = clusterer.fit_predict(embeddings)
+    return labels
+
+def group_clusters(labels, embeddings):
+    """
+    Group all clusters in one pass instead of scanning labels once per cluster.
+    Returns [(label_id, member_indices, medoid_idx)] sorted by size (ties: first
+    appearance, like sorting the clusters dict), with member_indices in article
+    order and medoid_idx the position within them of the article closest (cosine)
+    to the cluster mean; members tied within MEDOID_TIE_TOLERANCE (e.g. both
+    members of a two-article cluster) resolve to the first. Noise (-1) is left out.
+    """
+    labels = np.asarray(labels)
+    clustered = np.flatnonzero(labels != -1)
+    if not len(clustered):
+        return []
+    # Stable sort keeps members in article order within each cluster
+    order = clustered[np.argsort(labels[clustered], kind="stable")]
+    sorted_labels = labels[order]
+    label_ids, starts, counts = np.unique(sorted_labels, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(label_ids)), counts)
     
-    n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-    n_noise = list(labels).count(-1)
-    print(f"  Found {n_clusters} clusters and {n_noise} noise points.")
+    # HDBSCAN doesn't give centroids directly, so we calculate the mean of points
+    members = embeddings[order]
+    centers = np.add.reduceat(members, starts, axis=0) / counts[:, None]
+    # Cosine distance of every member to its own cluster center
+    unit_members = members / np.clip(np.linalg.norm(members, axis=1, keepdims=True), 1e-12, None)
+    unit_centers = centers / np.clip(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12, None)
+    distances = 1 - np.einsum("ij,ij->i", unit_members, unit_centers[group])
+    # First member within MEDOID_TIE_TOLERANCE of the minimum: rounding differs between the
+    # einsum and a per-cluster cosine_distances, so exact float ties would be arbitrary
+    is_min = np.isclose(distances, np.minimum.reduceat(distances, starts)[group],
+                        rtol=0, atol=MEDOID_TIE_TOLERANCE)
+    first_min = np.flatnonzero(is_min)
+    _, first = np.unique(group[first_min], return_index=True)
+    medoids = first_min[first] - starts
     
-    # Group articles by cluster
-    clusters = {}
-    noise_articles = []
+    # Sort clusters by size (Importance)
+    ranking = np.lexsort((order[starts], -counts))
+    return [(label_ids[g], order[starts[g]:starts[g] + counts[g]], int(medoids[g])) for g in ranking]
+
+def medoid_index(cluster_embeddings):
+    """Position of the embedding closest (cosine) to the mean of cluster_embeddings"""
+    return group_clusters(np.zeros(len(cluster_embeddings), dtype=int), cluster_embeddings)[0][2]
+
+def centroid_title_of(cluster_items, closest_idx, label_id):
+    # Use Korean title, fallback to English
+    return cluster_items[closest_idx].get('title_ko') or cluster_items[closest_idx].get('title_en') or f"Topic {label_id}"
+
+def label_cluster(cluster_items, closest_idx, label_id, llm_result=None):
+    """
+    Gemini label for one cluster of representatives; closest_idx is the position
+    of the centroid article (closest to cluster center) within cluster_items.
+    llm_result: an already generated label (batched request), else one is requested.
+    Returns (topic_name, stances incl. keywords/category, outlier ids, labeled_ok).
+    """
+    centroid_title = centroid_title_of(cluster_items, closest_idx, label_id)
     
-    for i, label in enumerate(labels):
-        if label == -1:
-            noise_articles.append(articles[i])
-            continue
-            
-        if label not in clusters:
-            clusters[label] = []
-        clusters[label].append(articles[i])
+    # LLM Generation - RE-ENABLED (DNS issue fixed)
+    outliers = []
+    try:
+        if llm_result is None:
+            llm_result = generate_topic_label(cluster_items, centroid_title)
+        topic_name = llm_result.get('topic_name', centroid_title)
+        stances = llm_result.get('stances', {
+            "factual": [a['id'] for a in cluster_items],
+            "critical": [],
+            "supportive": []
+        })
+        # Merge metadata into stances for convenience (or keep separate)
+        stances['keywords'] = llm_result.get('keywords', [])
+        stances['category'] = llm_result.get('category', 'Unclassified')
+        
+        # Log outliers
+        outliers = llm_result.get('outliers', [])
+        if outliers:
+            print(f"    🗑️ Removed {len(outliers)} outlier articles.")
+        labeled_ok = not llm_result.get('fallback')
+        
+    except Exception as e:
+        print(f"    ⚠️ LLM Error in loop: {e}")
+        topic_name = centroid_title
+        stances = {
+            "factual": [a['id'] for a in cluster_items],
+            "critical": [],
+            "supportive": [],
+            "keywords": [],
+            "category": "Unclassified"
+        }
+        labeled_ok = False
+    return topic_name, stances, outliers, labeled_ok
+
+def label_workers():
+    rpm = get_limiter(model.model_name).rpm
+    return max(1, min(MAX_LABEL_WORKERS, rpm // 60))
+
+def label_cluster_batch(jobs):
+    """label_cluster() for several small clusters in one request; invalid/missing items are relabeled one by one"""
+    if len(jobs) == 1:
+        return [label_cluster(*jobs[0])]
+    llm_results = generate_topic_labels_batch([
+        (cluster_items, centroid_title_of(cluster_items, closest_idx, label_id))
+        for cluster_items, closest_idx, label_id in jobs
+    ])
+    failed = sum(1 for r in llm_results if r is None)
+    if failed:
+        print(f"    ↩️ {failed}/{len(jobs)} clusters missing or invalid in batched response, retrying individually")
+    return [label_cluster(*job, llm_result=r) for job, r in zip(jobs, llm_results)]
+
+def batch_jobs(jobs, batch_size):
+    """Group consecutive small clusters (jobs are sorted by size) into batches of up to batch_size"""
+    batches, current = [], []
+    for job in jobs:
+        if batch_size > 1 and len(job[0]) <= BATCH_MAX_ARTICLES:
+            current.append(job)
+            if len(current) == batch_size:
+                batches.append(current)
+                current = []
+        else:
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([job])
+    if current:
+        batches.append(current)
+    return batches
+
+def label_clusters(jobs, latencies, batch_size=LABEL_BATCH_SIZE):
+    """
+    label_cluster() for each (cluster_items, closest_idx, label_id) job on a bounded
+    worker pool, small clusters batched batch_size per request. Yields results in
+    job order (so saves stay deterministic) as soon as they and all earlier jobs are
+    done; appends each cluster's request latency to latencies.
+    """
+    batches = batch_jobs(jobs, batch_size)
+    if len(batches) < len(jobs):
+        print(f"  Batched {len(jobs)} clusters into {len(batches)} labeling requests.")
+    
+    def timed(batch):
+        start = time.perf_counter()
+        results = label_cluster_batch(batch)
+        latencies.extend([time.perf_counter() - start] * len(batch))
+        return results
+    
+    with ThreadPoolExecutor(max_workers=label_workers()) as executor:
+        for results in executor.map(timed, batches):
+            yield from results
+
+def print_latency_histogram(latencies):
+    if not latencies:
+        return
+    values = sorted(latencies)
+    print(f"\n--- Labeling latency ({len(values)} clusters, {label_workers()} workers) ---")
+    print(f"  p50 {values[len(values) // 2]:.1f}s, p90 {values[int(len(values) * 0.9)]:.1f}s, max {values[-1]:.1f}s")
+    lower = 0
+    for upper in LATENCY_BUCKETS + [None]:
+        count = sum(1 for v in values if v >= lower and (upper is None or v < upper))
+        label = f"{lower:>3}-{upper}s" if upper else f"{lower:>3}s+"
+        print(f"  {label:<8} {'█' * count} {count}")
+        lower = upper
+
+def add_topic(final_output, topic_name, stances, label_id, duplicates_of):
+    """Expand near-duplicates and add a labeled topic to the clusters file output"""
+    # Re-attach near-duplicates to their representative's stance group
+    for stance_type in ("factual", "critical", "supportive"):
+        stances[stance_type] = expand_duplicates(stances.get(stance_type, []), duplicates_of)
+    
+    # Ensure unique keys
+    if topic_name in final_output:
+        topic_name = f"{topic_name} ({label_id})"
         
+    # Print generated metadata for verification
+    print(f"    🏷️ Topic: {topic_name}")
+    print(f"    🔑 Keywords: {stances.get('keywords', [])}")
+    print(f"    📂 Category: {stances.get('category', 'Unclassified')}")
+    
+    final_output[topic_name] = stances
+
+def save_clusters(output_file, final_output):
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(final_output, f, ensure_ascii=False, indent=2)
+
+def print_preview(final_output):
+    print(f"Total Topics: {len(final_output)}")
+    print(f"Rate limiter: {get_limiter(model.model_name).summary()}")
+    print(llm_cache.summary())
+    
+    # Preview
+    print("\n--- Cluster Preview (First 5) ---")
+    for k, v in list(final_output.items())[:5]:
+        print(f"{k}: {len(v.get('factual', [])) + len(v.get('critical', [])) + len(v.get('supportive', []))} articles")
+
+def clusters_output_path(country_code):
+    # Output file path (Absolute)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, f"clusters_{country_code}_hdbscan.json")
+
+def cluster_country(country_code, articles, duplicates_of, embeddings, label_batch_size=LABEL_BATCH_SIZE):
+    """HDBSCAN + labeling for one country's (embedded) representatives; saves clusters_{country_code}_hdbscan.json"""
+    output_file = clusters_output_path(country_code)
+    
+    # 2. HDBSCAN Clustering
+    # HDBSCAN finds clusters of varying densities and identifies noise (-1)
+    print(f"[{country_code}] Clustering {len(articles)} articles with HDBSCAN...")
+    labels = hdbscan_labels(embeddings)
+    
+    # Group articles by cluster (sorted by size, with each cluster's centroid article)
+    clusters = group_clusters(labels, embeddings)
+    n_clusters = len(clusters)
+    n_noise = int(np.sum(labels == -1))
+    print(f"  Found {n_clusters} clusters and {n_noise} noise points.")
+    
     # 3. Labeling & Formatting
     final_output = {}
-    print("Generating Topic Labels...")
+    latencies = []
+    print(f"Generating Topic Labels ({label_workers()} concurrent requests)...")
     
     
     try:
-        # Sort clusters by size (Importance)
-        sorted_clusters = sorted(clusters.items(), key=lambda x: len(x[1]), reverse=True)
-        
-        for i, (label_id, cluster_items) in enumerate(sorted_clusters):
-            # Find centroid article (closest to cluster center)
-            # HDBSCAN doesn't give centroids directly, so we calculate the mean of points
-            cluster_indices = [idx for idx, l in enumerate(labels) if l == label_id]
-            cluster_embeddings = embeddings[cluster_indices]
-            center = np.mean(cluster_embeddings, axis=0)
-            
-            distances = cosine_distances([center], cluster_embeddings)[0]
-            closest_idx = np.argmin(distances)
-            # Use Korean title, fallback to English
-            centroid_title = cluster_items[closest_idx].get('title_ko') or cluster_items[closest_idx].get('title_en') or f"Topic {label_id}"
-            
-            print(f"  Processing Cluster {i+1}/{n_clusters} (ID: {label_id}, {len(cluster_items)} articles)...")
-            
-            # LLM Generation - RE-ENABLED (DNS issue fixed)
-            try:
-                llm_result = generate_topic_label(cluster_items, centroid_title)
-                topic_name = llm_result.get('topic_name', centroid_title)
-                stances = llm_result.get('stances', {
-                    "factual": [a['id'] for a in cluster_items],
-                    "critical": [],
-                    "supportive": []
-                })
-                # Merge metadata into stances for convenience (or keep separate)
-                stances['keywords'] = llm_result.get('keywords', [])
-                stances['keywords'] = llm_result.get('keywords', [])
-                stances['category'] = llm_result.get('category', 'Unclassified')
-                
-                # Log outliers
-                outliers = llm_result.get('outliers', [])
-                if outliers:
-                    print(f"    🗑️ Removed {len(outliers)} outlier articles.")
-                
-            except Exception as e:
-                print(f"    ⚠️ LLM Error in loop: {e}")
-                topic_name = centroid_title
-                stances = {
-                    "factual": [a['id'] for a in cluster_items],
-                    "critical": [],
-                    "supportive": [],
-                    "keywords": [],
-                    "category": "Unclassified"
-                }
-            
-            # Ensure unique keys
-            if topic_name in final_output:
-                topic_name = f"{topic_name} ({label_id})"
-                
-            # Print generated metadata for verification
-            print(f"    🏷️ Topic: {topic_name}")
-            print(f"    🔑 Keywords: {stances.get('keywords', [])}")
-            print(f"    📂 Category: {stances.get('category', 'Unclassified')}")
-            
-            final_output[topic_name] = stances
+        jobs = [([articles[idx] for idx in cluster_indices], closest_idx, label_id)
+                for label_id, cluster_indices, closest_idx in clusters]
+        for i, ((cluster_items, _, label_id), labeled) in enumerate(zip(jobs, label_clusters(jobs, latencies, label_batch_size))):
+            print(f"  [{country_code}] Labeled Cluster {i+1}/{n_clusters} (ID: {label_id}, {len(cluster_items)} articles)")
+            topic_name, stances, _, _ = labeled
+            add_topic(final_output, topic_name, stances, label_id, duplicates_of)
             
             # Incremental Save
             if (i + 1) % 5 == 0 or (i + 1) == n_clusters:
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump(final_output, f, ensure_ascii=False, indent=2)
-                
-            time.sleep(2) # Rate limit protection (2s delay)
+                save_clusters(output_file, final_output)
             
         # Add Noise info at the end (Optional, or just log it)
-        if noise_articles:
-            print(f"  Note: {len(noise_articles)} articles were classified as Noise and excluded.")
+        if n_noise:
+            print(f"  Note: {n_noise} articles were classified as Noise and excluded.")
             
     finally:
         if final_output:
             # Save to JSON (Backup)
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(final_output, f, ensure_ascii=False, indent=2)
+            save_clusters(output_file, final_output)
             print(f"\n✅ Clustering Complete. Saved {len(final_output)} topics to {output_file}")
             
             # Save to DB - DISABLED to prevent duplicates. 
             # Enrichment script (llm_topic_enrichment.py) handles DB insertion/updates.
-            # print("Saving topics to Supabase DB (mvp2_topics)...")
-            # try:
-            #     # ... (Code commented out) ...
-            #     pass
-            # except Exception as e:
-            #     print(f"❌ Error saving to DB: {e}")
 
-    print(f"Total Topics: {len(final_output)}")
+    print_latency_histogram(latencies)
+    print_preview(final_output)
+    return final_output
+
+def cluster_country_incremental(country_code, articles, duplicates_of, embeddings, force_full=False,
+                                label_batch_size=LABEL_BATCH_SIZE):
+    """
+    Incremental mode (live_topics.py): new articles join live topics by centroid
+    distance or form micro-clusters; the full HDBSCAN only runs every
+    FULL_RECLUSTER_HOURS (or with force_full). Only topics whose membership changed
+    materially are relabeled; the rest keep their label. Same output file as cluster_country.
+    """
+    output_file = clusters_output_path(country_code)
+    ids = [a['id'] for a in articles]
+    article_by_id = {a['id']: a for a in articles}
+    position = {aid: i for i, aid in enumerate(ids)}
     
-    # Preview
-    print("\n--- Cluster Preview (First 5) ---")
-    for k, v in list(final_output.items())[:5]:
-        print(f"{k}: {len(v.get('factual', [])) + len(v.get('critical', [])) + len(v.get('supportive', []))} articles")
+    state = LiveTopics.load(country_code)
+    state.prune(ids)
+    if force_full or state.needs_full():
+        print(f"[{country_code}] Full consolidation: clustering {len(articles)} articles with HDBSCAN...")
+        state.consolidate(ids, hdbscan_labels(embeddings))
+    else:
+        print(f"[{country_code}] Incremental update of {len(state.topics)} live topics ({len(articles)} articles in window)...")
+        # The pool is small and may hold a single new story: let HDBSCAN return one cluster
+        # (LiveTopics.assign rejects a cluster of unrelated leftovers)
+        state.assign(ids, embeddings, lambda pool: hdbscan_labels(pool, allow_single_cluster=True))
+    print(f"  {state.summary()}")
+    
+    topic_ids = sorted(state.topics, key=lambda t: len(state.topics[t]["members"]), reverse=True)
+    to_label = [t for t in topic_ids if state.needs_label(t)]
+    print(f"Generating Topic Labels for {len(to_label)}/{len(topic_ids)} new or changed topics...")
+    
+    final_output = {}
+    fallbacks = {}
+    latencies = []
+    try:
+        jobs = []
+        for topic_id in to_label:
+            members = state.topics[topic_id]["members"]
+            jobs.append(([article_by_id[m] for m in members],
+                         medoid_index(embeddings[[position[m] for m in members]]), topic_id))
+        for i, ((cluster_items, _, topic_id), labeled) in enumerate(zip(jobs, label_clusters(jobs, latencies, label_batch_size))):
+            print(f"  [{country_code}] Labeled Topic {i+1}/{len(to_label)} (ID: {topic_id}, {len(cluster_items)} articles)")
+            topic_name, stances, outliers, labeled_ok = labeled
+            if labeled_ok:
+                state.set_label(topic_id, {
+                    "topic_name": topic_name,
+                    "stances": {key: stances.get(key, []) for key in ("factual", "critical", "supportive")},
+                    "keywords": stances.get('keywords', []),
+                    "category": stances.get('category', 'Unclassified'),
+                    "outliers": outliers,
+                })
+            else:
+                # Use the fallback for this run's output only; relabeling is retried next run
+                fallbacks[topic_id] = (topic_name, stances)
+        
+        for topic_id in topic_ids:
+            topic = state.topics[topic_id]
+            if topic_id in fallbacks:
+                topic_name, stances = fallbacks[topic_id]
+                add_topic(final_output, topic_name, stances, topic_id, duplicates_of)
+                continue
+            stances = state.stances(topic_id)
+            stances['keywords'] = topic["label"].get('keywords', [])
+            stances['category'] = topic["label"].get('category', 'Unclassified')
+            add_topic(final_output, topic["label"]["topic_name"], stances, topic_id, duplicates_of)
+    finally:
+        state.save()
+        if final_output:
+            save_clusters(output_file, final_output)
+            print(f"\n✅ Clustering Complete. Saved {len(final_output)} topics to {output_file}")
+    
+    print_latency_histogram(latencies)
+    print_preview(final_output)
+    return final_output
 
 if __name__ == "__main__":
     main()
@@ -2,11 +2,19 @@ import os
 import json
 import time
 import sys
+import uuid
 from collections import Counter
 import google.generativeai as genai
 from supabase import create_client, Client
-from datetime import datetime
 from dotenv import load_dotenv
+from near_duplicates import collapse_duplicates
+from topic_store import save_enriched_topics
+from article_store import get_articles
+from rate_limiter import generate_content, get_limiter
+from metadata_batches import (BATCH_TOKEN_BUDGET, OUTPUT_TOKENS_PER_TOPIC, recent_headlines,
+                              metadata_prompt, pack_metadata_batches, route_metadata)
+import llm_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv('backend/.env')
@@ -42,24 +50,13 @@ model = genai.GenerativeModel(
     }
 )
 
+MAX_METADATA_WORKERS = int(os.getenv("ENRICH_WORKERS", "8"))
+
+ARTICLE_COLUMNS = ["title_ko", "title_en", "source_name", "published_at", "local_topic_id", "dup_group_id"]
+
 def fetch_article_details(article_ids):
-    """Fetch details for a list of article IDs"""
-    # Chunking to avoid URL length limits
-    chunk_size = 100
-    all_articles = []
-    
-    for i in range(0, len(article_ids), chunk_size):
-        chunk = article_ids[i:i+chunk_size]
-        try:
-            response = supabase.table("mvp2_articles") \
-                .select("id, title_ko, title_en, source_name, published_at, local_topic_id") \
-                .in_("id", chunk) \
-                .execute()
-            all_articles.extend(response.data)
-        except Exception as e:
-            print(f"  ⚠️ Error fetching articles: {e}")
-            
-    return {a['id']: a for a in all_articles}
+    """Fetch details for a list of article IDs (concurrent chunks, cached for the run)"""
+    return get_articles(supabase, article_ids, ARTICLE_COLUMNS)
 
 def deduplicate_sources(cluster_articles):
     """
@@ -93,49 +90,21 @@ def deduplicate_sources(cluster_articles):
         
     return cluster_articles
 
-def generate_metadata_batch(batch_topics):
+def metadata_config(n_topics):
+    """Output room grows with the number of topics in the request"""
+    return {**generation_config,
+            "max_output_tokens": max(generation_config["max_output_tokens"], OUTPUT_TOKENS_PER_TOPIC * n_topics)}
+
+def generate_metadata_batch(batch_topics, log=print):
     """
     Generate metadata for a batch of topics using LLM.
-    batch_topics: List of (topic_key, articles) tuples
+    batch_topics: List of (topic_key, headlines) tuples
+    Returns one result (or None) per topic, in order.
     """
-    input_text = ""
-    for i, (topic_key, articles) in enumerate(batch_topics):
-        input_text += f"\n--- TOPIC {i+1}: {topic_key} ---\n"
-        for a in articles[:10]: # Limit context
-            title = a.get('title_ko') or a.get('title_en') or "No Title"
-            input_text += f"- {title}\n"
-
-    prompt = f"""
-Role: You are 'News Toss', a witty, friendly, and knowledgeable news curator.
-Tone: Casual, engaging, sexy, yet informative. Use Korean. (e.g., "~했어요", "~인가요?", "결국...", "충격!")
-
-Task: Analyze {len(batch_topics)} separate news topics and generate metadata for EACH.
-
-Input:
-{input_text}
-
-Requirements for EACH topic:
-1. **topic_name_ko**: A catchy, clickable title in Korean.
-2. **summary_ko**: A 3-line summary.
-3. **keywords**: 3-5 hashtags.
-4. **category**: One of [Politics, Economy, Society, Tech, World, Culture, Sports, Entertainment].
-5. **stances**: Classify article IDs (if possible, otherwise just return empty lists).
-
-Output JSON List:
-[
-  {{
-    "original_topic_key": "TOPIC 1 key...",
-    "topic_name_ko": "...",
-    "summary_ko": "...",
-    "keywords": [...],
-    "category": "...",
-    "stances": {{ "factual": [], "critical": [], "supportive": [] }}
-  }},
-  ...
-]
-"""
+    prompt = metadata_prompt(batch_topics)
     try:
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt, validate=llm_cache.is_json,
+                                    generation_config=metadata_config(len(batch_topics)))
         text = response.text
         
         # Clean markdown code blocks if present
@@ -144,23 +113,55 @@ Output JSON List:
         elif "```" in text:
             text = text.split("```")[1].split("```")[0].strip()
             
-        return json.loads(text)
+        return route_metadata(batch_topics, json.loads(text))
     except Exception as e:
-        print(f"    ⚠️ Batch Generation failed: {e}")
-        return None
+        log(f"    ⚠️ Batch Generation failed: {e}")
+        return [None] * len(batch_topics)
 
-def main():
-    # Default to KR if no argument
-    COUNTRY = sys.argv[1] if len(sys.argv) > 1 else 'KR'
+def metadata_workers():
+    rpm = get_limiter(model.model_name).rpm
+    return max(1, min(MAX_METADATA_WORKERS, rpm // 60))
+
+def generate_metadata(topics, log=print):
+    """
+    LLM metadata for (route_key, topic_key, headlines) topics, packed into token-budgeted
+    requests on a bounded worker pool. Returns {route_key: result} for the topics answered.
+    """
+    batches = pack_metadata_batches(topics)
+    log(f"  🧠 Generating metadata for {len(topics)} topics in {len(batches)} requests (~{BATCH_TOKEN_BUDGET} tokens each)...")
+    
+    def run(numbered):
+        n, batch = numbered
+        log(f"    Processing batch {n}/{len(batches)} ({len(batch)} topics)...")
+        results = generate_metadata_batch([(topic_key, headlines) for _, topic_key, headlines in batch], log)
+        if not any(results):
+            log(f"    ⚠️ Batch {n} failed or returned empty. Keeping defaults.")
+        return batch, results
     
+    metadata = {}
+    with ThreadPoolExecutor(max_workers=metadata_workers()) as executor:
+        for batch, results in executor.map(run, enumerate(batches, 1)):
+            for (route_key, _, _), res in zip(batch, results):
+                if res:
+                    metadata[route_key] = res
+    missing = len(topics) - len(metadata)
+    if missing:
+        log(f"    ⚠️ {missing} topics missing from responses. Keeping defaults.")
+    return metadata
+
+def prepare_country(COUNTRY, log=print):
+    """
+    Read a country's clusters file, fetch its articles and dedupe sources per stance.
+    Returns {"clusters", "enriched_data", "article_map", "timings"}, or None if there is no clusters file.
+    """
     input_file = f"data/pipelines/clusters_{COUNTRY}_hdbscan.json"
-    output_file = f"data/pipelines/enriched_topics_{COUNTRY}.json"
     
     if not os.path.exists(input_file):
-        print(f"❌ Input file not found: {input_file}")
-        return
-        
-    print(f"🚀 Starting Source Deduplication for {COUNTRY}...")
+        log(f"❌ Input file not found: {input_file}")
+        return None
+    
+    stage_start = time.time()
+    log(f"🚀 Starting Source Deduplication for {COUNTRY}...")
     
     with open(input_file, "r", encoding="utf-8") as f:
         clusters = json.load(f)
@@ -172,11 +173,11 @@ def main():
     for data in clusters.values():
         all_ids.extend(data.get("factual", []) + data.get("critical", []) + data.get("supportive", []))
         
-    print(f"  Fetching details for {len(all_ids)} articles...")
+    log(f"  Fetching details for {len(all_ids)} articles...")
     article_map = fetch_article_details(all_ids)
     
     total_clusters = len(clusters)
-    print(f"  Processing {total_clusters} clusters...")
+    log(f"  Processing {total_clusters} clusters...")
     
     for i, (topic_key, data) in enumerate(clusters.items()):
         # Process each stance group separately to preserve classification
@@ -195,7 +196,7 @@ def main():
                 has_articles = True
         
         if not has_articles:
-            print(f"    ⚠️ Cluster {topic_key} skipped: No articles after filtering.")
+            log(f"    ⚠️ Cluster {topic_key} skipped: No articles after filtering.")
             continue
         
         enriched_data[topic_key] = {
@@ -205,170 +206,142 @@ def main():
             "keywords": [],
             "category": "Unclassified"
         }
-            
-    # 2. Batch Process for LLM Generation
-    print(f"  🧠 Generating metadata for {len(enriched_data)} topics (Batch size: 5)...")
     
-    topic_items = list(enriched_data.items())
-    batch_size = 5
-    
-    for i in range(0, len(topic_items), batch_size):
-        batch = topic_items[i:i+batch_size]
-        batch_input = []
-        
-        for key, data in batch:
-            # Gather articles for context
-            stances = data['stances']
-            all_ids = stances['factual'] + stances['critical'] + stances['supportive']
-            articles = [article_map.get(aid) for aid in all_ids if article_map.get(aid)]
-            batch_input.append((key, articles))
-            
-        # Call LLM
-        print(f"    Processing batch {i//batch_size + 1}...")
-        results = generate_metadata_batch(batch_input)
-        
-        if results:
-            for res in results:
-                original_key = res.get('original_topic_key')
-                if original_key in enriched_data:
-                    # Merge LLM data
-                    enriched_data[original_key].update({
-                        "topic_name_ko": res.get('topic_name_ko') or original_key,
-                        "summary_ko": res.get('summary_ko') or "",
-                        "keywords": res.get('keywords') or [],
-                        "category": res.get('category') or "Unclassified",
-                        # Optional: Merge stances if LLM provides better classification
-                        # "stances": res.get('stances') or enriched_data[original_key]['stances']
-                    })
-        else:
-            print(f"    ⚠️ Batch {i//batch_size + 1} failed or returned empty. Keeping defaults.")
-            
-        time.sleep(1) # Rate limit
+    return {
+        "clusters": total_clusters,
+        "enriched_data": enriched_data,
+        "article_map": article_map,
+        "timings": {"fetch": time.time() - stage_start},
+    }
+
+def metadata_topics(prepared):
+    """(topic_key, headlines) per topic: the most recent representative of each near-duplicate group"""
+    article_map = prepared['article_map']
+    topics = []
+    for key, data in prepared['enriched_data'].items():
+        # Gather articles for context
+        stances = data['stances']
+        all_ids = stances['factual'] + stances['critical'] + stances['supportive']
+        articles = [article_map.get(aid) for aid in all_ids if article_map.get(aid)]
+        # Near-duplicate copies add no context for the LLM
+        representatives, _ = collapse_duplicates(articles)
+        topics.append((key, recent_headlines(representatives)))
+    return topics
+
+def apply_metadata(prepared, metadata):
+    """Merge LLM results ({topic_key: result}) into the prepared topics"""
+    for original_key, res in metadata.items():
+        if original_key in prepared['enriched_data']:
+            # Merge LLM data
+            prepared['enriched_data'][original_key].update({
+                "topic_name_ko": res.get('topic_name_ko') or original_key,
+                "summary_ko": res.get('summary_ko') or "",
+                "keywords": res.get('keywords') or [],
+                "category": res.get('category') or "Unclassified",
+                # Optional: Merge stances if LLM provides better classification
+                # "stances": res.get('stances') or enriched_data[original_key]['stances']
+            })
+
+def save_country(COUNTRY, prepared, batch_id=None, log=print, retry=False):
+    """
+    Write enriched_topics_{COUNTRY}.json and save the topics to the DB.
+    Returns stats (topic counts, per-stage seconds); raises if the DB save fails.
+    retry: a previous save of the same topics failed, possibly after committing, so the
+    articles' local_topic_id is re-read first and the topics it wrote are updated, not duplicated.
+    """
+    output_file = f"data/pipelines/enriched_topics_{COUNTRY}.json"
+    enriched_data = prepared['enriched_data']
+    article_map = prepared['article_map']
+    timings = prepared['timings']
+    stage_start = time.time()
 
     # Final Save
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(enriched_data, f, ensure_ascii=False, indent=2)
-    print(f"✅ Enrichment Complete. Saved {len(enriched_data)} topics to {output_file}")
+    log(f"✅ Enrichment Complete. Saved {len(enriched_data)} topics to {output_file}")
 
     # Save to DB
-    print("Saving enriched topics to Supabase DB (mvp2_topics)...")
+    log("Saving enriched topics to Supabase DB (mvp2_topics)...")
     try:
         # Generate batch_id for this country's topics OR use provided one
-        import uuid
-        import argparse
-        
-        # Parse arguments manually since we are inside main() and sys.argv is used
-        batch_id = None
-        if len(sys.argv) > 2 and sys.argv[2].startswith("--batch_id="):
-            batch_id = sys.argv[2].split("=")[1]
-            
         if not batch_id:
             batch_id = str(uuid.uuid4())
             
-        print(f"  🔖 Using batch_id: {batch_id}")
+        log(f"  🔖 Using batch_id: {batch_id}")
+
+        if retry:
+            links = get_articles(supabase, list(article_map), ["local_topic_id"], refresh=True)
+            article_map = {aid: {**row, "local_topic_id": links.get(aid, {}).get("local_topic_id")}
+                           for aid, row in article_map.items()}
+            prepared['article_map'] = article_map
+            log("  🔁 Re-read article topic links before retrying the save")
         
         # 1. Clear only UNPUBLISHED topics for this country (preserve published ones)
         # UPDATE: We do NOT clear unpublished topics anymore to preserve history.
         # Step 9 (Publish) will handle unpublishing old batches, and they will remain as history.
         # Step 4 (Enrichment) simply adds new candidate topics.
-        print(f"  ℹ️  Preserving history: Skipping deletion of unpublished topics for {COUNTRY}...")
-        
-        # Note: Article linkage will be updated in Step 9 when publishing
+        log(f"  ℹ️  Preserving history: Skipping deletion of unpublished topics for {COUNTRY}...")
         
-        # db_rows = [] # Removed list accumulation
-        # Create a lookup for article sources
-        article_source_map = {a['id']: a.get('source_name', 'Unknown') for a in article_map.values()}
-        
-        # Prepare rows
-        for topic_name, details in enriched_data.items():
-            stances = details['stances']
-            article_ids = stances['factual'] + stances['critical'] + stances['supportive']
-            
-            # Calculate unique source count
-            unique_sources = set()
-            for aid in article_ids:
-                if aid in article_source_map:
-                    unique_sources.add(article_source_map[aid])
-            
-                # Check if topic exists (deduplication via Article Overlap)
-                # Strategy: If articles in this new cluster are already assigned to a topic created < 24h ago, reuse it.
-                existing_topic_id = None
-                
-                # 1. Collect local_topic_ids from articles
-                linked_topic_ids = []
-                for aid in article_ids:
-                    art = article_map.get(aid)
-                    if art and art.get('local_topic_id'):
-                        linked_topic_ids.append(art['local_topic_id'])
-                
-                # 2. Find majority vote
-                if linked_topic_ids:
-                    most_common = Counter(linked_topic_ids).most_common(1)
-                    candidate_id = most_common[0][0]
-                    
-                    # 3. Verify candidate topic is recent (< 24h)
-                    # We don't want to revive very old topics
-                    try:
-                        time_threshold = (datetime.utcnow() - timedelta(hours=24)).isoformat()
-                        res = supabase.table("mvp2_topics") \
-                            .select("id") \
-                            .eq("id", candidate_id) \
-                            .gte("created_at", time_threshold) \
-                            .execute()
-                        if res.data:
-                            existing_topic_id = candidate_id
-                    except Exception as e:
-                        print(f"    ⚠️ Error verifying candidate topic {candidate_id}: {e}")
-
-                if existing_topic_id:
-                    # Update existing
-                    topic_id = existing_topic_id
-                    print(f"    🔄 Updating existing topic (Overlap): {topic_name} ({topic_id})")
-                    supabase.table("mvp2_topics").update({
-                        "topic_name": topic_name, # Update name to latest LLM version
-                        "article_ids": article_ids,
-                        "article_count": len(article_ids),
-                        "source_count": len(unique_sources),
-                        "stances": stances,
-                        "keywords": details.get('keywords', []),
-                        "category": details.get('category', 'Unclassified'),
-                        "summary": details.get('summary_ko', ''),
-                        # "ai_summary": details.get('summary_ko', ''), # Reverted
-                        "batch_id": batch_id,
-                        "updated_at": datetime.utcnow().isoformat()
-                    }).eq("id", topic_id).execute()
-                else:
-                    # Insert new
-                    response = supabase.table("mvp2_topics").insert({
-                        "country_code": COUNTRY,
-                        "topic_name": topic_name,
-                        "article_ids": article_ids,
-                        "article_count": len(article_ids),
-                        "source_count": len(unique_sources),
-                        "stances": stances,
-                        "keywords": details.get('keywords', []),
-                        "category": details.get('category', 'Unclassified'),
-                        "summary": details.get('summary_ko', ''),
-                        # "ai_summary": details.get('summary_ko', ''), # Reverted
-                        "batch_id": batch_id,
-                        "is_published": False,
-                        "created_at": datetime.utcnow().isoformat()
-                    }).execute()
-                    
-                    if response.data:
-                        topic_id = response.data[0]['id']
-
-                # Link articles (for both insert and update)
-                if topic_id:
-                     supabase.table("mvp2_articles") \
-                        .update({"local_topic_id": topic_id}) \
-                        .in_("id", article_ids) \
-                        .execute()
+        # One set-based write per country (topic_store.py): majority-vote candidate
+        # topics from the last 24h are updated, the rest inserted, articles linked
+        results = save_enriched_topics(supabase, COUNTRY, batch_id, enriched_data, article_map, log)
+        for topic_name, topic_id, updated in results:
+            if updated:
+                log(f"    🔄 Updating existing topic (Overlap): {topic_name} ({topic_id})")
+        n_updated = sum(1 for _, _, updated in results if updated)
+        log(f"  💾 {len(results) - n_updated} topics inserted, {n_updated} updated.")
                 
-        print("✅ Saved to DB successfully.")
+        log("✅ Saved to DB successfully.")
         
     except Exception as e:
-        print(f"❌ Error saving to DB: {e}")
+        log(f"❌ Error saving to DB: {e}")
+        raise
+    timings["save"] = time.time() - stage_start
+    
+    return {
+        "clusters": prepared['clusters'],
+        "topics": len(enriched_data),
+        "inserted": len(results) - n_updated,
+        "updated": n_updated,
+        "timings": timings,
+    }
+
+def enrich_country(COUNTRY, batch_id=None, log=print):
+    """
+    Source dedup + LLM metadata + DB save for one country's clusters file.
+    log(message) receives progress lines.
+    Returns stats (topic counts, per-stage seconds), or None if there is no clusters file.
+    Raises if the DB save fails; enriched_topics_{COUNTRY}.json is written before that.
+    """
+    prepared = prepare_country(COUNTRY, log)
+    if prepared is None:
+        return None
+    
+    # 2. Token-budgeted batches for LLM Generation
+    stage_start = time.time()
+    topics = [(key, key, headlines) for key, headlines in metadata_topics(prepared)]
+    apply_metadata(prepared, generate_metadata(topics, log))
+    prepared['timings']['llm'] = time.time() - stage_start
+    
+    return save_country(COUNTRY, prepared, batch_id, log)
+
+def main():
+    # Default to KR if no argument
+    COUNTRY = sys.argv[1] if len(sys.argv) > 1 else 'KR'
+    if "--no-llm-cache" in sys.argv:
+        llm_cache.disable()
+    
+    # Parse arguments manually since sys.argv is used
+    batch_id = None
+    if len(sys.argv) > 2 and sys.argv[2].startswith("--batch_id="):
+        batch_id = sys.argv[2].split("=")[1]
+    
+    try:
+        enrich_country(COUNTRY, batch_id)
+    except Exception:
+        pass    # Already reported; the enriched JSON is saved
+    print(f"  Rate limiter: {get_limiter(model.model_name).summary()}")
+    print(f"  {llm_cache.summary()}")
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,8 @@ import argparse
 from google import genai
 from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
 from supabase import create_client, Client
+from rate_limiter import generate_content_client
+import llm_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -74,10 +76,11 @@ def generate_summary(country, topic_title, headlines):
 """
 
     try:
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=GenerateContentConfig(
+        response = generate_content_client(
+            client,
+            model_id,
+            prompt,
+            GenerateContentConfig(
                 tools=[google_search_tool]
             )
         )
@@ -91,8 +94,11 @@ def main():
     parser.add_argument("--limit", type=int, default=5, help="Number of topics to process per batch (or per country)")
     parser.add_argument("--force", action="store_true", help="Reprocess topics that already have summaries")
     parser.add_argument("--all", action="store_true", help="Process all topics in batches")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
     parser.add_argument("--per-country", action="store_true", help="Process top N topics per country")
     args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_cache.disable()
 
     if args.per_country:
         # List of countries to process
@@ -145,3 +151,4 @@ def process_batch(topics):
 
 if __name__ == "__main__":
     main()
+    print(llm_cache.summary())
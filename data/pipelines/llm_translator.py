@@ -9,6 +9,11 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from near_duplicates import collapse_duplicates
+from bulk_writer import BulkUpserter
+from translation_cache import TranslationCache, cache_key, prompt_version
+from rate_limiter import generate_content, get_limiter
+import argparse
 
 # Load environment variables
 if not load_dotenv():
@@ -35,17 +40,33 @@ generation_config = {
     "response_mime_type": "application/json",
 }
 
+safety_settings = {
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+}
+
 model = genai.GenerativeModel(
     model_name="gemini-2.5-flash-lite",
     generation_config=generation_config,
-    safety_settings={
-        "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
-        "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
-        "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
-        "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
-    }
+    safety_settings=safety_settings
 )
 
+# Batched mode: several articles per request need a larger output budget
+batch_model = genai.GenerativeModel(
+    model_name="gemini-2.5-flash-lite",
+    generation_config={**generation_config, "max_output_tokens": 8192},
+    safety_settings=safety_settings
+)
+
+BATCH_SIZE = 10         # Articles per Gemini request
+BATCH_ROUNDS = 2        # Batch attempts for items missing/invalid in a response
+MAX_WORKERS = 10
+TRANSLATION_KEYS = ["title_ko", "summary_ko", "title_en", "summary_en"]
+# Columns every mvp2_articles upsert row needs (NOT NULL) besides the translations
+ROW_IDENTITY_KEYS = ["id", "url", "title_original", "country_code", "source_name", "published_at"]
+
 UNIVERSAL_TRANSLATION_PROMPT = """
 You are a professional news translator. Translate the provided news article content into Korean and English.
 
@@ -55,11 +76,58 @@ RULES:
 3. If summary is missing, return empty strings for summary fields.
 """
 
-def process_article(article):
-    """Process a single article with fallback logic"""
-    try:
-        # 1. Try Title + Summary
-        prompt = f"""
+BATCH_TRANSLATION_PROMPT = """
+You are a professional news translator. Translate EACH numbered news item below into Korean and English.
+
+RULES:
+1. Maintain a neutral, journalistic tone.
+2. Output MUST be a JSON array with exactly one object per input item.
+3. Each object has "index" (the item number) and "title_ko", "summary_ko", "title_en", "summary_en" keys.
+4. If an item's summary is missing, return empty strings for its summary fields.
+"""
+
+PROMPT_VERSION = prompt_version(UNIVERSAL_TRANSLATION_PROMPT, BATCH_TRANSLATION_PROMPT)
+translation_cache = None    # TranslationCache, opened in main() unless --no-cache
+
+def translation_key(article):
+    """Source language (from the joined source row, country as fallback) + normalized text + prompt version"""
+    source = article.get('mvp2_news_sources') or {}
+    language = source.get('language') or article.get('country_code')
+    return cache_key(language, article.get('title_original'), article.get('summary_original'), PROMPT_VERSION)
+
+def lookup_cached(articles):
+    """Split articles into ({article id: cached result}, articles still needing Gemini)"""
+    if translation_cache is None:
+        return {}, articles
+    cached, misses = {}, []
+    for article in articles:
+        result = translation_cache.get(translation_key(article))
+        if result:
+            cached[article['id']] = result
+        else:
+            misses.append(article)
+    return cached, misses
+
+def store_cached(article, result):
+    if translation_cache is None or not result:
+        return
+    # A title-only fallback for an article that has a summary must not be reused
+    if article.get('summary_original') and not (result.get('summary_ko') and result.get('summary_en')):
+        return
+    translation_cache.put(translation_key(article), result)
+
+def build_update(article, result):
+    """Only fill translation fields the article is still missing"""
+    update_data = {}
+    if not article['title_ko']: update_data['title_ko'] = result.get('title_ko')
+    if not article['title_en']: update_data['title_en'] = result.get('title_en')
+    if not article['summary_ko']: update_data['summary_ko'] = result.get('summary_ko') or ""
+    if not article['summary_en']: update_data['summary_en'] = result.get('summary_en') or ""
+    return update_data
+
+def translate_single(article):
+    """Single-article request (Title + Summary), falling back to Title Only"""
+    prompt = f"""
 {UNIVERSAL_TRANSLATION_PROMPT.strip()}
 
 Input:
@@ -68,12 +136,12 @@ Summary: {article.get('summary_original') or ''}
 
 Output JSON:
 """
-        try:
-            response = model.generate_content(prompt)
-            result = json.loads(response.text)
-        except Exception:
-            # 2. Fallback: Title Only
-            prompt = f"""
+    try:
+        # Translations have their own cache (translation_cache.py)
+        response = generate_content(model, prompt, cache=False)
+        return json.loads(response.text)
+    except Exception:
+        prompt = f"""
 {UNIVERSAL_TRANSLATION_PROMPT.strip()}
 
 Input (TITLE ONLY):
@@ -82,28 +150,42 @@ Summary: (No summary provided)
 
 Output JSON:
 """
-            response = model.generate_content(prompt)
-            result = json.loads(response.text)
+        response = generate_content(model, prompt, cache=False)
+        return json.loads(response.text)
+
+def process_article(article, duplicates=()):
+    """
+    Process a single article with fallback logic.
+    Near-duplicates of the article (same dup_group_id) reuse its translation.
+    """
+    try:
+        cached, _ = lookup_cached([article])
+        if article['id'] in cached:
+            result = cached[article['id']]
+        else:
+            # Title + Summary, falling back to Title Only
+            result = translate_single(article)
+            store_cached(article, result)
 
         # Prepare update data
-        update_data = {}
-        if not article['title_ko']: update_data['title_ko'] = result.get('title_ko')
-        if not article['title_en']: update_data['title_en'] = result.get('title_en')
-        if not article['summary_ko']: update_data['summary_ko'] = result.get('summary_ko') or ""
-        if not article['summary_en']: update_data['summary_en'] = result.get('summary_en') or ""
+        updated = False
+        for target in [article, *duplicates]:
+            update_data = build_update(target, result)
+            if update_data:
+                supabase.table("mvp2_articles").update(update_data).eq("id", target['id']).execute()
+                updated = True
         
-        if update_data:
-            supabase.table("mvp2_articles").update(update_data).eq("id", article['id']).execute()
+        if updated:
             return True, article['title_original']
         return False, "No updates needed"
 
     except Exception as e:
         return False, str(e)
 
-def process_article_with_retry(article, retries=3):
+def process_article_with_retry(article, duplicates=(), retries=3):
     """Process article with exponential backoff"""
     for i in range(retries):
-        success, msg = process_article(article)
+        success, msg = process_article(article, duplicates)
         if success:
             return True, msg
         
@@ -116,7 +198,159 @@ def process_article_with_retry(article, retries=3):
         return False, msg
     return False, "Max retries exceeded"
 
+def clean_json_text(text):
+    """Strip markdown code fences around a JSON response"""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+def build_batch_prompt(articles):
+    items = "\n\n".join(
+        f"[{i}]\nTitle: {a.get('title_original', '')}\nSummary: {a.get('summary_original') or ''}"
+        for i, a in enumerate(articles, 1)
+    )
+    return f"""
+{BATCH_TRANSLATION_PROMPT.strip()}
+
+Input ({len(articles)} items):
+{items}
+
+Output JSON array:
+"""
+
+def parse_batch_response(text, count):
+    """Return {index: result} for the valid items of a batch response (1-based indices)"""
+    data = json.loads(clean_json_text(text))
+    if isinstance(data, dict):
+        data = data.get("items") or data.get("translations") or []
+    
+    valid = {}
+    for item in data if isinstance(data, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= idx <= count or idx in valid:
+            continue
+        result = {key: item.get(key) or "" for key in TRANSLATION_KEYS}
+        if not all(isinstance(result[key], str) for key in TRANSLATION_KEYS):
+            continue
+        if not result["title_ko"].strip() or not result["title_en"].strip():
+            continue
+        valid[idx] = result
+    return valid
+
+def translate_batch(articles, retries=3):
+    """Translate articles in one request. Returns {article id: result} for valid items only."""
+    prompt = build_batch_prompt(articles)
+    for i in range(retries):
+        try:
+            response = generate_content(batch_model, prompt, cache=False)
+            parsed = parse_batch_response(response.text, len(articles))
+            return {articles[idx - 1]['id']: result for idx, result in parsed.items()}
+        except Exception as e:
+            if "429" in str(e) or "Quota" in str(e):
+                wait_time = (2 ** i) * 2  # 2, 4, 8 seconds
+                print(f"  ⚠️ Rate limit hit. Waiting {wait_time}s...")
+                time.sleep(wait_time)
+                continue
+            print(f"  ⚠️ Batch of {len(articles)} failed: {e}")
+            return {}
+    return {}
+
+def translate_in_batches(articles, batch_size=BATCH_SIZE):
+    """
+    Translate articles N per request. Items missing or invalid in a response are
+    re-batched (BATCH_ROUNDS), then sent one by one. Returns {article id: result}.
+    """
+    results = {}
+    pending = articles
+    requests_sent = 0
+    
+    for round_no in range(BATCH_ROUNDS):
+        if not pending:
+            break
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        requests_sent += len(batches)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for batch_result in executor.map(translate_batch, batches):
+                results.update(batch_result)
+        pending = [a for a in pending if a['id'] not in results]
+        print(f"  Round {round_no + 1}: {len(batches)} requests, "
+              f"{len(articles) - len(pending)}/{len(articles)} translated, {len(pending)} missing/invalid.")
+    
+    if pending:
+        print(f"  Falling back to single-article requests for {len(pending)} items...")
+        requests_sent += len(pending)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            future_to_article = {executor.submit(translate_single, a): a for a in pending}
+            for future in as_completed(future_to_article):
+                article = future_to_article[future]
+                try:
+                    results[article['id']] = future.result()
+                except Exception as e:
+                    print(f"  ❌ {article.get('title_original', '')[:30]}... : {e}")
+    
+    print(f"  Sent {requests_sent} Gemini requests for {len(articles)} articles.")
+    return results
+
+def build_bulk_row(article, result):
+    """
+    Full upsert row for one article, or None if nothing is missing.
+    Every row carries the same keys (PostgREST bulk upsert requirement) and the
+    NOT NULL identity columns, so the upsert on id behaves as a bulk update.
+    """
+    update_data = build_update(article, result)
+    if not update_data:
+        return None
+    row = {key: article[key] for key in ROW_IDENTITY_KEYS}
+    for key in TRANSLATION_KEYS:
+        row[key] = update_data.get(key, article[key])
+    return row
+
+def run_batched(representatives, duplicates_of, batch_size):
+    results, misses = lookup_cached(representatives)
+    if translation_cache is not None:
+        print(f"  Translation cache: {len(results)} hits, {len(misses)} to translate.")
+    if misses:
+        translated = translate_in_batches(misses, batch_size)
+        for article in misses:
+            store_cached(article, translated.get(article['id']))
+        results.update(translated)
+    
+    rows = []
+    for article in representatives:
+        result = results.get(article['id'])
+        if not result:
+            continue
+        # Near-duplicates reuse their representative's translation
+        for target in [article, *duplicates_of[article['id']]]:
+            row = build_bulk_row(target, result)
+            if row:
+                rows.append(row)
+    
+    print(f"Writing {len(rows)} translated rows...")
+    writer = BulkUpserter(supabase, "mvp2_articles", on_conflict="id")
+    writer.add(rows)
+    writer.flush()
+    print(f"  {writer.summary()}")
+    return len(results)
+
 def main():
+    parser = argparse.ArgumentParser(description="Translate recent articles (KO/EN) with Gemini")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Articles per Gemini request")
+    parser.add_argument("--no-batch", action="store_true", help="One request + one update per article (legacy mode)")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the local translation cache")
+    args = parser.parse_args()
+
+    global translation_cache
+    if not args.no_cache:
+        translation_cache = TranslationCache()
+
     print("Starting LLM Translation (Rate-Limited)...")
     
     try:
@@ -126,23 +360,32 @@ def main():
         
         # Fetch articles needing translation (Last 24h only)
         response = supabase.table("mvp2_articles") \
-            .select("*") \
+            .select("*, mvp2_news_sources(language)") \
             .or_("title_ko.is.null,title_en.is.null") \
             .gte("published_at", time_threshold) \
             .execute()
             
-        articles = response.data
+        # Translate one representative per near-duplicate group
+        representatives, duplicates_of = collapse_duplicates(response.data)
+        articles = representatives
         total = len(articles)
-        print(f"Found {total} articles needing translation.")
+        print(f"Found {len(response.data)} articles needing translation "
+              f"({total} after collapsing near-duplicates).")
+        
+        if not args.no_batch:
+            success_count = run_batched(articles, duplicates_of, args.batch_size)
+            print(f"\nTranslation Complete. {success_count}/{total} successful.")
+            return
         
         success_count = 0
         
         # Parallel Processing for Paid Tier (High RPD)
         # Use ThreadPoolExecutor but with retry logic
-        MAX_WORKERS = 10 
-        
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_article = {executor.submit(process_article_with_retry, article): article for article in articles}
+            future_to_article = {
+                executor.submit(process_article_with_retry, article, duplicates_of[article['id']]): article
+                for article in articles
+            }
             
             for i, future in enumerate(as_completed(future_to_article)):
                 article = future_to_article[future]
@@ -155,14 +398,17 @@ def main():
                         print(f"[{i+1}/{total}] ❌ {article.get('title_original', '')[:30]}... : {msg}")
                 except Exception as exc:
                     print(f"[{i+1}/{total}] 💥 Exception: {exc}")
-                    
-                # Small sleep to be polite even with paid tier
-                time.sleep(0.1)
 
         print(f"\nTranslation Complete. {success_count}/{total} successful.")
         
     except Exception as e:
         print(f"Error in main loop: {e}")
+    finally:
+        print(f"Rate limiter: {get_limiter(model.model_name).summary()}")
+        if translation_cache is not None:
+            evicted = translation_cache.evict()
+            print(f"Translation cache: {translation_cache.summary()}, {evicted} entries evicted.")
+            translation_cache.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
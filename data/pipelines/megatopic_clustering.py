@@ -0,0 +1,106 @@
+"""
+Megatopic clustering that scales with the topic window.
+
+AgglomerativeClustering(metric='cosine', linkage='average') over every topic
+needs the full n x n distance matrix: fine for 24h of topics, not for a wider
+PUBLISH_WINDOW_HOURS or more countries. Here the topics are first linked into a
+sparse radius graph: every pair of topics within the distance threshold, found
+with a blocked matrix multiply, so memory is bounded by the number of such pairs
+(a story with m close topics contributes m^2 edges) plus one block of similarities.
+
+An average-linkage merge at distance <= threshold needs at least one pair of
+topics that close, so no megatopic spans two connected components of that
+graph. method="average" therefore runs the same average linkage per component,
+which gives the same labels as the global run, and only components larger than
+MAX_DENSE_COMPONENT fall back to average linkage restricted to graph edges.
+method="components" returns the components themselves.
+"""
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.cluster import AgglomerativeClustering
+
+DISTANCE_THRESHOLD = 0.20   # Cosine distance, same as the previous AgglomerativeClustering
+BLOCK_MB = 64               # Memory per block of similarities in the matrix multiply
+MAX_DENSE_COMPONENT = 2000  # Larger components cluster on graph edges only
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def radius_graph(embeddings, threshold=DISTANCE_THRESHOLD, block_mb=BLOCK_MB):
+    """Symmetric sparse adjacency of every pair of topics within threshold"""
+    x = normalize(embeddings)
+    n = len(x)
+    if n < 2:
+        return coo_matrix((n, n), dtype=np.bool_).tocsr()
+
+    # Per similarity entry: float32 value + bool mask
+    block = max(1, int(block_mb * 1024 * 1024 // (5 * n)))
+    rows, cols = [], []
+    for start in range(0, n, block):
+        sims = x[start:start + block] @ x.T
+        local = np.arange(len(sims))
+        sims[local, start + local] = -np.inf      # No self edges
+        block_rows, block_cols = np.nonzero(1.0 - sims <= threshold)
+        rows.append(start + block_rows)
+        cols.append(block_cols)
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.bool_), (rows, cols)), shape=(n, n)).tocsr()
+    return graph.maximum(graph.T)
+
+
+def average_linkage(embeddings, threshold=DISTANCE_THRESHOLD, connectivity=None):
+    if len(embeddings) < 2:
+        return np.zeros(len(embeddings), dtype=np.int64)
+    return AgglomerativeClustering(
+        n_clusters=None,
+        distance_threshold=threshold,
+        metric='cosine',
+        linkage='average',
+        connectivity=connectivity,
+    ).fit_predict(embeddings)
+
+
+def cluster_megatopics(embeddings, threshold=DISTANCE_THRESHOLD, method="average",
+                       max_dense=MAX_DENSE_COMPONENT):
+    """
+    Megatopic label per topic (every topic gets one; singletons are clusters of one),
+    numbered by first appearance. method: "average" or "components".
+    """
+    n = len(embeddings)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    graph = radius_graph(embeddings, threshold)
+    n_components, components = connected_components(graph, directed=False)
+    if method == "components":
+        return renumber(components)
+    if method != "average":
+        raise ValueError(f"Unknown megatopic clustering method: {method}")
+
+    x = normalize(embeddings)
+    labels = np.empty(n, dtype=np.int64)
+    order = np.argsort(components, kind="stable")
+    bounds = np.flatnonzero(np.diff(components[order])) + 1
+    next_label = 0
+    for members in np.split(order, bounds):
+        if len(members) > max_dense:
+            sub = average_linkage(x[members], threshold, connectivity=graph[members][:, members])
+        else:
+            sub = average_linkage(x[members], threshold)
+        labels[members] = next_label + sub
+        next_label += sub.max() + 1
+    return renumber(labels)
+
+
+def renumber(labels):
+    """Labels 0..m-1 in order of first appearance (comparable across methods)"""
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    return rank[inverse]
@@ -0,0 +1,102 @@
+"""
+Batched topic metadata requests for llm_topic_enrichment.py: prompt building,
+token-budgeted packing of topics (from any country) into requests, and routing
+each response item back to its topic.
+
+No clients or environment checks here, so it can be imported (and tested) without
+the pipeline's secrets.
+"""
+
+import os
+from collections import Counter
+from rate_limiter import estimate_tokens
+
+HEADLINES_PER_TOPIC = 10   # Most recent headlines sent per topic
+# Topics from any country share a request up to this many estimated tokens (prompt + output)
+BATCH_TOKEN_BUDGET = int(os.getenv("ENRICH_BATCH_TOKENS", "8000"))
+OUTPUT_TOKENS_PER_TOPIC = 400
+
+def recent_headlines(articles, limit=HEADLINES_PER_TOPIC):
+    """Titles of a topic's most recent articles (the LLM context per topic)"""
+    recent = sorted(articles, key=lambda a: a.get('published_at') or "", reverse=True)[:limit]
+    return [a.get('title_ko') or a.get('title_en') or "No Title" for a in recent]
+
+def topic_block(number, topic_key, headlines):
+    return f"\n--- TOPIC {number}: {topic_key} ---\n" + "".join(f"- {title}\n" for title in headlines)
+
+def metadata_prompt(batch_topics):
+    input_text = "".join(topic_block(i + 1, topic_key, headlines)
+                         for i, (topic_key, headlines) in enumerate(batch_topics))
+
+    return f"""
+Role: You are 'News Toss', a witty, friendly, and knowledgeable news curator.
+Tone: Casual, engaging, sexy, yet informative. Use Korean. (e.g., "~했어요", "~인가요?", "결국...", "충격!")
+
+Task: Analyze {len(batch_topics)} separate news topics and generate metadata for EACH.
+
+Input:
+{input_text}
+
+Requirements for EACH topic:
+1. **topic_name_ko**: A catchy, clickable title in Korean.
+2. **summary_ko**: A 3-line summary.
+3. **keywords**: 3-5 hashtags.
+4. **category**: One of [Politics, Economy, Society, Tech, World, Culture, Sports, Entertainment].
+5. **stances**: Classify article IDs (if possible, otherwise just return empty lists).
+
+Output JSON List (one item per topic, "topic_number" is N from "TOPIC N"):
+[
+  {{
+    "topic_number": 1,
+    "original_topic_key": "TOPIC 1 key...",
+    "topic_name_ko": "...",
+    "summary_ko": "...",
+    "keywords": [...],
+    "category": "...",
+    "stances": {{ "factual": [], "critical": [], "supportive": [] }}
+  }},
+  ...
+]
+"""
+
+
+def pack_metadata_batches(topics, budget=BATCH_TOKEN_BUDGET):
+    """
+    Split (route_key, topic_key, headlines) topics, in order, into requests of at most
+    ~budget estimated tokens (prompt + output), whatever country each topic comes from.
+    A topic larger than the budget gets a request of its own.
+    """
+    base = estimate_tokens(metadata_prompt([]))
+    batches, current, used = [], [], base
+    for topic in topics:
+        _, topic_key, headlines = topic
+        cost = estimate_tokens(topic_block(len(current) + 1, topic_key, headlines)) + OUTPUT_TOKENS_PER_TOPIC
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = [], base
+            cost = estimate_tokens(topic_block(1, topic_key, headlines)) + OUTPUT_TOKENS_PER_TOPIC
+        current.append(topic)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def route_metadata(batch_topics, results):
+    """
+    Results aligned with batch_topics (None if missing): by topic_number, else by the
+    echoed key if only one topic of the batch has it (keys can repeat across countries)
+    """
+    routed = [None] * len(batch_topics)
+    key_counts = Counter(topic_key for topic_key, _ in batch_topics)
+    index_of = {topic_key: i for i, (topic_key, _) in enumerate(batch_topics) if key_counts[topic_key] == 1}
+    for res in results if isinstance(results, list) else []:
+        if not isinstance(res, dict):
+            continue
+        number = res.get('topic_number')
+        if isinstance(number, int) and 1 <= number <= len(batch_topics) and routed[number - 1] is None:
+            i = number - 1
+        else:
+            i = index_of.get(res.get('original_topic_key'))
+        if i is not None and routed[i] is None:
+            routed[i] = res
+    return routed
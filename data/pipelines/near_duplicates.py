@@ -0,0 +1,163 @@
+"""
+Cross-source near-duplicate detection (SimHash).
+
+Wire stories are syndicated across many sources under different URLs. At ingest,
+each article gets a 64-bit SimHash over its normalized title + summary and a
+dup_group_id shared with any recent article within MAX_HAMMING bits. Later stages
+(translation, embedding/clustering, LLM labeling) work on one representative per
+group and copy the result to the other members.
+
+Requires add_dup_group_columns.sql (mvp2_articles.simhash / dup_group_id).
+"""
+
+import re
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+SIMHASH_BITS = 64
+MAX_HAMMING = 3             # <= 3 differing bits (of 64) counts as the same story
+BANDS = MAX_HAMMING + 1     # Pigeonhole: any match within MAX_HAMMING shares one exact 16-bit band
+BAND_BITS = SIMHASH_BITS // BANDS
+SHINGLE_SIZE = 3            # Character shingles work for spaced and unspaced (CJK) scripts alike
+WINDOW_HOURS = 48           # Same window as the collector's freshness cutoff
+PAGE_SIZE = 1000
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Lowercase, NFKC, strip punctuation and collapse whitespace"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def simhash(text):
+    """64-bit SimHash over character shingles of normalized text. Returns None for empty text."""
+    text = normalize_text(text)
+    if not text:
+        return None
+    if len(text) <= SHINGLE_SIZE:
+        shingles = [text]
+    else:
+        shingles = [text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def article_simhash(title, summary):
+    return simhash(f"{title or ''} {summary or ''}")
+
+
+def to_hex(value):
+    return f"{value:016x}"
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """Banded SimHash index mapping fingerprints to dup_group_ids"""
+
+    def __init__(self):
+        self.bands = [{} for _ in range(BANDS)]   # band value -> [(simhash, group_id)]
+
+    def _band_keys(self, value):
+        mask = (1 << BAND_BITS) - 1
+        return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+    def add(self, value, group_id):
+        for band, key in zip(self.bands, self._band_keys(value)):
+            band.setdefault(key, []).append((value, group_id))
+
+    def find(self, value):
+        """Return the group_id of the closest indexed fingerprint within MAX_HAMMING, or None"""
+        best = None
+        best_distance = MAX_HAMMING + 1
+        for band, key in zip(self.bands, self._band_keys(value)):
+            for other, group_id in band.get(key, ()):
+                distance = hamming(value, other)
+                if distance < best_distance:
+                    best, best_distance = group_id, distance
+        return best
+
+    def assign(self, value):
+        """
+        Return (group_id, matched) for value, opening a new group (named after value)
+        if nothing indexed is within MAX_HAMMING.
+        """
+        group_id = self.find(value)
+        matched = group_id is not None
+        if not matched:
+            group_id = to_hex(value)
+        self.add(value, group_id)
+        return group_id, matched
+
+    @classmethod
+    def load_recent(cls, supabase, window_hours=WINDOW_HOURS):
+        """Build the index from articles published within the window"""
+        threshold = (datetime.now(timezone.utc) - timedelta(hours=window_hours)).isoformat()
+        index = cls()
+        offset = 0
+        while True:
+            response = supabase.table("mvp2_articles") \
+                .select("simhash, dup_group_id") \
+                .gte("published_at", threshold) \
+                .not_.is_("simhash", "null") \
+                .order("id") \
+                .range(offset, offset + PAGE_SIZE - 1) \
+                .execute()
+            rows = response.data or []
+            for row in rows:
+                index.add(int(row["simhash"], 16), row.get("dup_group_id") or row["simhash"])
+            if len(rows) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        return index
+
+
+def collapse_duplicates(articles):
+    """
+    Pick one representative per dup_group_id (earliest published, then lowest id).
+    Articles without a group are their own representative.
+    Returns (representatives in input order, {representative id: [duplicate articles]}).
+    """
+    groups = {}
+    for article in articles:
+        key = article.get("dup_group_id") or f"article:{article['id']}"
+        groups.setdefault(key, []).append(article)
+
+    representatives = []
+    duplicates_of = {}
+    for members in groups.values():
+        rep = min(members, key=lambda a: (a.get("published_at") or "", str(a["id"])))
+        representatives.append(rep)
+        duplicates_of[rep["id"]] = [a for a in members if a is not rep]
+
+    order = {id(a): i for i, a in enumerate(articles)}
+    representatives.sort(key=lambda a: order[id(a)])
+    return representatives, duplicates_of
+
+
+def expand_duplicates(ids, duplicates_of):
+    """Expand representative ids to include their group members (representative first)"""
+    expanded = []
+    for aid in ids:
+        expanded.append(aid)
+        expanded.extend(a["id"] for a in duplicates_of.get(aid, ()))
+    return expanded
@@ -0,0 +1,129 @@
+"""
+Adaptive per-feed polling schedule for rss_collector.py --loop.
+
+Each source's base interval is learned from its publish cadence (median gap
+between published_at values in mvp2_articles over HISTORY_DAYS). Busy wires get
+polled close to MIN_INTERVAL, quiet feeds drift towards MAX_INTERVAL. Feeds that
+fail or return nothing new back off exponentially and snap back to their base
+interval as soon as they yield new articles. State is saved between runs.
+"""
+
+import os
+import json
+import time
+from statistics import median
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as date_parser
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+SCHEDULE_PATH = os.getenv("POLL_SCHEDULE_PATH", os.path.join(CACHE_DIR, "poll_schedule.json"))
+
+MIN_INTERVAL = 5 * 60           # Never poll a feed more often than this
+MAX_INTERVAL = 6 * 60 * 60      # Never leave a feed unpolled longer than this
+DEFAULT_INTERVAL = 30 * 60      # New sources until their cadence is learned
+HISTORY_DAYS = 7
+EMPTY_BACKOFF = 1.5             # Multiplier per consecutive poll with nothing new
+FAILURE_BACKOFF = 2.0           # Multiplier per consecutive failed poll
+PAGE_SIZE = 1000
+
+
+def clamp_interval(seconds):
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, seconds))
+
+
+def estimate_interval(published_times):
+    """Median gap between consecutive publish times (datetimes), clamped; DEFAULT_INTERVAL without a gap"""
+    if len(published_times) < 2:
+        return DEFAULT_INTERVAL
+    ordered = sorted(published_times)
+    gaps = [(b - a).total_seconds() for a, b in zip(ordered, ordered[1:])]
+    gaps = [g for g in gaps if g > 0] or [MIN_INTERVAL]
+    return clamp_interval(median(gaps))
+
+
+def load_cadence(supabase, days=HISTORY_DAYS):
+    """Return {source_id: base interval in seconds} from mvp2_articles.published_at history"""
+    threshold = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    history = {}
+    offset = 0
+    while True:
+        response = supabase.table("mvp2_articles") \
+            .select("source_id, published_at") \
+            .gte("published_at", threshold) \
+            .order("id") \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute()
+        rows = response.data or []
+        for row in rows:
+            if row.get("source_id") is None or not row.get("published_at"):
+                continue
+            history.setdefault(str(row["source_id"]), []).append(date_parser.parse(row["published_at"]))
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    return {source_id: estimate_interval(times) for source_id, times in history.items()}
+
+
+class PollScheduler:
+    def __init__(self, state=None):
+        # source_id -> {base_interval, interval, next_poll_at, failures, empty_polls}
+        self.state = state or {}
+
+    def _entry(self, source_id):
+        return self.state.setdefault(str(source_id), {
+            "base_interval": DEFAULT_INTERVAL,
+            "interval": DEFAULT_INTERVAL,
+            "next_poll_at": 0,
+            "failures": 0,
+            "empty_polls": 0,
+        })
+
+    def learn(self, cadence, source_ids):
+        """Update base intervals from load_cadence(); sources without history get DEFAULT_INTERVAL"""
+        for source_id in source_ids:
+            entry = self._entry(source_id)
+            entry["base_interval"] = cadence.get(str(source_id), DEFAULT_INTERVAL)
+            if not entry["failures"] and not entry["empty_polls"]:
+                entry["interval"] = entry["base_interval"]
+
+    def due(self, sources, now=None):
+        now = time.time() if now is None else now
+        return [s for s in sources if self._entry(s["id"])["next_poll_at"] <= now]
+
+    def record(self, source_id, ok, new_articles, now=None):
+        """Reschedule a source after a poll"""
+        now = time.time() if now is None else now
+        entry = self._entry(source_id)
+        if not ok:
+            entry["failures"] += 1
+            entry["interval"] = clamp_interval(entry["base_interval"] * FAILURE_BACKOFF ** entry["failures"])
+        elif new_articles:
+            entry["failures"] = 0
+            entry["empty_polls"] = 0
+            entry["interval"] = entry["base_interval"]
+        else:
+            entry["failures"] = 0
+            entry["empty_polls"] += 1
+            entry["interval"] = clamp_interval(entry["base_interval"] * EMPTY_BACKOFF ** entry["empty_polls"])
+        entry["next_poll_at"] = now + entry["interval"]
+
+    def seconds_until_next(self, sources, now=None):
+        now = time.time() if now is None else now
+        if not sources:
+            return MIN_INTERVAL
+        return max(0, min(self._entry(s["id"])["next_poll_at"] for s in sources) - now)
+
+    def save(self, path=SCHEDULE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=SCHEDULE_PATH):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
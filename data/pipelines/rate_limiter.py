@@ -0,0 +1,235 @@
+"""
+Shared Gemini rate limiter.
+
+One token bucket for requests/minute and one for tokens/minute per model. Bucket
+state lives in a small JSON file guarded by an fcntl lock, so threads, asyncio
+tasks and separate processes (run_all_clustering.py / run_all_enrichment_parallel.py
+workers) all draw from the same budget instead of guessing with fixed sleeps.
+
+Token cost isn't known until the response arrives: acquire() charges an estimate
+and generate_content() settles the difference from response.usage_metadata.
+The call helpers check the LLM response cache (llm_cache.py) first, so cached
+prompts cost neither budget nor a request.
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+import llm_cache
+
+try:
+    import fcntl
+except ImportError:     # Windows: limits are enforced per process only
+    fcntl = None
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+STATE_PATH = os.getenv("GEMINI_RATE_LIMIT_PATH", os.path.join(CACHE_DIR, "gemini_rate_limit.json"))
+
+# (requests/minute, tokens/minute) per model (paid tier 1).
+# Override with GEMINI_RATE_LIMITS='{"gemini-2.5-flash": [2000, 4000000]}'
+MODEL_LIMITS = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1000, 1_000_000),
+    "gemini-2.5-flash-lite": (4000, 4_000_000),
+}
+DEFAULT_LIMITS = (150, 1_000_000)
+CHARS_PER_TOKEN = 4
+MAX_WAIT_STEP = 5.0     # Re-check the shared state at least this often while waiting
+
+
+def limits_for(model_name):
+    overrides = json.loads(os.getenv("GEMINI_RATE_LIMITS") or "{}")
+    rpm, tpm = overrides.get(model_name) or MODEL_LIMITS.get(model_name, DEFAULT_LIMITS)
+    return int(rpm), int(tpm)
+
+
+def estimate_tokens(prompt, max_output_tokens=0):
+    """Rough prompt size plus the expected share of the output budget"""
+    return len(prompt) // CHARS_PER_TOKEN + max_output_tokens // 2
+
+
+class RateLimiter:
+    def __init__(self, model_name, rpm=None, tpm=None, state_path=STATE_PATH):
+        default_rpm, default_tpm = limits_for(model_name)
+        self.model_name = model_name
+        self.rpm = rpm or default_rpm
+        self.tpm = tpm or default_tpm
+        self.state_path = state_path
+        self.lock_path = f"{state_path}.lock"
+        self.thread_lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens": 0, "waits": 0, "waited_seconds": 0.0}
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the shared state dict under the thread + file lock; saved on exit"""
+        with self.thread_lock, open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                yield state
+                tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.state_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _try_take(self, requests, tokens):
+        """Refill and take from both buckets if possible. Returns 0 or the seconds to wait."""
+        with self._locked_state() as state:
+            now = time.time()
+            bucket = state.get(self.model_name) or {"requests": self.rpm, "tokens": self.tpm, "updated_at": now}
+            elapsed = max(0.0, now - bucket["updated_at"])
+            bucket["requests"] = min(self.rpm, bucket["requests"] + elapsed * self.rpm / 60)
+            bucket["tokens"] = min(self.tpm, bucket["tokens"] + elapsed * self.tpm / 60)
+            bucket["updated_at"] = now
+
+            # A single request larger than the bucket would never fit: cap its charge
+            tokens = min(tokens, self.tpm)
+            wait = max(
+                (requests - bucket["requests"]) * 60 / self.rpm,
+                (tokens - bucket["tokens"]) * 60 / self.tpm,
+                0.0
+            )
+            if wait == 0.0:
+                bucket["requests"] -= requests
+                bucket["tokens"] -= tokens
+            state[self.model_name] = bucket
+        return wait
+
+    def acquire(self, tokens=0, requests=1):
+        """Block until the request fits both budgets. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._try_take(requests, tokens)
+            if not wait:
+                break
+            step = min(wait, MAX_WAIT_STEP)
+            time.sleep(step)
+            waited += step
+        self._count(requests, tokens, waited)
+        return waited
+
+    async def acquire_async(self, tokens=0, requests=1):
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_take, requests, tokens)
+            if not wait:
+                break
+            step = min(wait, MAX_WAIT_STEP)
+            await asyncio.sleep(step)
+            waited += step
+        self._count(requests, tokens, waited)
+        return waited
+
+    def settle(self, estimated, actual):
+        """Charge (or refund) the difference between the estimated and actual token count"""
+        if actual and actual != estimated:
+            self._adjust_tokens(actual - estimated)
+            self.stats["tokens"] += actual - estimated
+
+    def _adjust_tokens(self, delta):
+        with self._locked_state() as state:
+            bucket = state.get(self.model_name)
+            if bucket:
+                # May go negative: an overspent bucket simply takes longer to refill
+                bucket["tokens"] = min(self.tpm, bucket["tokens"] - delta)
+
+    def _count(self, requests, tokens, waited):
+        self.stats["requests"] += requests
+        self.stats["tokens"] += tokens
+        if waited:
+            self.stats["waits"] += 1
+            self.stats["waited_seconds"] += waited
+
+    def summary(self):
+        s = self.stats
+        return (f"{self.model_name}: {s['requests']} requests, ~{s['tokens']} tokens, "
+                f"throttled {s['waits']}x for {s['waited_seconds']:.1f}s (limits {self.rpm} RPM / {self.tpm} TPM)")
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_name):
+    """One limiter per model per process (they share state across processes via the file)"""
+    model_name = model_name.split("/")[-1]
+    with _limiters_lock:
+        if model_name not in _limiters:
+            _limiters[model_name] = RateLimiter(model_name)
+        return _limiters[model_name]
+
+
+def _model_config(model, kwargs):
+    return kwargs.get("generation_config") or getattr(model, "_generation_config", None) or {}
+
+
+def _prepare(model_name, prompt, config):
+    limiter = get_limiter(model_name)
+    if isinstance(config, dict):
+        max_output = config.get("max_output_tokens", 0)
+    else:
+        max_output = getattr(config, "max_output_tokens", 0)
+    return limiter, estimate_tokens(str(prompt), max_output or 0)
+
+
+def _settle(limiter, estimated, response):
+    usage = getattr(response, "usage_metadata", None)
+    limiter.settle(estimated, getattr(usage, "total_token_count", 0) if usage else 0)
+
+
+def generate_content(model, prompt, cache=True, validate=None, **kwargs):
+    """
+    model.generate_content() behind the shared limiter for model.model_name.
+    Cached unless cache=False; validate(text) -> bool keeps unusable answers out of the cache.
+    """
+    config = _model_config(model, kwargs)
+    key, cached = llm_cache.lookup(model.model_name, config, prompt) if cache else (None, None)
+    if cached:
+        return cached
+    limiter, estimated = _prepare(model.model_name, prompt, config)
+    limiter.acquire(estimated)
+    response = model.generate_content(prompt, **kwargs)
+    _settle(limiter, estimated, response)
+    llm_cache.store(key, model.model_name, response, validate)
+    return response
+
+
+async def generate_content_async(model, prompt, cache=True, validate=None, **kwargs):
+    config = _model_config(model, kwargs)
+    key, cached = llm_cache.lookup(model.model_name, config, prompt) if cache else (None, None)
+    if cached:
+        return cached
+    limiter, estimated = _prepare(model.model_name, prompt, config)
+    await limiter.acquire_async(estimated)
+    response = await model.generate_content_async(prompt, **kwargs)
+    _settle(limiter, estimated, response)
+    llm_cache.store(key, model.model_name, response, validate)
+    return response
+
+
+def generate_content_client(client, model, contents, config=None, cache=True, validate=None):
+    """client.models.generate_content() (google-genai SDK) behind the limiter and cache"""
+    key, cached = llm_cache.lookup(model, config, contents) if cache else (None, None)
+    if cached:
+        return cached
+    limiter, estimated = _prepare(model, contents, config)
+    limiter.acquire(estimated)
+    if config is None:
+        response = client.models.generate_content(model=model, contents=contents)
+    else:
+        response = client.models.generate_content(model=model, contents=contents, config=config)
+    _settle(limiter, estimated, response)
+    llm_cache.store(key, model, response, validate)
+    return response
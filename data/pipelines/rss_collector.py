@@ -1,12 +1,22 @@
 import os
+import json
 import time
-import feedparser
-import signal
+import hashlib
+import asyncio
+import argparse
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from dateutil import parser as date_parser
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from bs4 import BeautifulSoup
+from html_text import clean_html
+from feed_fetcher import fetch, parse_feed, fetch_feed
+from seen_urls import load_or_rebuild as load_seen_urls
+from near_duplicates import NearDuplicateIndex, article_simhash, to_hex
+from collections import Counter
+from poll_scheduler import PollScheduler, load_cadence
+from bulk_writer import BulkUpserter
 
 # Load environment variables
 # Try loading from backend/.env if data/pipelines/.env doesn't exist
@@ -23,32 +33,130 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def parse_rss_feed(url, timeout=30):
-    """Parse RSS feed with timeout"""
+# Async collection limits
+MAX_CONCURRENCY = 16        # Feeds in flight at once (all hosts)
+PER_HOST_CONCURRENCY = 2    # Feeds in flight at once per host (be nice to RSS servers)
+FETCH_TIMEOUT = 30
+
+# Articles per upsert request (rows are buffered across sources)
+UPSERT_CHUNK_SIZE = 500
+
+# Conditional GET cache (ETag / Last-Modified / body hash per feed URL)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+FETCH_CACHE_PATH = os.getenv("RSS_FETCH_CACHE_PATH", os.path.join(CACHE_DIR, "rss_fetch_cache.json"))
+
+# Long-lived polling loop (--loop)
+SOURCE_REFRESH_SECONDS = 60 * 60    # Reload sources, cadence and indexes this often
+MIN_LOOP_SLEEP = 10
+MAX_LOOP_SLEEP = 5 * 60
+
+def parse_rss_feed(url, timeout=FETCH_TIMEOUT):
+    """Parse RSS feed with an overall deadline (thread-safe, no signals)"""
+    try:
+        return check_feed(fetch_feed(url, deadline=timeout))
+    except Exception as e:
+        return {"success": False, "error": f"{type(e).__name__}: {str(e)}"}
+
+def check_feed(feed):
+    """Validate a parsed feed and wrap it in the result dict"""
+    if feed.bozo and not feed.entries:
+        return {"success": False, "error": f"Parsing error: {feed.bozo_exception}"}
+    
+    if not feed.entries:
+        return {"success": False, "error": "No entries found in feed"}
+        
+    return {"success": True, "feed": feed}
+
+def load_fetch_cache(path=FETCH_CACHE_PATH):
+    """Load per-feed conditional GET state. Returns {} if missing or unreadable."""
     try:
-        def timeout_handler(signum, frame):
-            raise TimeoutError(f"Feed parsing timeout after {timeout} seconds")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_fetch_cache(cache, path=FETCH_CACHE_PATH):
+    """Write per-feed conditional GET state atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def fetch_rss_feed(url, timeout=FETCH_TIMEOUT, cache_entry=None):
+    """
+    Download and parse RSS feed via feed_fetcher (safe to call from worker threads).
+    With a cache_entry, sends a conditional request and skips parsing when the feed
+    is unchanged (HTTP 304 or identical body hash).
+    """
+    try:
+        headers = {}
+        if cache_entry:
+            if cache_entry.get('etag'):
+                headers['If-None-Match'] = cache_entry['etag']
+            if cache_entry.get('last_modified'):
+                headers['If-Modified-Since'] = cache_entry['last_modified']
         
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout)
+        response = fetch(url, headers=headers, deadline=timeout)
         
-        try:
-            feed = feedparser.parse(url)
-            signal.alarm(0)
-        except TimeoutError as e:
-            return {"success": False, "error": str(e)}
+        if response['status'] == 304 and cache_entry:
+            return {
+                "success": True,
+                "not_modified": "304",
+                "bytes_not_downloaded": cache_entry.get('size', 0),
+                "bytes_not_parsed": 0,
+                "cache": cache_entry
+            }
         
-        if feed.bozo and not feed.entries:
-            return {"success": False, "error": f"Parsing error: {feed.bozo_exception}"}
+        body = response['content']
+        new_entry = {
+            "etag": response['headers'].get('ETag'),
+            "last_modified": response['headers'].get('Last-Modified'),
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "size": len(body),
+        }
         
-        if not feed.entries:
-            return {"success": False, "error": "No entries found in feed"}
-            
-        return {"success": True, "feed": feed}
+        if cache_entry and cache_entry.get('sha256') == new_entry['sha256']:
+            return {
+                "success": True,
+                "not_modified": "unchanged",
+                "bytes_not_downloaded": 0,
+                "bytes_not_parsed": len(body),
+                "cache": new_entry
+            }
         
+        result = check_feed(parse_feed(response))
+        result['cache'] = new_entry
+        return result
     except Exception as e:
         return {"success": False, "error": f"{type(e).__name__}: {str(e)}"}
 
+async def fetch_all_feeds(sources, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_CONCURRENCY, fetch_cache=None):
+    """Fetch every source concurrently. Returns results in the same order as sources."""
+    fetch_cache = fetch_cache or {}
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = {}
+    loop = asyncio.get_running_loop()
+    # Size the thread pool to the concurrency limit (the default pool may be smaller)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def fetch_one(source):
+        host = urlparse(source['rss_url']).netloc.lower()
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(per_host)
+        async with host_limits[host], global_limit:
+            start = time.time()
+            result = await loop.run_in_executor(
+                executor, fetch_rss_feed, source['rss_url'], FETCH_TIMEOUT, fetch_cache.get(source['rss_url'])
+            )
+            result['elapsed'] = time.time() - start
+            return result
+
+    try:
+        return await asyncio.gather(*(fetch_one(source) for source in sources))
+    finally:
+        executor.shutdown(wait=False)
+
 def parse_date(date_str):
     """Parse date string to UTC datetime. Return None on failure."""
     if not date_str:
@@ -73,109 +181,288 @@ def get_summary(entry):
         return entry.content[0].get('value', '')
     return None
 
+def build_articles(source, feed, seen=None, dups=None, stats=None):
+    """
+    Convert feed entries into mvp2_articles rows (deduplicated by URL).
+    Entries whose URL is in the seen-URL index are dropped before any parsing.
+    With a NearDuplicateIndex, each row also gets simhash / dup_group_id.
+    """
+    stats = stats if stats is not None else Counter()
+    source_articles = []
+    for entry in feed.entries:
+        # Basic validation
+        if not hasattr(entry, 'link') or not hasattr(entry, 'title'):
+            continue
+        
+        # Already stored (upsert would ignore it anyway)
+        if seen is not None and entry.link in seen:
+            stats['known'] += 1
+            continue
+            
+        published_dt = parse_date(entry.get('published', entry.get('updated')))
+        if not published_dt:
+            # Drop entries with unusable dates to avoid misclassifying stale content as fresh
+            continue
+        
+        # Hard cutoff to avoid pulling stale items when feeds resend old content
+        if published_dt < (datetime.now(timezone.utc) - timedelta(hours=48)):
+            continue
+        
+        raw_summary = get_summary(entry)
+        clean_summary = None
+        if raw_summary:
+            # Clean HTML (fast path, BeautifulSoup only for malformed markup)
+            clean_summary = clean_html(raw_summary)
+        
+        article = {
+            "url": entry.link,
+            "title_original": entry.title,
+            "title_ko": entry.title if source.get('language') == 'ko' else None,
+            "title_en": entry.title if source.get('language') == 'en' else None,
+            "summary_original": clean_summary, # Store cleaned original summary
+            "summary_ko": clean_summary if source.get('language') == 'ko' else None,
+            "summary_en": clean_summary if source.get('language') == 'en' else None,
+            "country_code": source['country_code'],
+            "source_id": source['id'],
+            "source_name": source['name'],
+            "published_at": published_dt.isoformat(),
+            "collected_at": datetime.now().isoformat()
+        }
+        
+        if dups is not None:
+            # Cross-source near-duplicate grouping (syndicated wire copies)
+            fingerprint = article_simhash(entry.title, clean_summary)
+            article["simhash"] = None
+            article["dup_group_id"] = None
+            if fingerprint is not None:
+                article["simhash"] = to_hex(fingerprint)
+                article["dup_group_id"], matched = dups.assign(fingerprint)
+                if matched:
+                    stats['near_duplicates'] += 1
+        
+        source_articles.append(article)
+        
+    # Deduplicate articles by URL within this batch
+    # Supabase upsert fails if the batch itself contains duplicates
+    unique_articles = {}
+    for article in source_articles:
+        if article['url'] not in unique_articles:
+            unique_articles[article['url']] = article
+    
+    return list(unique_articles.values())
+
+def make_article_writer():
+    """Buffered mvp2_articles writer shared by every source in a run"""
+    # ignore_duplicates: if the URL already exists in the DB, just ignore it
+    return BulkUpserter(
+        supabase, "mvp2_articles",
+        on_conflict="url",
+        ignore_duplicates=True,
+        chunk_size=UPSERT_CHUNK_SIZE,
+        dedupe_key="url"
+    )
+
+def process_feed_result(source, result, writer, seen=None, dups=None, stats=None, on_stored=None):
+    """
+    Build articles for one fetched feed and queue them on the shared writer.
+    on_stored(rows saved, whether the feed is fully stored) is called once the
+    feed's rows are resolved (immediately for failed / not-modified feeds).
+    """
+    def done(saved, stored):
+        if on_stored:
+            on_stored(saved, stored)
+    
+    if not result['success']:
+        print(f"  Failed: {result['error']}")
+        return done(0, False)
+    
+    if result.get('not_modified'):
+        reason = "HTTP 304" if result['not_modified'] == "304" else "body unchanged"
+        print(f"  Not modified ({reason}), skipping.")
+        return done(0, True)
+        
+    feed = result['feed']
+    print(f"  Found {len(feed.entries)} entries.")
+    
+    feed_stats = Counter()
+    final_batch = build_articles(source, feed, seen, dups, feed_stats)
+    if feed_stats['known']:
+        print(f"  Skipped {feed_stats['known']} already-stored entries.")
+    if feed_stats['near_duplicates']:
+        print(f"  Grouped {feed_stats['near_duplicates']} near-duplicates of recent articles.")
+    if stats is not None:
+        stats.update(feed_stats)
+    
+    def rows_written(ok_rows, failed_rows):
+        if seen is not None:
+            seen.add_many(article['url'] for article in ok_rows)
+        done(len(ok_rows), not failed_rows)
+    
+    # Batch insert (upsert to handle duplicates), flushed across sources
+    print(f"  Queued {len(final_batch)} articles.")
+    writer.add(final_batch, on_done=rows_written)
+
+def fetch_active_sources():
+    response = supabase.table("mvp2_news_sources").select("*").eq("is_active", True).execute()
+    return response.data
+
+def load_indexes(args):
+    """Load the seen-URL index and near-duplicate index (None when disabled/unavailable)"""
+    seen = None
+    if not args.no_seen_index:
+        try:
+            seen = load_seen_urls(supabase, force_rebuild=args.rebuild_seen_index)
+        except Exception as e:
+            print(f"Warning: seen-URL index unavailable, processing all entries: {e}")
+
+    dups = None
+    if not args.no_dedup:
+        try:
+            dups = NearDuplicateIndex.load_recent(supabase)
+        except Exception as e:
+            # Most likely add_dup_group_columns.sql hasn't been applied yet
+            print(f"Warning: near-duplicate index unavailable, skipping dup grouping: {e}")
+    return seen, dups
+
+def collect_concurrently(sources, args, fetch_cache, seen, dups, stats):
+    """
+    Fetch sources concurrently, then build in source order and write through one
+    buffered writer. Returns (rows saved, {source id: (poll ok, rows saved)}).
+    """
+    print(f"Fetching {len(sources)} feeds concurrently (max {args.max_concurrency}, {args.per_host} per host)...")
+    fetch_start = time.time()
+    results = asyncio.run(fetch_all_feeds(sources, args.max_concurrency, args.per_host, fetch_cache))
+    print(f"Fetched {len(results)} feeds in {time.time() - fetch_start:.2f}s.")
+    
+    writer = make_article_writer()
+    outcomes = {}
+    skipped = {"304": 0, "unchanged": 0}
+    bytes_not_downloaded = 0
+    bytes_not_parsed = 0
+    
+    def on_stored_for(source, result):
+        def on_stored(saved, stored):
+            outcomes[source['id']] = (result['success'], saved)
+            # Only remember a feed version once its articles are safely in the DB
+            if stored and result.get('cache'):
+                fetch_cache[source['rss_url']] = result['cache']
+        return on_stored
+    
+    # Parse in source order so logs and DB writes stay deterministic
+    for source, result in zip(sources, results):
+        print(f"\nProcessing {source['name']} ({source['country_code']}) [{result['elapsed']:.2f}s]...")
+        process_feed_result(source, result, writer, seen, dups, stats, on_stored_for(source, result))
+        
+        if result.get('not_modified'):
+            skipped[result['not_modified']] += 1
+            bytes_not_downloaded += result['bytes_not_downloaded']
+            bytes_not_parsed += result['bytes_not_parsed']
+    
+    writer.flush()
+    print(f"\nDB writes: {writer.summary()}")
+    print(f"Conditional GET: {skipped['304']} feeds not modified (304), "
+          f"{skipped['unchanged']} feeds with unchanged body.")
+    print(f"  Skipped {bytes_not_downloaded / 1024:.1f} KB download, {bytes_not_parsed / 1024:.1f} KB parsing.")
+    return sum(saved for _, saved in outcomes.values()), outcomes
+
+def run_polling_loop(args):
+    """
+    Long-lived collector: poll each source when its adaptive schedule says it's due
+    (see poll_scheduler.py) instead of polling everything once per cron run.
+    """
+    fetch_cache = {} if args.no_cache else load_fetch_cache()
+    scheduler = PollScheduler.load()
+    sources, seen, dups = [], None, None
+    last_refresh = 0
+    
+    print("Starting RSS polling loop (Ctrl+C to stop)...")
+    try:
+        while True:
+            if time.time() - last_refresh > SOURCE_REFRESH_SECONDS:
+                try:
+                    sources = fetch_active_sources()
+                    scheduler.learn(load_cadence(supabase), [s['id'] for s in sources])
+                    seen, dups = load_indexes(args)
+                    last_refresh = time.time()
+                    print(f"Refreshed {len(sources)} sources and publish cadence.")
+                except Exception as e:
+                    print(f"Error refreshing sources: {e}")
+            
+            due = scheduler.due(sources)
+            if due:
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] {len(due)}/{len(sources)} sources due.")
+                stats = Counter()
+                saved, outcomes = collect_concurrently(due, args, fetch_cache, seen, dups, stats)
+                for source in due:
+                    ok, new_articles = outcomes[source['id']]
+                    scheduler.record(source['id'], ok, new_articles)
+                
+                save_fetch_cache(fetch_cache)
+                scheduler.save()
+                if seen is not None:
+                    seen.save()
+                print(f"Tick done: {saved} new articles, {stats['known']} known entries skipped.")
+            
+            sleep_for = min(MAX_LOOP_SLEEP, max(MIN_LOOP_SLEEP, scheduler.seconds_until_next(sources)))
+            time.sleep(sleep_for)
+    except KeyboardInterrupt:
+        print("\nStopping polling loop...")
+        save_fetch_cache(fetch_cache)
+        scheduler.save()
+        if seen is not None:
+            seen.save()
+
 def main():
+    parser = argparse.ArgumentParser(description="Collect articles from active RSS sources")
+    parser.add_argument("--sequential", action="store_true", help="Fetch feeds one at a time (legacy mode)")
+    parser.add_argument("--loop", action="store_true", help="Run as a long-lived poller driven by each feed's publish cadence")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY, help="Max feeds fetched at once")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONCURRENCY, help="Max feeds fetched at once per host")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the conditional GET cache and re-fetch every feed")
+    parser.add_argument("--no-seen-index", action="store_true", help="Don't skip entries already stored in mvp2_articles")
+    parser.add_argument("--rebuild-seen-index", action="store_true", help="Rebuild the seen-URL index from mvp2_articles")
+    parser.add_argument("--no-dedup", action="store_true", help="Don't assign near-duplicate groups (simhash / dup_group_id)")
+    args = parser.parse_args()
+
+    if args.loop:
+        run_polling_loop(args)
+        return
+
     print("Starting RSS Collection...")
     
     # 1. Fetch active news sources
     try:
-        response = supabase.table("mvp2_news_sources").select("*").eq("is_active", True).execute()
-        sources = response.data
+        sources = fetch_active_sources()
         print(f"Found {len(sources)} active news sources.")
     except Exception as e:
         print(f"Error fetching sources: {e}")
         return
 
+    seen, dups = load_indexes(args)
+
     total_articles = 0
-    new_articles = 0
+    stats = Counter()
     
-    for source in sources:
-        print(f"\nProcessing {source['name']} ({source['country_code']})...")
-        result = parse_rss_feed(source['rss_url'])
-        
-        if not result['success']:
-            print(f"  Failed: {result['error']}")
-            continue
-            
-        feed = result['feed']
-        entries = feed.entries
-        print(f"  Found {len(entries)} entries.")
-        
-        source_articles = []
-        for entry in entries:
-            # Basic validation
-            if not hasattr(entry, 'link') or not hasattr(entry, 'title'):
-                continue
-                
-            published_dt = parse_date(entry.get('published', entry.get('updated')))
-            if not published_dt:
-                # Drop entries with unusable dates to avoid misclassifying stale content as fresh
-                continue
-            
-            # Hard cutoff to avoid pulling stale items when feeds resend old content
-            if published_dt < (datetime.now(timezone.utc) - timedelta(hours=48)):
-                continue
-            
-            raw_summary = get_summary(entry)
-            clean_summary = None
-            if raw_summary:
-                # Clean HTML
-                soup = BeautifulSoup(raw_summary, "html.parser")
-                clean_summary = soup.get_text(separator=" ", strip=True)
-            
-            article = {
-                "url": entry.link,
-                "title_original": entry.title,
-                "title_ko": entry.title if source.get('language') == 'ko' else None,
-                "title_en": entry.title if source.get('language') == 'en' else None,
-                "summary_original": clean_summary, # Store cleaned original summary
-                "summary_ko": clean_summary if source.get('language') == 'ko' else None,
-                "summary_en": clean_summary if source.get('language') == 'en' else None,
-                "country_code": source['country_code'],
-                "source_id": source['id'],
-                "source_name": source['name'],
-                "published_at": published_dt.isoformat(),
-                "collected_at": datetime.now().isoformat()
-            }
-            source_articles.append(article)
-            
-        # Batch insert (upsert to handle duplicates)
-        # Deduplicate articles by URL within this batch
-        # Supabase upsert fails if the batch itself contains duplicates
-        unique_articles = {}
-        for article in source_articles:
-            if article['url'] not in unique_articles:
-                unique_articles[article['url']] = article
-        
-        final_batch = list(unique_articles.values())
-        
-        if final_batch:
-            try:
-                # Upsert to DB (ignore duplicates if they exist in DB already, update if needed)
-                # on_conflict="url" ensures we don't create duplicates
-                data = supabase.table("mvp2_articles").upsert(
-                    final_batch, 
-                    on_conflict="url",
-                    ignore_duplicates=True # If it exists, just ignore (or False to update)
-                ).execute()
-                
-                print(f"  Saved {len(final_batch)} articles.")
-                new_articles += len(final_batch)
-                total_articles += len(final_batch)
-            except Exception as e:
-                print(f"  Error inserting articles: {e}")
-                # Fallback: Insert one by one if batch fails
-                print("  Retrying one by one...")
-                for article in final_batch:
-                    try:
-                        supabase.table("mvp2_articles").upsert(
-                            article, 
-                            on_conflict="url",
-                            ignore_duplicates=True
-                        ).execute()
-                    except Exception as inner_e:
-                        pass # Ignore individual errors
-        
-        time.sleep(0.5) # Be nice to RSS servers
+    if args.sequential:
+        writer = make_article_writer()
+        for source in sources:
+            print(f"\nProcessing {source['name']} ({source['country_code']})...")
+            result = parse_rss_feed(source['rss_url'])
+            process_feed_result(source, result, writer, seen, dups, stats)
+            time.sleep(0.5) # Be nice to RSS servers
+        writer.flush()
+        total_articles = writer.stats['rows_ok']
+        print(f"\nDB writes: {writer.summary()}")
+    else:
+        fetch_cache = {} if args.no_cache else load_fetch_cache()
+        total_articles, _ = collect_concurrently(sources, args, fetch_cache, seen, dups, stats)
+        save_fetch_cache(fetch_cache)
+
+    if seen is not None:
+        seen.save()
+        print(f"\nSeen-URL index: skipped {stats['known']} already-stored entries ({len(seen)} URLs indexed).")
+    if dups is not None:
+        print(f"Near-duplicates: {stats['near_duplicates']} articles joined an existing dup group.")
 
     print(f"\nRSS Collection Complete. Processed {total_articles} articles total.")
 
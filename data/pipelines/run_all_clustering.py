@@ -1,47 +1,87 @@
-import subprocess
 import time
-import sys
-import os
+import argparse
+import numpy as np
+import llm_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 COUNTRIES = ['AU', 'BE', 'CA', 'CN', 'DE', 'FR', 'GB', 'IT', 'JP', 'KR', 'NL', 'RU', 'US']
 
 MAX_CONCURRENT = 3
 
 def main():
-    print(f"🚀 Starting Global Clustering for {len(COUNTRIES)} countries (Max {MAX_CONCURRENT} concurrent)...")
-    
-    processes = []
-    queue = COUNTRIES[:]
-    
-    while queue or processes:
-        # Start new processes if slots available
-        while len(processes) < MAX_CONCURRENT and queue:
-            country = queue.pop(0)
+    parser = argparse.ArgumentParser(description="Cluster the last 24h of articles for every country in one process")
+    parser.add_argument("countries", nargs="*", default=COUNTRIES, help="Country codes (default: all)")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT, help="Countries clustered/labeled concurrently")
+    parser.add_argument("--incremental", action="store_true", help="Update live topics instead of re-clustering each window")
+    parser.add_argument("--full", action="store_true", help="With --incremental: force a full HDBSCAN consolidation")
+    parser.add_argument("--label-batch", type=int, help="Small clusters labeled per Gemini request (1 = one request per cluster)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
+    args = parser.parse_args()
+
+    # One process, one embedding model (loaded on first miss) shared by every country
+    import llm_topic_clustering_embedding as clustering
+    label_batch_size = args.label_batch or clustering.LABEL_BATCH_SIZE
+    if args.no_llm_cache:
+        llm_cache.disable()
+
+    print(f"🚀 Starting Global Clustering for {len(args.countries)} countries (Max {args.workers} concurrent)...")
+    start = time.time()
+
+    # 1. Fetch + collapse near-duplicates (I/O bound, all countries at once)
+    prepared = {}
+    with ThreadPoolExecutor(max_workers=len(args.countries)) as executor:
+        future_to_country = {executor.submit(clustering.prepare_articles, c): c for c in args.countries}
+        for future in as_completed(future_to_country):
+            country = future_to_country[future]
+            try:
+                articles, duplicates_of = future.result()
+            except Exception as e:
+                print(f"  ❌ {country} Failed to fetch articles: {e}")
+                continue
+            if articles:
+                prepared[country] = (articles, duplicates_of)
+
+    # 2. Embed every country's titles in one batch (store hits skipped, misses encoded together)
+    countries = [c for c in args.countries if c in prepared]
+    titles, ids, offsets = [], [], {}
+    for country in countries:
+        articles = prepared[country][0]
+        offsets[country] = (len(titles), len(titles) + len(articles))
+        titles.extend(a['title_en'] for a in articles)
+        ids.extend(a['id'] for a in articles)
+    print(f"  Embedding {len(titles)} titles from {len(countries)} countries...")
+    embeddings = clustering.get_embeddings(titles, ids) if titles else np.zeros((0, 0))
+    print(f"  ⏱️ Fetch + embed: {time.time() - start:.1f}s")
+
+    # 3. Cluster + label per country in a worker pool
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        future_to_country = {}
+        for country in countries:
+            articles, duplicates_of = prepared[country]
+            lo, hi = offsets[country]
             print(f"  ✨ Starting {country}...")
-            
-            # Use absolute path to ensure it works from any directory
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            clustering_script = os.path.join(script_dir, "llm_topic_clustering_embedding.py")
-            
-            cmd = [sys.executable, clustering_script, country]
-            p = subprocess.Popen(cmd)
-            processes.append((country, p))
-            
-        # Check for completed processes
-        active_processes = []
-        for country, p in processes:
-            if p.poll() is not None: # Process finished
-                if p.returncode == 0:
-                    print(f"  ✅ {country} Completed.")
-                else:
-                    print(f"  ❌ {country} Failed with code {p.returncode}.")
+            if args.incremental:
+                future = executor.submit(clustering.cluster_country_incremental, country, articles,
+                                         duplicates_of, embeddings[lo:hi], args.full, label_batch_size)
             else:
-                active_processes.append((country, p))
-                
-        processes = active_processes
-        time.sleep(1) # Check every second
+                future = executor.submit(clustering.cluster_country, country, articles, duplicates_of,
+                                         embeddings[lo:hi], label_batch_size)
+            future_to_country[future] = country
+
+        for future in as_completed(future_to_country):
+            country = future_to_country[future]
+            try:
+                future.result()
+                print(f"  ✅ {country} Completed.")
+            except Exception as e:
+                failed.append(country)
+                print(f"  ❌ {country} Failed: {e}")
 
-    print("\n🎉 All countries processed.")
+    print(f"\n🎉 All countries processed in {time.time() - start:.1f}s.")
+    if failed:
+        # Like the old per-process driver, a failed country doesn't stop the pipeline
+        print(f"  ⚠️ Failed: {', '.join(failed)}")
 
 if __name__ == "__main__":
     main()
@@ -1,50 +1,139 @@
-import subprocess
-import sys
-import os
+import time
 import uuid
+import argparse
+import threading
+import llm_cache
+import article_store
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 COUNTRIES = ['AU', 'BE', 'CA', 'CN', 'DE', 'FR', 'GB', 'IT', 'JP', 'KR', 'NL', 'RU', 'US']
-MAX_WORKERS = 10
-
-def run_enrichment(country, batch_id):
-    """Run enrichment for a single country"""
-    print(f"  ✨ Starting {country}...")
-    try:
-        # Pass batch_id as argument
-        result = subprocess.run(
-            [sys.executable, "data/pipelines/llm_topic_enrichment.py", country, f"--batch_id={batch_id}"],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            print(f"  ✅ {country} Completed.")
-            return True
-        else:
-            print(f"  ❌ {country} Failed: {result.stderr}")
-            return False
-    except Exception as e:
-        print(f"  ❌ {country} Error: {e}")
-        return False
+# Gemini quota is enforced across the worker threads by rate_limiter.py,
+# so every country can run at once
+MAX_WORKERS = len(COUNTRIES)
+MAX_RETRIES = 2
+
+print_lock = threading.Lock()
+
+def say(message):
+    with print_lock:
+        print(message, flush=True)
+
+def country_logger(country):
+    """log() for the enrichment stages: whole lines, prefixed, so concurrent countries stay readable"""
+    def log(message):
+        say(f"[{country}] {message}")
+    return log
+
+def timed(task, country):
+    start = time.time()
+    result = task(country)
+    return result, time.time() - start
+
+def run_countries(countries, task, workers, retries):
+    """
+    task(country) for every country on a thread pool; failed countries are retried on
+    their own, up to retries more times. Returns ({country: (result, seconds, attempts)}, {country: error}).
+    """
+    results, failed = {}, {}
+    pending = list(countries)
+    for attempt in range(1, retries + 2):
+        if attempt > 1:
+            say(f"\n🔁 Retrying {len(pending)} failed countries (attempt {attempt}/{retries + 1}): {', '.join(pending)}")
+        failed = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+            future_to_country = {}
+            for country in pending:
+                say(f"  ✨ Starting {country}...")
+                future_to_country[executor.submit(timed, task, country)] = country
+
+            for future in as_completed(future_to_country):
+                country = future_to_country[future]
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    failed[country] = str(e)
+                    say(f"  ❌ {country} Failed: {e}")
+                    continue
+                results[country] = (result, seconds, attempt)
+                say(f"  ✅ {country} Completed in {seconds:.1f}s.")
+        pending = [c for c in pending if c in failed]
+        if not pending:
+            break
+    return results, failed
+
+def print_summary(prepared, saved, failed, llm_seconds):
+    print(f"\n  {'Country':<8}{'Topics':>7}{'New':>5}{'Upd':>5}{'Fetch':>8}{'Save':>8}  Tries")
+    for country in sorted(prepared):
+        data, _, fetch_attempts = prepared[country]
+        if data is None:
+            print(f"  {country:<8}{'-':>7}{'-':>5}{'-':>5}  (no clusters file)")
+        elif country in saved:
+            stats, _, save_attempts = saved[country]
+            t = stats['timings']
+            print(f"  {country:<8}{stats['topics']:>7}{stats['inserted']:>5}{stats['updated']:>5}"
+                  f"{t['fetch']:>7.1f}s{t['save']:>7.1f}s  {fetch_attempts}+{save_attempts}")
+    for country, error in sorted(failed.items()):
+        print(f"  {country:<8}❌ {error}")
+    print(f"  LLM metadata (all countries): {llm_seconds:.1f}s")
 
 def main():
-    # Generate a shared batch_id for this entire run
+    parser = argparse.ArgumentParser(description="Enrich every country's clusters in one process")
+    parser.add_argument("countries", nargs="*", default=COUNTRIES, help="Country codes (default: all)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Countries fetched/saved concurrently")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="Extra attempts for each failed country")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the Gemini response cache (llm_cache.py)")
+    args = parser.parse_args()
+
+    # One process: one Supabase client, one Gemini model and one rate limiter shared by every country
+    import llm_topic_enrichment as enrichment
+    if args.no_llm_cache:
+        llm_cache.disable()
+
+    # Generate a shared batch_id for this entire run (retries reuse it)
     SHARED_BATCH_ID = str(uuid.uuid4())
-    print(f"🚀 Starting Parallel Enrichment for {len(COUNTRIES)} countries (Max {MAX_WORKERS} concurrent)...")
+    print(f"🚀 Starting Parallel Enrichment for {len(args.countries)} countries (Max {args.workers} concurrent)...")
     print(f"🔖 Shared Batch ID: {SHARED_BATCH_ID}")
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit all tasks with shared batch_id
-        future_to_country = {executor.submit(run_enrichment, country, SHARED_BATCH_ID): country for country in COUNTRIES}
-        
-        for future in as_completed(future_to_country):
-            country = future_to_country[future]
-            try:
-                success = future.result()
-            except Exception as exc:
-                print(f"  ❌ {country} generated an exception: {exc}")
-
-    print("\n🎉 All countries enriched.")
+    start = time.time()
+
+    # 1. Read clusters + fetch articles + source dedup per country
+    print("\n📥 Preparing countries...")
+    prepared, fetch_failed = run_countries(
+        args.countries, lambda c: enrichment.prepare_country(c, log=country_logger(c)), args.workers, args.retries)
+    ready = [c for c in args.countries if c in prepared and prepared[c][0] is not None]
+
+    # 2. Token-budgeted LLM requests packed across countries, routed back by (country, topic key)
+    print("\n🧠 Generating metadata for all countries...")
+    stage_start = time.time()
+    topics = [((country, key), key, headlines)
+              for country in ready
+              for key, headlines in enrichment.metadata_topics(prepared[country][0])]
+    metadata = enrichment.generate_metadata(topics, log=say)
+    for country in ready:
+        enrichment.apply_metadata(prepared[country][0],
+                                  {key: res for (c, key), res in metadata.items() if c == country})
+    llm_seconds = time.time() - stage_start
+
+    # 3. Write JSON + save to DB per country. A failed save may have committed part of its
+    # writes, so a retry re-reads the articles' topic links instead of the prepared snapshot
+    print("\n💾 Saving countries...")
+    save_attempted = set()
+
+    def save(c):
+        retry = c in save_attempted
+        save_attempted.add(c)
+        return enrichment.save_country(c, prepared[c][0], SHARED_BATCH_ID, log=country_logger(c), retry=retry)
+
+    saved, save_failed = run_countries(ready, save, args.workers, args.retries)
+    failed = {**fetch_failed, **save_failed}
+
+    print(f"\n🎉 All countries processed in {time.time() - start:.1f}s.")
+    print_summary(prepared, saved, failed, llm_seconds)
+    print(f"  Rate limiter: {enrichment.get_limiter(enrichment.model.model_name).summary()}")
+    print(f"  {llm_cache.summary()}")
+    print(f"  {article_store.summary()}")
+    if failed:
+        # Like run_all_clustering.py, a failed country doesn't stop the pipeline
+        print(f"  ⚠️ Failed after {args.retries + 1} attempts: {', '.join(sorted(failed))}")
 
 if __name__ == "__main__":
     main()
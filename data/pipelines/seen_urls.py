@@ -0,0 +1,102 @@
+"""
+Persistent seen-URL index for the RSS collector.
+
+Keeps a compact set of 8-byte blake2b digests of every article URL already stored
+in mvp2_articles for the retention window, so known entries can be dropped before
+HTML cleaning and before the upsert. The index is saved to disk between runs and
+rebuilt from the DB when it gets older than REBUILD_HOURS (or on demand).
+"""
+
+import os
+import json
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+SEEN_URLS_PATH = os.getenv("SEEN_URLS_PATH", os.path.join(CACHE_DIR, "seen_urls.bin"))
+
+DIGEST_SIZE = 8         # 64-bit digests: ~0 collision risk at our volume, 8 bytes per URL
+RETENTION_HOURS = 72    # Collector keeps entries from the last 48h; keep a margin on top
+REBUILD_HOURS = 24      # Rebuild from mvp2_articles at least this often
+PAGE_SIZE = 1000        # Supabase default max rows per request
+
+
+def url_digest(url):
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class SeenUrlIndex:
+    def __init__(self, digests=None, built_at=None):
+        self.digests = set(digests or ())
+        self.built_at = built_at or time.time()
+
+    def __contains__(self, url):
+        return url_digest(url) in self.digests
+
+    def __len__(self):
+        return len(self.digests)
+
+    def add_many(self, urls):
+        self.digests.update(url_digest(url) for url in urls)
+
+    def is_stale(self, max_age_hours=REBUILD_HOURS):
+        return time.time() - self.built_at > max_age_hours * 3600
+
+    def save(self, path=SEEN_URLS_PATH):
+        """Write as one JSON header line followed by the raw digests"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            header = {"built_at": self.built_at, "digest_size": DIGEST_SIZE, "count": len(self.digests)}
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(b"".join(sorted(self.digests)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=SEEN_URLS_PATH):
+        """Load a saved index. Returns None if missing or unreadable."""
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if header.get("digest_size") != DIGEST_SIZE or len(data) % DIGEST_SIZE:
+            return None
+        digests = (data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE))
+        return cls(digests, header.get("built_at"))
+
+    @classmethod
+    def rebuild(cls, supabase, retention_hours=RETENTION_HOURS):
+        """Rebuild from mvp2_articles.url for articles published within the retention window"""
+        threshold = (datetime.now(timezone.utc) - timedelta(hours=retention_hours)).isoformat()
+        index = cls()
+        offset = 0
+        while True:
+            response = supabase.table("mvp2_articles") \
+                .select("url") \
+                .gte("published_at", threshold) \
+                .order("id") \
+                .range(offset, offset + PAGE_SIZE - 1) \
+                .execute()
+            rows = response.data or []
+            index.add_many(row["url"] for row in rows if row.get("url"))
+            if len(rows) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        return index
+
+
+def load_or_rebuild(supabase, path=SEEN_URLS_PATH, force_rebuild=False):
+    """Load the saved index, rebuilding it from the DB if missing, stale or forced"""
+    index = None if force_rebuild else SeenUrlIndex.load(path)
+    if index is not None and not index.is_stale():
+        print(f"Loaded seen-URL index ({len(index)} URLs).")
+        return index
+
+    start = time.time()
+    index = SeenUrlIndex.rebuild(supabase)
+    index.save(path)
+    print(f"Rebuilt seen-URL index from mvp2_articles ({len(index)} URLs, {time.time() - start:.2f}s).")
+    return index
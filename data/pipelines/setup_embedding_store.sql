@@ -0,0 +1,17 @@
+-- Persistent embedding store (see embedding_store.py)
+-- MVP2_embeddings was sized for text-embedding-004 (768 dims) and never populated;
+-- the pipelines embed locally with paraphrase-multilingual-MiniLM-L12-v2 (384 dims).
+-- text_hash: sha256 prefix of the embedded text, so edited titles are re-embedded
+-- One row per (entity, model) so switching models doesn't overwrite old vectors
+
+DROP INDEX IF EXISTS idx_embeddings_vector;
+DELETE FROM mvp2_embeddings WHERE vector_dims(embedding_vector) <> 384;
+ALTER TABLE mvp2_embeddings ALTER COLUMN embedding_vector TYPE vector(384);
+ALTER TABLE mvp2_embeddings ALTER COLUMN model_name SET DEFAULT 'paraphrase-multilingual-MiniLM-L12-v2';
+ALTER TABLE mvp2_embeddings ADD COLUMN IF NOT EXISTS text_hash TEXT;
+
+ALTER TABLE mvp2_embeddings DROP CONSTRAINT IF EXISTS mvp2_embeddings_entity_type_entity_id_key;
+ALTER TABLE mvp2_embeddings DROP CONSTRAINT IF EXISTS mvp2_embeddings_entity_model_key;
+ALTER TABLE mvp2_embeddings ADD CONSTRAINT mvp2_embeddings_entity_model_key UNIQUE (entity_type, entity_id, model_name);
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_vector ON mvp2_embeddings USING hnsw (embedding_vector vector_cosine_ops);
@@ -0,0 +1,83 @@
+-- Set-based topic persistence for llm_topic_enrichment.py (see topic_store.py)
+-- One call per country run replaces a verify/insert-or-update/link round trip per topic.
+-- p_topics: JSON array in save order, one object per topic:
+--   {"topic_name", "candidate_id", "article_ids", "article_count", "source_count",
+--    "stances", "keywords", "category", "summary"}
+-- candidate_id is the local_topic_id most of the topic's articles already carry.
+-- If that topic was created in the last 24h it is updated, otherwise a new
+-- (unpublished) topic is inserted; then every topic's articles are linked to it.
+-- When several topics share a row or an article, the later one wins, as with
+-- sequential writes. Returns one row per input topic.
+
+ALTER TABLE mvp2_topics ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION mvp2_save_enriched_topics(p_country_code TEXT, p_batch_id UUID, p_topics JSONB)
+RETURNS TABLE (topic_index INT, topic_id UUID, updated BOOLEAN)
+LANGUAGE sql
+AS $$
+    WITH input AS (
+        SELECT (t.ord - 1)::INT AS idx, t.item, recent.id AS existing_id
+        FROM jsonb_array_elements(p_topics) WITH ORDINALITY AS t(item, ord)
+        LEFT JOIN mvp2_topics recent
+               ON recent.id = NULLIF(t.item->>'candidate_id', '')::UUID
+              AND recent.created_at >= NOW() - INTERVAL '24 hours'
+    ),
+    resolved AS (
+        SELECT idx, item, existing_id, COALESCE(existing_id, gen_random_uuid()) AS topic_id
+        FROM input
+    ),
+    updated_topics AS (
+        UPDATE mvp2_topics t SET
+            topic_name = r.item->>'topic_name',
+            article_ids = ARRAY(SELECT jsonb_array_elements_text(r.item->'article_ids'))::UUID[],
+            article_count = (r.item->>'article_count')::INT,
+            source_count = (r.item->>'source_count')::INT,
+            stances = r.item->'stances',
+            keywords = ARRAY(SELECT jsonb_array_elements_text(COALESCE(r.item->'keywords', '[]'::JSONB))),
+            category = COALESCE(r.item->>'category', 'Unclassified'),
+            summary = COALESCE(r.item->>'summary', ''),
+            batch_id = p_batch_id,
+            updated_at = NOW()
+        FROM (
+            SELECT DISTINCT ON (existing_id) existing_id, item
+            FROM resolved
+            WHERE existing_id IS NOT NULL
+            ORDER BY existing_id, idx DESC
+        ) r
+        WHERE t.id = r.existing_id
+        RETURNING t.id
+    ),
+    inserted_topics AS (
+        INSERT INTO mvp2_topics (id, country_code, topic_name, article_ids, article_count, source_count,
+                                 stances, keywords, category, summary, batch_id, is_published, created_at)
+        SELECT r.topic_id,
+               p_country_code,
+               r.item->>'topic_name',
+               ARRAY(SELECT jsonb_array_elements_text(r.item->'article_ids'))::UUID[],
+               (r.item->>'article_count')::INT,
+               (r.item->>'source_count')::INT,
+               r.item->'stances',
+               ARRAY(SELECT jsonb_array_elements_text(COALESCE(r.item->'keywords', '[]'::JSONB))),
+               COALESCE(r.item->>'category', 'Unclassified'),
+               COALESCE(r.item->>'summary', ''),
+               p_batch_id,
+               FALSE,
+               NOW()
+        FROM resolved r
+        WHERE r.existing_id IS NULL
+        RETURNING id
+    ),
+    linked_articles AS (
+        UPDATE mvp2_articles a SET local_topic_id = l.topic_id
+        FROM (
+            SELECT DISTINCT ON (aid) aid::UUID AS article_id, r.topic_id
+            FROM resolved r, jsonb_array_elements_text(r.item->'article_ids') AS aid
+            ORDER BY aid, r.idx DESC
+        ) l
+        WHERE a.id = l.article_id
+        RETURNING a.id
+    )
+    SELECT r.idx, r.topic_id, r.existing_id IS NOT NULL
+    FROM resolved r
+    ORDER BY r.idx;
+$$;
@@ -3,10 +3,10 @@ RSS Feed Validation Script - ALL FEEDS
 전체 52개 언론사 RSS 피드를 모두 테스트
 """
 
-import feedparser
 import json
 from datetime import datetime
 import time
+from feed_fetcher import fetch_feed
 
 # 레거시 파일에서 가져온 전체 RSS 피드 목록
 ALL_RSS_FEEDS = {
@@ -106,18 +106,9 @@ ALL_RSS_FEEDS = {
 def parse_rss_feed(url, timeout=30):
     """feedparser를 사용하여 RSS 피드 파싱 (30초 타임아웃)"""
     try:
-        import signal
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError(f"Feed parsing timeout after {timeout} seconds")
-        
-        # 타임아웃 설정
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout)
-        
+        # 공용 fetch 함수 사용 (SIGALRM 없이 전체 타임아웃 + 최대 크기 제한)
         try:
-            feed = feedparser.parse(url)
-            signal.alarm(0)  # 타임아웃 해제
+            feed = fetch_feed(url, deadline=timeout)
         except TimeoutError as e:
             return {
                 "success": False,
@@ -0,0 +1,54 @@
+"""
+Checks for metadata_batches.py: routing a batched metadata response back to its
+topics when batches mix countries, and token-budgeted packing.
+Run: python -m pytest data/pipelines/test_enrichment_routing.py  (or python data/pipelines/test_enrichment_routing.py)
+"""
+
+from metadata_batches import route_metadata, pack_metadata_batches
+
+# Same topic key from two countries (e.g. the same story clustered in KR and US), packed into one request
+BATCH = [("Fed rate cut", ["KR headline"]), ("Election debate", ["GB headline"]),
+         ("Fed rate cut", ["US headline"])]
+
+
+def result(number, key, title):
+    return {"topic_number": number, "original_topic_key": key, "title": title}
+
+
+def test_duplicate_keys_route_by_topic_number():
+    results = [result(3, "Fed rate cut", "US"), result(1, "Fed rate cut", "KR"),
+               result(2, "Election debate", "GB")]
+    routed = route_metadata(BATCH, results)
+    assert [r["title"] for r in routed] == ["KR", "GB", "US"]
+
+
+def test_duplicate_key_without_number_is_not_guessed():
+    routed = route_metadata(BATCH, [{"original_topic_key": "Fed rate cut", "title": "?"}])
+    assert routed == [None, None, None]
+
+
+def test_unique_key_routes_without_number():
+    routed = route_metadata(BATCH, [{"original_topic_key": "Election debate", "title": "GB"}])
+    assert routed[1]["title"] == "GB" and routed[0] is None and routed[2] is None
+
+
+def test_repeated_number_falls_back_to_unique_key():
+    results = [result(1, "Fed rate cut", "KR"), result(1, "Election debate", "GB")]
+    routed = route_metadata(BATCH, results)
+    assert routed[0]["title"] == "KR" and routed[1]["title"] == "GB" and routed[2] is None
+
+
+def test_packing_keeps_order_and_budget():
+    topics = [((country, "Fed rate cut"), "Fed rate cut", ["headline " * 20] * 10) for country in ("KR", "US", "JP", "GB")]
+    batches = pack_metadata_batches(topics, budget=2000)
+    assert [t for batch in batches for t in batch] == topics
+    assert len(batches) > 1 and all(batches)
+
+
+if __name__ == "__main__":
+    test_duplicate_keys_route_by_topic_number()
+    test_duplicate_key_without_number_is_not_guessed()
+    test_unique_key_routes_without_number()
+    test_repeated_number_falls_back_to_unique_key()
+    test_packing_keeps_order_and_budget()
+    print("✅ metadata batching checks passed")
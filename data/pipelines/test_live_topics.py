@@ -0,0 +1,59 @@
+"""
+Checks for live_topics.py (incremental clustering state): pool micro-clusters.
+Run: python -m pytest data/pipelines/test_live_topics.py  (or python data/pipelines/test_live_topics.py)
+"""
+
+import numpy as np
+from sklearn.cluster import HDBSCAN
+from live_topics import LiveTopics
+
+DIM = 384
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def small_pool_labels(pool):
+    # llm_topic_clustering_embedding.hdbscan_labels for a small pool (< 50), allow_single_cluster=True
+    if len(pool) < 50:
+        size = 2
+    else:
+        size = 3
+    return HDBSCAN(min_cluster_size=size, min_samples=size, cluster_selection_epsilon=0.0,
+                   metric='euclidean', allow_single_cluster=True).fit_predict(pool)
+
+
+def run_pool(embeddings, cluster_fn):
+    ids = [f"a{i}" for i in range(len(embeddings))]
+    state = LiveTopics("XX")
+    state.assign(ids, embeddings, cluster_fn)
+    return state
+
+
+def test_unrelated_pool_makes_no_topic():
+    rng = np.random.default_rng(0)
+    for n in (2, 20, 40):
+        embeddings = unit(rng.normal(size=(n, DIM))).astype(np.float32)
+        for cluster_fn in (small_pool_labels, lambda pool: np.zeros(len(pool), dtype=int)):
+            state = run_pool(embeddings, cluster_fn)
+            assert state.topics == {}, f"{n} unrelated vectors became {len(state.topics)} topic(s)"
+            assert sorted(state.pool) == sorted(f"a{i}" for i in range(n))
+
+
+def test_single_story_pool_makes_one_topic():
+    rng = np.random.default_rng(1)
+    centre = rng.normal(size=DIM)
+    embeddings = unit(centre + rng.normal(scale=0.02, size=(4, DIM))).astype(np.float32)
+    state = run_pool(embeddings, small_pool_labels)
+    assert len(state.topics) == 1
+    members = next(iter(state.topics.values()))["members"]
+    # HDBSCAN may leave some of the story as noise; those stay pooled
+    assert len(members) >= 2
+    assert sorted(members + state.pool) == ["a0", "a1", "a2", "a3"]
+
+
+if __name__ == "__main__":
+    test_unrelated_pool_makes_no_topic()
+    test_single_story_pool_makes_one_topic()
+    print("✅ live_topics checks passed.")
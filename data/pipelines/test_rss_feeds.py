@@ -7,6 +7,7 @@ import requests
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import json
+from feed_fetcher import fetch, DeadlineExceeded, FeedTooLarge
 
 # 각 국가별 1개 언론사만 테스트 (대표 언론사)
 TEST_FEEDS = {
@@ -86,11 +87,10 @@ def parse_rss_feed(url, timeout=30):
         }
         
         print(f"  📡 Fetching feed...")
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
+        response = fetch(url, headers=headers, deadline=timeout)
         
         # XML 파싱
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(response['content'])
         
         # channel 찾기 (RSS 2.0)
         channel = root.find('channel')
@@ -165,10 +165,15 @@ def parse_rss_feed(url, timeout=30):
             }
         }
         
-    except requests.exceptions.Timeout:
+    except (requests.exceptions.Timeout, DeadlineExceeded):
         return {
             "success": False,
-            "error": "Request timeout (30s)"
+            "error": f"Request timeout ({timeout}s)"
+        }
+    except FeedTooLarge as e:
+        return {
+            "success": False,
+            "error": f"Feed too large: {str(e)}"
         }
     except requests.exceptions.RequestException as e:
         return {
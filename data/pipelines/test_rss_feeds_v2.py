@@ -5,9 +5,9 @@ RSS Feed Validation Script v2
 - feedparser 라이브러리 사용으로 파싱 개선
 """
 
-import feedparser
 import json
 from datetime import datetime
+from feed_fetcher import fetch_feed
 
 # 각 국가별 1개 언론사만 테스트 (대표 언론사)
 TEST_FEEDS = {
@@ -84,8 +84,8 @@ def parse_rss_feed_v2(url, timeout=30):
     try:
         print(f"  📡 Fetching feed with feedparser...")
         
-        # feedparser 사용 (모든 RSS/Atom 형식 자동 처리)
-        feed = feedparser.parse(url)
+        # feedparser 사용 (모든 RSS/Atom 형식 자동 처리), 공용 fetch 함수로 타임아웃 적용
+        feed = fetch_feed(url, deadline=timeout)
         
         if feed.bozo:
             # 파싱 에러가 있지만 일부 데이터는 있을 수 있음
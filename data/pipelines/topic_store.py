@@ -0,0 +1,141 @@
+"""
+Set-based persistence of enriched topics (mvp2_topics + article links).
+
+For each topic, the local_topic_id most of its articles already carry is the
+candidate: if that topic was created in the last 24h it is updated in place,
+otherwise a new unpublished topic is inserted; the topic's articles are then
+linked to it. Later topics win when they share a candidate or an article.
+
+With setup_topic_bulk_save.sql applied, a country is saved in one RPC call
+(one transaction). Without it, the same result takes one candidate prefetch,
+one bulk insert, one bulk update and one article-link update per topic.
+"""
+
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from bulk_writer import BulkUpserter
+
+RPC_NAME = "mvp2_save_enriched_topics"
+REUSE_WINDOW_HOURS = 24     # Don't revive older topics
+PREFETCH_CHUNK = 100        # ids per request (URL length), like fetch_article_details
+
+
+def build_topics(enriched_data, article_map):
+    """Values to save per topic (save order), with its majority-vote candidate topic"""
+    topics = []
+    for topic_name, details in enriched_data.items():
+        stances = details['stances']
+        article_ids = stances['factual'] + stances['critical'] + stances['supportive']
+
+        # Calculate unique source count
+        unique_sources = {article_map[aid].get('source_name', 'Unknown') for aid in article_ids if aid in article_map}
+
+        # Deduplication via Article Overlap: articles already assigned to a topic vote for it
+        linked_topic_ids = [article_map[aid]['local_topic_id'] for aid in article_ids
+                            if aid in article_map and article_map[aid].get('local_topic_id')]
+        candidate_id = Counter(linked_topic_ids).most_common(1)[0][0] if linked_topic_ids else None
+
+        topics.append({
+            "topic_name": topic_name,
+            "candidate_id": candidate_id,
+            "article_ids": article_ids,
+            "article_count": len(article_ids),
+            "source_count": len(unique_sources),
+            "stances": stances,
+            "keywords": details.get('keywords', []),
+            "category": details.get('category', 'Unclassified'),
+            "summary": details.get('summary_ko', ''),
+        })
+    return topics
+
+
+def save_topics_rpc(supabase, country_code, batch_id, topics):
+    """One call: returns [(topic_id, updated)] aligned with topics"""
+    response = supabase.rpc(RPC_NAME, {
+        "p_country_code": country_code,
+        "p_batch_id": batch_id,
+        "p_topics": topics,
+    }).execute()
+    rows = sorted(response.data or [], key=lambda r: r['topic_index'])
+    return [(r['topic_id'], r['updated']) for r in rows]
+
+
+def fetch_recent_topic_ids(supabase, topic_ids):
+    time_threshold = (datetime.utcnow() - timedelta(hours=REUSE_WINDOW_HOURS)).isoformat()
+    topic_ids = list(topic_ids)
+    recent = set()
+    for i in range(0, len(topic_ids), PREFETCH_CHUNK):
+        response = supabase.table("mvp2_topics") \
+            .select("id") \
+            .in_("id", topic_ids[i:i + PREFETCH_CHUNK]) \
+            .gte("created_at", time_threshold) \
+            .execute()
+        recent.update(row['id'] for row in response.data or [])
+    return recent
+
+
+def save_topics_bulk(supabase, country_code, batch_id, topics, log=print):
+    """Client-side fallback with the same semantics: returns [(topic_id or None, updated)]"""
+    # 1. Verify all candidates at once (unverifiable candidates aren't reused)
+    try:
+        recent = fetch_recent_topic_ids(supabase, {t['candidate_id'] for t in topics if t['candidate_id']})
+    except Exception as e:
+        log(f"    ⚠️ Error verifying candidate topics: {e}")
+        recent = set()
+
+    now = datetime.utcnow().isoformat()
+    results, inserts, updates = [], [], {}
+    for t in topics:
+        fields = {key: t[key] for key in ("topic_name", "article_ids", "article_count", "source_count",
+                                          "stances", "keywords", "category", "summary")}
+        if t['candidate_id'] in recent:
+            topic_id = t['candidate_id']
+            # Upsert needs the NOT NULL columns; country_code is unchanged (same-country articles)
+            updates[topic_id] = {"id": topic_id, "country_code": country_code, **fields,
+                                 "batch_id": batch_id, "updated_at": now}
+            results.append((topic_id, True))
+        else:
+            topic_id = str(uuid.uuid4())
+            inserts.append({"id": topic_id, "country_code": country_code, **fields,
+                            "batch_id": batch_id, "is_published": False, "created_at": now})
+            results.append((topic_id, False))
+
+    # 2. Bulk insert new topics, 3. bulk update existing ones (later topics win per id)
+    failed_ids = set()
+    def track_failures(ok, failed):
+        failed_ids.update(row['id'] for row in failed)
+    for rows in (inserts, list(updates.values())):
+        if rows:
+            writer = BulkUpserter(supabase, "mvp2_topics", on_conflict="id", log=log)
+            writer.add(rows, on_done=track_failures)
+            writer.flush()
+    results = [(topic_id if topic_id not in failed_ids else None, updated) for topic_id, updated in results]
+
+    # 4. Link articles: one update per topic (PostgREST can't set per-row values without the RPC)
+    for t, (topic_id, _) in zip(topics, results):
+        if topic_id and t['article_ids']:
+            supabase.table("mvp2_articles") \
+                .update({"local_topic_id": topic_id}) \
+                .in_("id", t['article_ids']) \
+                .execute()
+    return results
+
+
+def save_enriched_topics(supabase, country_code, batch_id, enriched_data, article_map, log=print):
+    """
+    Save a country's enriched topics; returns [(topic_name, topic_id or None, updated)].
+    log(message) receives warnings, like the rest of the caller's save output.
+    """
+    topics = build_topics(enriched_data, article_map)
+    if not topics:
+        return []
+    try:
+        results = save_topics_rpc(supabase, country_code, batch_id, topics)
+    except Exception as e:
+        # Only fall back when the function isn't installed: other errors may follow a committed call
+        if getattr(e, "code", None) != "PGRST202" and "Could not find the function" not in str(e):
+            raise
+        log(f"  ⚠️ {RPC_NAME} not found, saving with bulk requests (apply setup_topic_bulk_save.sql)")
+        results = save_topics_bulk(supabase, country_code, batch_id, topics, log)
+    return [(t['topic_name'], topic_id, updated) for t, (topic_id, updated) in zip(topics, results)]
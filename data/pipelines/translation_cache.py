@@ -0,0 +1,109 @@
+"""
+Persistent translation cache (local SQLite).
+
+The same headline often arrives from several sources or is re-collected on a
+later run. Translations are cached under a hash of (source language, normalized
+title, normalized summary, prompt version) and looked up before any Gemini call.
+Entries expire after TTL_DAYS; beyond MAX_ENTRIES the least recently used are
+evicted. Safe to share across worker threads.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join(CACHE_DIR, "translations.sqlite3"))
+
+TTL_DAYS = 30
+MAX_ENTRIES = 200_000
+
+
+def normalize(text):
+    """NFKC + collapsed whitespace (case and punctuation matter for translation)"""
+    if not text:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def prompt_version(*prompts):
+    """Short fingerprint of the prompt text, so prompt edits invalidate old entries"""
+    return hashlib.sha256("\n".join(prompts).encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(language, title, summary, version):
+    raw = "\x1f".join([language or "", normalize(title), normalize(summary), version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, path=CACHE_PATH, ttl_days=TTL_DAYS, max_entries=MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached result dict, or None (counts a hit/miss)"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result FROM translations WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE translations SET last_used_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO translations (key, result, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries. Returns rows removed."""
+        with self.lock:
+            removed = self.conn.execute(
+                "DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            removed += self.conn.execute("""
+                DELETE FROM translations WHERE key IN (
+                    SELECT key FROM translations ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            self.conn.commit()
+        return removed
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits} hits / {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
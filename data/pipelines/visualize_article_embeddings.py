@@ -4,8 +4,7 @@ import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from google import genai
-from google.genai import types
+import embedding_model
 from sklearn.manifold import TSNE
 import plotly.express as px
 
@@ -16,14 +15,11 @@ load_dotenv('.env.local')
 
 SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-
-if not SUPABASE_URL or not SUPABASE_KEY or not GOOGLE_API_KEY:
+if not SUPABASE_URL or not SUPABASE_KEY:
     print("Error: Missing environment variables.")
     exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = genai.Client(api_key=GOOGLE_API_KEY)
 
 def get_articles_per_country(limit=10):
     print("Fetching articles...", flush=True)
@@ -66,40 +62,10 @@ def get_articles_per_country(limit=10):
 
 def generate_embeddings(articles):
     print("Generating embeddings...", flush=True)
-    embeddings = []
-    valid_articles = []
-    
-    # Batch process? The SDK supports batch? 
-    # client.models.embed_content supports single.
-    # We can loop. It's only ~1000 articles.
-    
-    consecutive_errors = 0
-    for i, art in enumerate(articles):
-        text = art.get('title_en') or art.get('title_original')
-        if not text:
-            continue
-            
-        try:
-            # Use text-embedding-004
-            response = client.models.embed_content(
-                model="text-embedding-004",
-                contents=text
-            )
-            embedding = response.embeddings[0].values
-            embeddings.append(embedding)
-            valid_articles.append(art)
-            
-            if i % 10 == 0:
-                print(f"  Processed {i}/{len(articles)}", flush=True)
-            consecutive_errors = 0
-                
-        except Exception as e:
-            print(f"  Error embedding {art['id']}: {e}", flush=True)
-            consecutive_errors += 1
-            if consecutive_errors > 5:
-                print("Too many consecutive errors. Stopping.", flush=True)
-                break
-            
+    valid_articles = [a for a in articles if a.get('title_en') or a.get('title_original')]
+    texts = [a.get('title_en') or a.get('title_original') for a in valid_articles]
+    # One batched call to the local embedding server (or in-process model)
+    embeddings = list(embedding_model.encode(texts)) if texts else []
     return valid_articles, embeddings
 
 def visualize(articles, embeddings):
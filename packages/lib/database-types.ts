@@ -131,9 +131,10 @@ export interface Embedding {
   id: string; // UUID
   entity_type: EntityType;
   entity_id: string;
-  embedding_vector: number[]; // vector(768)
+  embedding_vector: number[]; // vector(384)
   source_text_en: string;
   model_name: string;
+  text_hash?: string | null;
   created_at: string;
 }
 